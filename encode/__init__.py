@@ -18,6 +18,15 @@ FILE_TYPES = (
     (SNAPSHOT, "Snapshot"),
 )
 
+HLS = "hls"
+DASH = "dash"
+
+#: Adaptive bitrate streaming formats.
+STREAMING_FORMATS = (
+    (HLS, "HLS"),
+    (DASH, "MPEG-DASH"),
+)
+
 #: Application version.
 __version__ = (1, 0, 4)
 
@@ -0,0 +1,186 @@
+# Copyright Collab 2016
+# See LICENSE for details.
+
+"""
+Resource accounting for encoders and their child processes.
+"""
+
+from __future__ import unicode_literals
+
+import os
+import sys
+import time
+import errno
+import threading
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    # not available on Windows
+    resource = None
+
+
+__all__ = ['USAGE_FIELDS', 'ResourceUsage', 'wait_process', 'peak_rss']
+
+#: Names of the measurements collected by :py:class:`ResourceUsage`.
+USAGE_FIELDS = ('wall_time', 'user_time', 'system_time', 'max_rss',
+                'input_blocks', 'output_blocks')
+
+
+# the measurements that are active in each thread
+_active = threading.local()
+
+
+def _maxrss_kilobytes(rusage):
+    max_rss = rusage.ru_maxrss
+    if sys.platform == 'darwin':  # pragma: no cover
+        # reported in bytes instead of kilobytes
+        max_rss = max_rss // 1024
+
+    return max_rss
+
+
+def wait_process(process):
+    """
+    Wait for a child process, like :py:meth:`subprocess.Popen.wait`, and
+    record its peak memory usage in the active :py:class:`ResourceUsage`
+    measurements of this thread.
+
+    :param process: The child process.
+    :type process: :py:class:`subprocess.Popen`
+    :rtype: int
+    :returns: The exit status of the process.
+    """
+    if not hasattr(os, 'wait4'):  # pragma: no cover
+        return process.wait()
+
+    while True:
+        try:
+            pid, status, rusage = os.wait4(process.pid, 0)
+            break
+        except OSError as error:
+            # interrupted by a signal on Python 2
+            if error.errno != errno.EINTR:  # pragma: no cover
+                raise
+
+    if os.WIFSIGNALED(status):
+        process.returncode = -os.WTERMSIG(status)
+    else:
+        process.returncode = os.WEXITSTATUS(status)
+
+    for usage in getattr(_active, 'usages', []):
+        usage.add_child(rusage)
+
+    return process.returncode
+
+
+def _usage():
+    """
+    Snapshot of the resources used by the current process and by all its
+    terminated and waited-for child processes.
+
+    :rtype: tuple
+    :returns: The :py:class:`resource.struct_rusage` of the process and of
+        its children, or ``None``.
+    """
+    if resource is None:  # pragma: no cover
+        return None
+
+    return (resource.getrusage(resource.RUSAGE_SELF),
+            resource.getrusage(resource.RUSAGE_CHILDREN))
+
+
+class ResourceUsage(object):
+    """
+    Context manager that measures the wall time and the ``rusage`` of the
+    child processes that are started (and reaped) within its block, e.g. by
+    :py:meth:`encode.encoders.BasicEncoder.start`, and of the current
+    process, e.g. for the :py:class:`~encode.encoders.PillowEncoder` that
+    encodes in-process.
+
+    The CPU times and block counts are deltas of the current process and its
+    children. The block counts are the
+    number of 512-byte blocks that were read and written on Linux, and the
+    number of read and write operations on other systems.
+
+    ``max_rss`` is the largest peak resident set size (in kilobytes) of the
+    child processes that were reaped with :py:func:`wait_process`, and
+    ``None`` when no peak was measured, e.g. for encoders that start their
+    processes with a library. The peak of all children of the process,
+    ``RUSAGE_CHILDREN``, is not used: it includes the children of the
+    previous jobs of the worker. The peak of the current process counts
+    when it was raised within the block; a peak of an in-process encoder
+    that stayed below the peak of an earlier job is not known, and
+    ``max_rss`` is ``None`` then.
+    """
+    def __init__(self):
+        self.wall_time = 0.0
+        self.user_time = 0.0
+        self.system_time = 0.0
+        self.max_rss = None
+        self.input_blocks = 0
+        self.output_blocks = 0
+
+        self._started = None
+        self._before = None
+
+    def add_child(self, rusage):
+        """
+        Record the peak memory usage of a reaped child process.
+
+        :param rusage: The resource usage of the child process, e.g. of
+            :py:func:`os.wait4`.
+        :type rusage: :py:class:`resource.struct_rusage`
+        """
+        self.max_rss = max(self.max_rss or 0, _maxrss_kilobytes(rusage))
+
+    def __enter__(self):
+        if not hasattr(_active, 'usages'):
+            _active.usages = []
+        _active.usages.append(self)
+
+        self._before = _usage()
+        self._started = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.wall_time = time.time() - self._started
+        after = _usage()
+        _active.usages.remove(self)
+
+        if after is None:  # pragma: no cover
+            return
+
+        for before, now in zip(self._before, after):
+            self.user_time += now.ru_utime - before.ru_utime
+            self.system_time += now.ru_stime - before.ru_stime
+            self.input_blocks += now.ru_inblock - before.ru_inblock
+            self.output_blocks += now.ru_oublock - before.ru_oublock
+
+        # the peak of the process is only known to be reached within the
+        # block when it's higher than before
+        before, now = self._before[0], after[0]
+        if now.ru_maxrss > before.ru_maxrss:
+            self.max_rss = max(self.max_rss or 0, _maxrss_kilobytes(now))
+
+    def as_dict(self):
+        """
+        The measurements, keyed by the names in :py:data:`USAGE_FIELDS`.
+
+        :rtype: dict
+        """
+        return dict((name, getattr(self, name)) for name in USAGE_FIELDS)
+
+
+def peak_rss(values):
+    """
+    The largest of the ``max_rss`` measurements of several runs.
+
+    :param values: ``max_rss`` of :py:class:`ResourceUsage` measurements.
+    :type values: list
+    :rtype: int
+    :returns: ``None`` if none of the runs measured the peak.
+    """
+    values = [value for value in values if value is not None]
+
+    return max(values) if values else None
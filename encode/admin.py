@@ -12,14 +12,39 @@ from django.contrib import admin, messages
 from django.core.urlresolvers import reverse
 from django.utils.translation import ugettext_lazy as _
 
-from encode import models, forms
+from encode import models, forms, bulk
+from encode.conf import settings
+from encode.pagination import EstimatedCountPaginator, KeysetChangeList
 
 
-class MediaFileAdmin(admin.ModelAdmin):
+class EstimatedCountMixin(object):
+    """
+    Avoid full ``COUNT(*)`` queries in changelists of large tables.
+
+    The total number of objects is not counted and the
+    :py:class:`~encode.pagination.EstimatedCountPaginator` is used when
+    :py:data:`~encode.conf.EncodeConf.ADMIN_ESTIMATED_COUNT` is enabled.
+    """
+    show_full_result_count = False
+
+    def get_paginator(self, request, queryset, per_page, orphans=0,
+                      allow_empty_first_page=True):
+        paginator = self.paginator
+        if settings.ENCODE_ADMIN_ESTIMATED_COUNT:
+            paginator = EstimatedCountPaginator
+
+        return paginator(queryset, per_page, orphans, allow_empty_first_page)
+
+
+class MediaFileAdmin(EstimatedCountMixin, admin.ModelAdmin):
     """
     Admin definition for :py:class:`encode.models.MediaFile` models.
     """
-    list_display = ('title', 'created_at',)
+    list_display = ('title', 'profile', 'mime_type', 'size', 'width',
+                    'height', 'duration', 'created_at',)
+    list_select_related = ('profile',)
+    readonly_fields = ('size', 'md5', 'sha256', 'mime_type', 'width',
+                       'height', 'duration')
     ordering = ['title']
     search_fields = ['title']
 
@@ -34,29 +59,55 @@ class EncoderAdmin(admin.ModelAdmin):
     list_display = ('name', 'path', 'command', 'klass')
 
 
+class RenditionInline(admin.TabularInline):
+    """
+    Inline admin definition for :py:class:`encode.models.Rendition` models.
+    """
+    model = models.Rendition
+    extra = 0
+
+
 class EncodingProfileAdmin(admin.ModelAdmin):
     """
     Admin definition for :py:class:`encode.models.EncodingProfile` models.
     """
     list_display = ('name', 'encoder_link', 'container', 'mime_type',
-                    'video_codec', 'audio_codec')
+                    'video_codec', 'audio_codec', 'streaming_format')
     ordering = ['name']
     search_fields = ['name', 'description', 'mime_type', 'container']
-    list_filter = ('container', 'mime_type', 'encoder',)
+    list_filter = ('container', 'mime_type', 'encoder', 'streaming_format')
+    list_select_related = ('encoder',)
+    inlines = [RenditionInline]
 
     def encoder_link(self, obj):
         markup = "<b><a href='{url}'>{name}</a></b>"
         url = reverse('admin:encode_encoder_change', args=(
-            obj.encoder.id,))
+            obj.encoder_id,))
         return format_html(markup, name=obj.encoder.name, url=url)
 
     encoder_link.short_description = _('Encoder')
     encoder_link.allow_tags = True
 
 
-class MediaAdmin(admin.ModelAdmin):
+class EncodingJobAdmin(admin.ModelAdmin):
+    """
+    Admin definition for :py:class:`encode.models.EncodingJob` models.
+    """
+    list_display = ('media', 'profile', 'wall_time', 'user_time',
+                    'system_time', 'max_rss', 'created_at')
+    list_filter = ('profile',)
+    ordering = ['-created_at']
+    readonly_fields = ('media', 'profile', 'wall_time', 'user_time',
+                       'system_time', 'max_rss', 'input_blocks',
+                       'output_blocks')
+
+
+class MediaAdmin(EstimatedCountMixin, admin.ModelAdmin):
     """
     Base admin for media objects.
+
+    The changelist uses keyset pagination, see
+    :py:class:`~encode.pagination.KeysetChangeList`.
     """
     list_display = ('title', 'encoded', 'uploaded', 'created_at',
                     'modified_at')
@@ -66,6 +117,78 @@ class MediaAdmin(admin.ModelAdmin):
     list_filter = ('encoded', 'profiles', 'uploaded',)
     ordering = ['-modified_at']
     filter_horizontal = ('profiles',)
+    change_list_template = 'admin/encode/keyset_change_list.html'
+    actions = ['reencode', 'retry', 'cancel']
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def defer_action(self, request, action, queryset):
+        """
+        Hand a selection of more than
+        :py:data:`~encode.conf.EncodeConf.BULK_ASYNC_THRESHOLD` media objects
+        to the :py:class:`~encode.tasks.BulkMedia` task instead of processing
+        it in the request.
+
+        :rtype: bool
+        :returns: Whether the ``action`` runs in the background.
+        """
+        threshold = settings.ENCODE_BULK_ASYNC_THRESHOLD
+        selected = queryset.values_list('pk', flat=True)[:threshold + 1]
+        if len(selected) <= threshold:
+            return False
+
+        bulk.defer(action, queryset)
+        messages.success(request, _(
+            "More than %(threshold)d object(s) are selected, they are "
+            "processed in the background.") % {'threshold': threshold})
+        return True
+
+    def reencode(self, request, queryset):
+        """
+        Encode the selected media objects again.
+        """
+        if self.defer_action(request, 'reencode', queryset):
+            return
+
+        result = bulk.reencode(queryset, delay=0)
+        messages.success(request, _(
+            "%(queued)d object(s) are being encoded, %(skipped)d object(s) "
+            "skipped because their input file is missing.") % result)
+
+    reencode.short_description = _("Encode selected %(verbose_name_plural)s "
+                                   "again")
+
+    def retry(self, request, queryset):
+        """
+        Encode the selected media objects that did not complete encoding
+        again.
+        """
+        if self.defer_action(request, 'retry', queryset):
+            return
+
+        result = bulk.retry(queryset, delay=0)
+        messages.success(request, _(
+            "%(queued)d object(s) are being encoded, %(skipped)d object(s) "
+            "skipped because their input file is missing.") % result)
+
+    retry.short_description = _("Retry encoding selected "
+                                "%(verbose_name_plural)s")
+
+    def cancel(self, request, queryset):
+        """
+        Cancel encoding the selected media objects.
+        """
+        if self.defer_action(request, 'cancel', queryset):
+            return
+
+        canceled = bulk.cancel(queryset)
+        messages.success(request, _(
+            "Canceled encoding %(canceled)d object(s).") % {
+            'canceled': canceled})
+
+    cancel.short_description = _("Cancel encoding selected "
+                                 "%(verbose_name_plural)s")
 
     def save_model(self, request, obj, form, change):
         """
@@ -99,6 +222,9 @@ class AudioAdmin(MediaAdmin):
     Admin for :py:class:`encode.models.Audio` models.
     """
     form = forms.AudioAdminForm
+    exclude = MediaAdmin.exclude + ('waveform',)
+    readonly_fields = MediaAdmin.readonly_fields + ('duration', 'loudness',
+                                                    'loudness_range')
 
 
 class SnapshotAdmin(MediaAdmin):
@@ -114,3 +240,4 @@ admin.site.register(models.Audio, AudioAdmin)
 admin.site.register(models.Snapshot, SnapshotAdmin)
 admin.site.register(models.EncodingProfile, EncodingProfileAdmin)
 admin.site.register(models.Encoder, EncoderAdmin)
+admin.site.register(models.EncodingJob, EncodingJobAdmin)
@@ -0,0 +1,124 @@
+# Copyright Collab 2016
+# See LICENSE for details.
+
+"""
+Analysis of the decoded audio: duration, loudness and waveform peaks.
+"""
+
+from __future__ import division, unicode_literals
+
+import re
+import sys
+from array import array
+
+
+__all__ = ['ANALYSIS_RATE', 'Waveform', 'parse_loudness']
+
+#: Sample rate of the mono 16-bit PCM stream that is analysed.
+ANALYSIS_RATE = 8000
+
+#: Integrated loudness and loudness range in the summary of the FFmpeg
+#: ``ebur128`` filter.
+LOUDNESS = re.compile(r'^\s*I:\s+(?P<value>-?(?:[\d.]+|inf)) LUFS', re.M)
+LOUDNESS_RANGE = re.compile(r'^\s*LRA:\s+(?P<value>[\d.]+) LU', re.M)
+
+
+class Waveform(object):
+    """
+    Collects the peaks of a mono 16-bit little-endian PCM stream, without
+    keeping the samples in memory.
+
+    :param rate: Sample rate of the stream.
+    :type rate: int
+    :param resolution: Number of peaks that are kept per second.
+    :type resolution: int
+    """
+    def __init__(self, rate=ANALYSIS_RATE, resolution=50):
+        self.rate = rate
+        self.window = max(rate // resolution, 1)
+        self.samples = 0
+        self._peaks = array(str('i'))
+        self._pending = array(str('h'))
+        self._odd = b''
+
+    def feed(self, data):
+        """
+        Add a chunk of the PCM stream.
+
+        :param data: The bytes of the chunk.
+        :type data: bytes
+        """
+        data = self._odd + data
+        size = len(data) - len(data) % 2
+        self._odd = data[size:]
+
+        samples = array(str('h'))
+        if hasattr(samples, 'frombytes'):
+            samples.frombytes(data[:size])
+        else:
+            samples.fromstring(data[:size])
+        if sys.byteorder == 'big':
+            samples.byteswap()
+        self.samples += len(samples)
+
+        samples = self._pending + samples
+        end = len(samples) - len(samples) % self.window
+        for start in range(0, end, self.window):
+            window = samples[start:start + self.window]
+            self._peaks.append(max(max(window), -min(window)))
+        self._pending = samples[end:]
+
+    @property
+    def duration(self):
+        """
+        Duration of the stream in seconds.
+
+        :rtype: float
+        """
+        return self.samples / self.rate
+
+    def peaks(self, count):
+        """
+        The waveform of the stream as ``count`` peaks.
+
+        :param count: Number of peaks.
+        :type count: int
+        :rtype: list
+        :returns: Peaks between ``0`` and ``255``, fewer than ``count`` for
+            very short streams.
+        """
+        peaks = list(self._peaks)
+        if self._pending:
+            peaks.append(max(max(self._pending), -min(self._pending)))
+
+        total = len(peaks)
+        if total > count:
+            peaks = [max(peaks[index * total // count:
+                               (index + 1) * total // count])
+                     for index in range(count)]
+
+        return [min(peak * 256 // 32768, 255) for peak in peaks]
+
+
+def parse_loudness(output):
+    """
+    Parse the summary of the FFmpeg ``ebur128`` filter.
+
+    :param output: The log output of FFmpeg.
+    :type output: str
+    :rtype: dict
+    :returns: The integrated ``loudness`` in LUFS and the ``loudness_range``
+        in LU, ``None`` when they are not found.
+    """
+    result = {'loudness': None, 'loudness_range': None}
+
+    for key, pattern in (('loudness', LOUDNESS),
+                         ('loudness_range', LOUDNESS_RANGE)):
+        matches = pattern.findall(output)
+        if matches:
+            value = float(matches[-1])
+            # silence has no loudness
+            if value != float('-inf'):
+                result[key] = value
+
+    return result
@@ -0,0 +1,8 @@
+# Copyright Collab 2016
+# See LICENSE for details.
+
+"""
+Benchmarks for the :py:mod:`encode` pipeline.
+
+Run them with the ``runbenchmarks.py`` script in the root of the repository.
+"""
@@ -0,0 +1,131 @@
+# Copyright Collab 2016
+# See LICENSE for details.
+
+"""
+Image variants rendered by starting an ImageMagick ``convert`` process for
+every profile (:py:class:`~encode.encoders.BasicEncoder`), compared to
+rendering them in-process from one decoded input
+(:py:class:`~encode.encoders.PillowEncoder`).
+"""
+
+from __future__ import division, unicode_literals
+
+import os
+import logging
+
+from encode import EncodeError
+from encode.models import Encoder, EncodingProfile
+from encode.encoders import BasicEncoder, PillowEncoder
+
+from encode.benchmarks.stats import Timer, summarize
+
+
+__all__ = ['VARIANTS', 'generate_image', 'run_images']
+
+logger = logging.getLogger(__name__)
+
+#: Sizes and containers of the image variants, e.g. avatar sizes.
+VARIANTS = [
+    ('32x32', 'png'),
+    ('64x64', 'png'),
+    ('128x128', 'jpg'),
+    ('256x256', 'jpg'),
+    ('640x480', 'jpg'),
+    ('1024x768', 'jpg'),
+]
+
+
+def generate_image(path, size=(1600, 1200)):
+    """
+    Write a synthetic gradient image to ``path``.
+
+    :param path: Location of the image, its extension selects the format.
+    :type path: str
+    :param size: Width and height of the image.
+    :type size: tuple
+    """
+    from PIL import Image
+
+    width, height = size
+    image = Image.new('RGB', size)
+    image.putdata([(x * 255 // width, y * 255 // height, 128)
+                   for y in range(height) for x in range(width)])
+    image.save(path)
+
+
+def get_profiles(klass, path):
+    """
+    Unsaved encoding profiles of the :py:data:`VARIANTS` for an encoder.
+
+    :rtype: list
+    """
+    encoder = Encoder(name=path, path=path, klass=klass)
+
+    return [EncodingProfile(name=size, encoder=encoder, container=container,
+                            command='"{input}" -resize %s "{output}"' % size)
+            for size, container in VARIANTS]
+
+
+def run_images(workdir, iterations=5):
+    """
+    Render the :py:data:`VARIANTS` of a synthetic image ``iterations`` times
+    with both encoders.
+
+    :param workdir: Directory for the input and output images.
+    :type workdir: str
+    :param iterations: Number of runs for each encoder.
+    :type iterations: int
+    :rtype: list
+    """
+    input_path = os.path.join(workdir, 'input.png')
+    generate_image(input_path)
+
+    def output_path(profile):
+        return os.path.join(workdir, '{}-{}.{}'.format(
+            profile.encoder.path, profile.name, profile.container))
+
+    def subprocess_run(profiles):
+        # one process for every variant
+        for profile in profiles:
+            BasicEncoder(profile, input_path, output_path(profile)).start()
+
+    def pillow_run(profiles):
+        # one decode for all variants
+        PillowEncoder(profiles[0], input_path, output_path(profiles[0]),
+            variants=[(profile, output_path(profile))
+                      for profile in profiles[1:]]).start()
+
+    results = []
+    for name, klass, path, run in [
+            ('convert', 'encode.encoders.BasicEncoder', 'convert',
+             subprocess_run),
+            ('pillow', 'encode.encoders.PillowEncoder', 'pillow',
+             pillow_run)]:
+        profiles = get_profiles(klass, path)
+        result = {
+            'name': name,
+            'encoder_class': klass,
+            'iterations': iterations,
+            'variants': len(profiles),
+            'input_size': os.path.getsize(input_path),
+            'wall_time': None,
+            'error': None,
+        }
+
+        timings = []
+        try:
+            for index in range(iterations):
+                with Timer() as timer:
+                    run(profiles)
+                timings.append(timer.elapsed)
+        except EncodeError as error:
+            logger.error("{} failed: {}".format(name, error))
+            result['error'] = str(error)
+        else:
+            result['wall_time'] = summarize(timings)
+            result['variants_per_second'] = (
+                len(profiles) * iterations / sum(timings))
+
+        results.append(result)
+
+    return results
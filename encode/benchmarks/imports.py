@@ -0,0 +1,112 @@
+# Copyright Collab 2016
+# See LICENSE for details.
+
+"""
+Import time of the :py:mod:`encode` modules.
+
+Every measurement starts a fresh Python interpreter, so modules that are
+already imported by the benchmark runner do not hide the cost.
+"""
+
+from __future__ import unicode_literals
+
+import os
+import sys
+import json
+import subprocess
+
+from encode.benchmarks.stats import summarize
+
+
+__all__ = ['MODULES', 'measure_import', 'run_imports']
+
+#: Modules that are imported by web processes and management commands.
+MODULES = [
+    'encode.models',
+    'encode.admin',
+    'encode.tasks',
+    'encode.encoders',
+]
+
+#: Modules that should only be imported when files are stored or encoded.
+LAZY_MODULES = [
+    'converter.ffmpeg',
+    'queued_storage.tasks',
+]
+
+SCRIPT = """
+import sys, json, time
+import django
+from django.utils.functional import empty
+
+started = time.time()
+django.setup()
+setup_time = time.time() - started
+
+started = time.time()
+import {module}
+import_time = time.time() - started
+
+from encode import models
+storages = [models.cdnStorage,
+            models.MediaBase._meta.get_field('input_file').storage]
+
+sys.stdout.write(json.dumps({{
+    'setup': setup_time,
+    'import': import_time,
+    'loaded': [name for name in {lazy!r} if name in sys.modules],
+    'storages': sum(storage._wrapped is not empty for storage in storages),
+}}))
+"""
+
+
+def measure_import(module, python=None):
+    """
+    Import ``module`` in a fresh interpreter after setting up Django.
+
+    :param module: Name of the module.
+    :type module: str
+    :param python: Location of the Python interpreter, defaults to the
+        current interpreter.
+    :type python: str
+    :rtype: dict
+    :returns: Seconds spent in ``django.setup()`` (``setup``) and importing
+        ``module`` afterwards (``import``), the :py:data:`LAZY_MODULES`
+        that were ``loaded`` and the number of ``storages`` that were
+        created.
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(path for path in sys.path if path)
+    script = SCRIPT.format(module=module, lazy=[str(name) for name in
+                                                LAZY_MODULES])
+
+    output = subprocess.check_output([python or sys.executable, '-c', script],
+        env=env)
+
+    return json.loads(output.decode('utf-8'))
+
+
+def run_imports(iterations=5, modules=None):
+    """
+    Measure the import time of ``modules``.
+
+    :param iterations: Number of runs for each module.
+    :type iterations: int
+    :param modules: Names of the modules, defaults to :py:data:`MODULES`.
+    :type modules: list
+    :rtype: list
+    """
+    results = []
+
+    for module in modules or MODULES:
+        runs = [measure_import(module) for index in range(iterations)]
+        results.append({
+            'name': module,
+            'iterations': iterations,
+            'setup': summarize([run['setup'] for run in runs]),
+            'import': summarize([run['import'] for run in runs]),
+            'loaded': runs[-1]['loaded'],
+            'storages': runs[-1]['storages'],
+        })
+
+    return results
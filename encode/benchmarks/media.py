@@ -0,0 +1,109 @@
+# Copyright Collab 2016
+# See LICENSE for details.
+
+"""
+Synthetic media generated with the FFmpeg ``lavfi`` test sources.
+"""
+
+from __future__ import unicode_literals
+
+import subprocess
+
+from encode import AUDIO, VIDEO, SNAPSHOT
+
+
+__all__ = ['generate_audio', 'generate_video', 'generate_image',
+           'generate_media']
+
+
+def _ffmpeg(args, ffmpeg='ffmpeg'):
+    """
+    Run ``ffmpeg`` with ``args``, overwriting existing output files.
+    """
+    command = [ffmpeg, '-loglevel', 'error', '-y'] + args
+    subprocess.check_call(command)
+
+
+def generate_audio(path, duration=5, rate=44100, ffmpeg='ffmpeg'):
+    """
+    Generate a sine wave audio file.
+
+    :param path: Destination of the audio file, e.g. ``/tmp/input.wav``.
+    :type path: str
+    :param duration: Length in seconds.
+    :type duration: int
+    :param rate: Sample rate.
+    :type rate: int
+    :param ffmpeg: Name or path of the ``ffmpeg`` executable.
+    :type ffmpeg: str
+    """
+    _ffmpeg([
+        '-f', 'lavfi',
+        '-i', 'sine=frequency=440:sample_rate={}:duration={}'.format(
+            rate, duration),
+        '-ac', '2', path
+    ], ffmpeg)
+
+
+def generate_video(path, duration=5, size='320x240', rate=25,
+                   ffmpeg='ffmpeg'):
+    """
+    Generate a video file with a test pattern and a sine wave audio track.
+
+    :param path: Destination of the video file, e.g. ``/tmp/input.webm``.
+    :type path: str
+    :param duration: Length in seconds.
+    :type duration: int
+    :param size: Frame size.
+    :type size: str
+    :param rate: Frame rate.
+    :type rate: int
+    :param ffmpeg: Name or path of the ``ffmpeg`` executable.
+    :type ffmpeg: str
+    """
+    _ffmpeg([
+        '-f', 'lavfi',
+        '-i', 'testsrc=size={}:rate={}:duration={}'.format(
+            size, rate, duration),
+        '-f', 'lavfi',
+        '-i', 'sine=frequency=440:duration={}'.format(duration),
+        '-shortest', path
+    ], ffmpeg)
+
+
+def generate_image(path, size='640x480', ffmpeg='ffmpeg'):
+    """
+    Generate an image with a test pattern.
+
+    :param path: Destination of the image, e.g. ``/tmp/input.png``.
+    :type path: str
+    :param size: Image size.
+    :type size: str
+    :param ffmpeg: Name or path of the ``ffmpeg`` executable.
+    :type ffmpeg: str
+    """
+    _ffmpeg([
+        '-f', 'lavfi',
+        '-i', 'testsrc=size={}:rate=1'.format(size),
+        '-frames:v', '1', path
+    ], ffmpeg)
+
+
+#: Generator for each file type.
+GENERATORS = {
+    AUDIO: generate_audio,
+    VIDEO: generate_video,
+    SNAPSHOT: generate_image,
+}
+
+
+def generate_media(file_type, path, **kwargs):
+    """
+    Generate synthetic media for ``file_type``.
+
+    :param file_type: One of ``AUDIO``, ``VIDEO`` or ``SNAPSHOT``.
+    :type file_type: str
+    :param path: Destination of the media file.
+    :type path: str
+    """
+    GENERATORS[file_type](path, **kwargs)
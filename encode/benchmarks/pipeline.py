@@ -0,0 +1,270 @@
+# Copyright Collab 2016
+# See LICENSE for details.
+
+"""
+Throughput and latency of the ingest, encode and store stages for each
+built-in encoder class.
+
+The stages are driven directly instead of through the Celery tasks, so the
+measurements do not depend on the broker or ``CELERY_ALWAYS_EAGER``.
+"""
+
+from __future__ import division, unicode_literals
+
+import os
+import logging
+
+from django.core.files.base import File
+
+from encode import AUDIO, VIDEO, SNAPSHOT, HLS
+from encode.accounting import ResourceUsage, peak_rss
+from encode.encoders import get_encoder_class
+from encode.models import (Audio, Video, Snapshot, Encoder, EncodingProfile,
+    Rendition)
+
+from encode.benchmarks.media import generate_media
+from encode.benchmarks.stats import Timer, summarize
+
+
+__all__ = ['SCENARIOS', 'run_scenario', 'run_pipeline']
+
+logger = logging.getLogger(__name__)
+
+MODELS = {
+    AUDIO: Audio,
+    VIDEO: Video,
+    SNAPSHOT: Snapshot,
+}
+
+#: Benchmark scenarios. Every built-in encoder class is exercised for the
+#: file types it encodes, using codecs that are available in any FFmpeg
+#: build.
+SCENARIOS = [
+    {
+        'name': 'audio-basic',
+        'file_type': AUDIO,
+        'input': 'wav',
+        'klass': 'encode.encoders.BasicEncoder',
+        'path': 'ffmpeg',
+        'command': '-y -i "{input}" -c:a aac "{output}"',
+        'container': 'm4a',
+    },
+    {
+        'name': 'audio-ffmpeg',
+        'file_type': AUDIO,
+        'input': 'wav',
+        'klass': 'encode.encoders.FFMpegEncoder',
+        'path': 'ffmpeg',
+        'command': '-c:a aac',
+        'container': 'm4a',
+    },
+    {
+        'name': 'audio-audio',
+        'file_type': AUDIO,
+        'input': 'wav',
+        'klass': 'encode.encoders.AudioEncoder',
+        'path': 'ffmpeg',
+        'command': '-c:a aac',
+        'container': 'm4a',
+    },
+    {
+        'name': 'video-basic',
+        'file_type': VIDEO,
+        'input': 'mkv',
+        'klass': 'encode.encoders.BasicEncoder',
+        'path': 'ffmpeg',
+        'command': '-y -i "{input}" -c:v mpeg4 -c:a aac "{output}"',
+        'container': 'mp4',
+    },
+    {
+        'name': 'video-ffmpeg',
+        'file_type': VIDEO,
+        'input': 'mkv',
+        'klass': 'encode.encoders.FFMpegEncoder',
+        'path': 'ffmpeg',
+        'command': '-c:v mpeg4 -c:a aac',
+        'container': 'mp4',
+    },
+    {
+        'name': 'video-ladder',
+        'file_type': VIDEO,
+        'input': 'mkv',
+        'klass': 'encode.encoders.LadderEncoder',
+        'path': 'ffmpeg',
+        'command': '-c:v mpeg4',
+        'container': 'm3u8',
+        'streaming_format': HLS,
+        'renditions': [
+            {'name': '240p', 'width': 320, 'height': 240,
+             'video_bitrate': 400, 'audio_bitrate': 64},
+            {'name': '120p', 'width': 160, 'height': 120,
+             'video_bitrate': 150, 'audio_bitrate': 32},
+        ],
+    },
+    {
+        'name': 'snapshot-basic',
+        'file_type': SNAPSHOT,
+        'input': 'png',
+        'klass': 'encode.encoders.BasicEncoder',
+        'path': 'convert',
+        'command': '"{input}" -resize 320x240 "{output}"',
+        'container': 'png',
+    },
+    {
+        'name': 'snapshot-ffmpeg',
+        'file_type': SNAPSHOT,
+        'input': 'png',
+        'klass': 'encode.encoders.FFMpegEncoder',
+        'path': 'ffmpeg',
+        'command': '-vf scale=320:240',
+        'container': 'png',
+    },
+    {
+        'name': 'snapshot-pillow',
+        'file_type': SNAPSHOT,
+        'input': 'png',
+        'klass': 'encode.encoders.PillowEncoder',
+        'path': 'pillow',
+        'command': '-resize 320x240',
+        'container': 'png',
+    },
+]
+
+
+def get_profile(scenario):
+    """
+    Create the :py:class:`~encode.models.EncodingProfile` for ``scenario``.
+
+    :rtype: :py:class:`~encode.models.EncodingProfile`
+    """
+    encoder = Encoder.objects.get_or_create(
+        name=scenario['name'],
+        path=scenario['path'],
+        klass=scenario['klass']
+    )[0]
+
+    profile, created = EncodingProfile.objects.get_or_create(
+        name=scenario['name'],
+        encoder=encoder,
+        container=scenario['container'],
+        command=scenario['command'],
+        streaming_format=scenario.get('streaming_format', '')
+    )
+    if created:
+        for rendition in scenario.get('renditions', []):
+            Rendition.objects.create(profile=profile, **rendition)
+
+    return profile
+
+
+def run_scenario(scenario, input_path, iterations=5):
+    """
+    Ingest, encode and store ``input_path`` ``iterations`` times.
+
+    :param scenario: One of the :py:data:`SCENARIOS`.
+    :type scenario: dict
+    :param input_path: Location of the (synthetic) input media file.
+    :type input_path: str
+    :param iterations: Number of runs.
+    :type iterations: int
+    :rtype: dict
+    """
+    profile = get_profile(scenario)
+    model = MODELS[scenario['file_type']]
+    Encoder = get_encoder_class(scenario['klass'])
+    input_size = os.path.getsize(input_path)
+
+    timings = dict(ingest=[], encode=[], store=[])
+    cpu_time = []
+    max_rss = []
+    output_size = 0
+
+    for index in range(iterations):
+        # ingest: create the media object and transfer the input file
+        with Timer() as timer:
+            media = model(title=os.path.basename(input_path))
+            with open(input_path, 'rb') as input_file:
+                media.input_file.save(
+                    '{}.{}'.format(scenario['name'], scenario['input']),
+                    File(input_file))
+            media.profiles.add(profile)
+        timings['ingest'].append(timer.elapsed)
+
+        # encode
+        output_path = media.output_path(profile)
+        if not os.path.isdir(os.path.dirname(output_path)):
+            os.makedirs(os.path.dirname(output_path))
+        encoder = Encoder(profile, media.input_path, output_path)
+        with Timer() as timer, ResourceUsage() as usage:
+            encoder.start()
+        timings['encode'].append(timer.elapsed)
+        cpu_time.append(usage.user_time + usage.system_time)
+        max_rss.append(usage.max_rss)
+        # a streaming profile writes a directory of playlists and segments
+        output_size = sum(os.path.getsize(path)
+                          for path in encoder.outputs())
+
+        # store: upload the output file and clean up
+        with Timer() as timer:
+            media.store_file(profile)
+            media.remove_file(profile)
+        timings['store'].append(timer.elapsed)
+
+        logger.debug("{} run {}: {}".format(scenario['name'], index + 1,
+            ", ".join("{}={:.3f}s".format(stage, samples[-1])
+                for stage, samples in sorted(timings.items()))))
+
+    stages = dict((stage, summarize(samples))
+                  for stage, samples in timings.items())
+    input_bytes = input_size * iterations
+    output_bytes = output_size * iterations
+    total_time = sum(stage['total'] for stage in stages.values())
+    throughput = {
+        'ingest_bytes_per_second': input_bytes / stages['ingest']['total'],
+        'encode_bytes_per_second': input_bytes / stages['encode']['total'],
+        'store_bytes_per_second': output_bytes / stages['store']['total'],
+        'files_per_second': iterations / total_time,
+    }
+
+    return {
+        'name': scenario['name'],
+        'file_type': scenario['file_type'],
+        'encoder_class': scenario['klass'],
+        'iterations': iterations,
+        'input_size': input_size,
+        'output_size': output_size,
+        'stages': stages,
+        'throughput': throughput,
+        'cpu_time': summarize(cpu_time),
+        'max_rss': peak_rss(max_rss),
+    }
+
+
+def run_pipeline(workdir, iterations=5, scenarios=None):
+    """
+    Generate synthetic inputs in ``workdir`` and run all ``scenarios``.
+
+    :param workdir: Directory for the generated input files.
+    :type workdir: str
+    :param iterations: Number of runs for each scenario.
+    :type iterations: int
+    :param scenarios: Names of the scenarios to run, defaults to all
+        :py:data:`SCENARIOS`.
+    :type scenarios: list
+    :rtype: list
+    """
+    inputs = {}
+    results = []
+
+    for scenario in SCENARIOS:
+        if scenarios and scenario['name'] not in scenarios:
+            continue
+
+        key = (scenario['file_type'], scenario['input'])
+        if key not in inputs:
+            inputs[key] = os.path.join(workdir, 'input_{}.{}'.format(*key))
+            generate_media(scenario['file_type'], inputs[key])
+
+        results.append(run_scenario(scenario, inputs[key], iterations))
+
+    return results
@@ -0,0 +1,207 @@
+# Copyright Collab 2016
+# See LICENSE for details.
+
+"""
+Cost of encoding a reference input with an
+:py:class:`~encode.models.EncodingProfile`.
+
+Every run starts the encoder in a forked process, so the peak memory usage
+of one run or profile does not hide the usage of the next: the operating
+system only reports the high-water mark of all child processes.
+"""
+
+from __future__ import division, unicode_literals
+
+import os
+import shutil
+import logging
+import tempfile
+import multiprocessing
+
+from encode import EncodeError
+from encode.accounting import ResourceUsage, peak_rss
+from encode.util import probe_duration, remove_path
+from encode.encoders import get_encoder_class
+
+from encode.benchmarks.stats import summarize
+
+
+__all__ = ['path_size', 'run_encoder', 'bench_profile', 'format_comparison']
+
+logger = logging.getLogger(__name__)
+
+
+def path_size(path):
+    """
+    Size of the file at ``path``, or of all files below the directory at
+    ``path``.
+
+    :param path: Location of the file or directory.
+    :type path: str
+    :rtype: int
+    """
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, dirs, files in os.walk(path) for name in files)
+
+
+def _encode(encoder, connection):
+    """
+    Run ``encoder`` and send the resource usage through ``connection``.
+    """
+    try:
+        with ResourceUsage() as usage:
+            encoder.start()
+    except Exception as error:
+        connection.send(('error', str(error)))
+    else:
+        connection.send(('ok', usage.as_dict()))
+    finally:
+        connection.close()
+
+
+def run_encoder(encoder):
+    """
+    Run ``encoder`` in a forked process and measure its resource usage.
+
+    :param encoder: Encoder instance.
+    :type encoder: :py:class:`~encode.encoders.BaseEncoder`
+    :rtype: dict
+    :returns: The measurements of
+        :py:class:`~encode.accounting.ResourceUsage`.
+    :raises: :py:exc:`~encode.EncodeError` if encoding failed.
+    """
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_encode,
+        args=(encoder, sender))
+    process.start()
+    sender.close()
+    try:
+        status, result = receiver.recv()
+    except EOFError:
+        status, result = 'error', None
+    finally:
+        process.join()
+        receiver.close()
+
+    if status == 'error':
+        raise EncodeError(result or "Encoder process exited with code "
+                          "{}".format(process.exitcode))
+
+    return result
+
+
+def bench_profile(profile, input_path, iterations=5, ffprobe='ffprobe'):
+    """
+    Encode ``input_path`` ``iterations`` times with ``profile``.
+
+    :param profile: The encoding profile.
+    :type profile: :py:class:`~encode.models.EncodingProfile`
+    :param input_path: Location of the reference input file.
+    :type input_path: str
+    :param iterations: Number of runs.
+    :type iterations: int
+    :param ffprobe: Name or path of the ``ffprobe`` executable, used to find
+        the duration of the media.
+    :type ffprobe: str
+    :rtype: dict
+    """
+    # the encoders read the encoder path of the profile: load it before
+    # forking so the child processes do not use the database connection
+    Encoder = get_encoder_class(profile.encoder_class)
+    if profile.streaming_format:
+        profile.get_renditions()
+    duration = probe_duration(input_path, ffprobe)
+
+    workdir = tempfile.mkdtemp(prefix='encode_bench_')
+    if profile.streaming_format:
+        output_path = os.path.join(workdir, 'output')
+    else:
+        output_path = os.path.join(workdir, 'output.{}'.format(
+            profile.container))
+    wall_time = []
+    cpu_time = []
+    max_rss = []
+
+    try:
+        for index in range(iterations):
+            remove_path(output_path)
+
+            usage = run_encoder(Encoder(profile, input_path, output_path))
+            wall_time.append(usage['wall_time'])
+            cpu_time.append(usage['user_time'] + usage['system_time'])
+            max_rss.append(usage['max_rss'])
+
+            logger.debug("{} run {}: {:.3f}s".format(profile.name, index + 1,
+                usage['wall_time']))
+
+        output_size = path_size(output_path)
+        if profile.streaming_format:
+            output_duration = duration
+        else:
+            output_duration = probe_duration(output_path, ffprobe) or duration
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    wall_time = summarize(wall_time)
+    realtime_factor = None
+    if duration and wall_time['median']:
+        realtime_factor = duration / wall_time['median']
+    bitrate = None
+    if output_duration:
+        bitrate = output_size * 8 / output_duration
+
+    return {
+        'profile': profile.name,
+        'encoder_class': profile.encoder_class,
+        'iterations': iterations,
+        'input_size': os.path.getsize(input_path),
+        'duration': duration,
+        'wall_time': wall_time,
+        'cpu_time': summarize(cpu_time),
+        'realtime_factor': realtime_factor,
+        'max_rss': peak_rss(max_rss),
+        'output_size': output_size,
+        'output_bitrate': bitrate,
+    }
+
+
+#: Rows of :py:func:`format_comparison`: label and a function that formats
+#: the value of a result.
+ROWS = (
+    ('wall time (median)', lambda r: '{:.3f} s'.format(
+        r['wall_time']['median'])),
+    ('wall time (p95)', lambda r: '{:.3f} s'.format(r['wall_time']['p95'])),
+    ('realtime factor', lambda r: '-' if r['realtime_factor'] is None
+        else '{:.2f}x'.format(r['realtime_factor'])),
+    ('cpu time (median)', lambda r: '{:.3f} s'.format(
+        r['cpu_time']['median'])),
+    ('peak rss', lambda r: '-' if r['max_rss'] is None
+        else '{} KB'.format(r['max_rss'])),
+    ('output size', lambda r: '{} bytes'.format(r['output_size'])),
+    ('output bitrate', lambda r: '-' if r['output_bitrate'] is None
+        else '{:.1f} kbit/s'.format(r['output_bitrate'] / 1000)),
+)
+
+
+def format_comparison(results):
+    """
+    Format the results of :py:func:`bench_profile` as a table with a column
+    for each profile.
+
+    :param results: Results of one or more profiles.
+    :type results: list
+    :rtype: str
+    """
+    table = [[''] + [result['profile'] for result in results]]
+    for label, fmt in ROWS:
+        table.append([label] + [fmt(result) for result in results])
+
+    widths = [max(len(row[column]) for row in table)
+              for column in range(len(table[0]))]
+
+    return '\n'.join('  '.join(cell.ljust(width)
+                               for cell, width in zip(row, widths)).rstrip()
+                     for row in table)
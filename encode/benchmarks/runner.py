@@ -0,0 +1,140 @@
+# Copyright Collab 2016
+# See LICENSE for details.
+
+"""
+Command-line runner that writes the benchmark results to a JSON file.
+"""
+
+from __future__ import unicode_literals
+
+import sys
+import json
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+from datetime import datetime
+
+import django
+from django.conf import settings
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from encode import version
+
+
+__all__ = ['main']
+
+logger = logging.getLogger(__name__)
+
+#: Names of the benchmark suites.
+SUITES = ['imports', 'pipeline', 'images']
+
+
+def environment():
+    """
+    Describe the environment the benchmarks are running in.
+
+    :rtype: dict
+    """
+    return {
+        'encode': version,
+        'django': django.get_version(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'created_at': datetime.utcnow().isoformat() + 'Z',
+    }
+
+
+def write_results(path, suites):
+    """
+    Write the benchmark ``suites`` and a description of the environment
+    to ``path`` as JSON.
+
+    :param path: Location of the results file.
+    :type path: str
+    :param suites: Dictionary with the results of each benchmark suite.
+    :type suites: dict
+    """
+    results = dict(environment=environment(), **suites)
+
+    with open(path, 'w') as output:
+        json.dump(results, output, indent=2, sort_keys=True)
+
+
+def main(argv=None):
+    """
+    Run the import time benchmarks, the pipeline benchmarks against a test
+    database, and the image benchmarks.
+    """
+    parser = argparse.ArgumentParser(
+        description='Benchmark the django-encode pipeline.')
+    parser.add_argument('-n', '--iterations', type=int, default=5,
+        help='Number of runs for each scenario (default: 5).')
+    parser.add_argument('-o', '--output', default='benchmark.json',
+        help='Location of the JSON results file (default: benchmark.json).')
+    parser.add_argument('-s', '--scenario', action='append', dest='scenarios',
+        help='Only run this scenario. Can be used multiple times.')
+    parser.add_argument('--suite', action='append', dest='suites',
+        choices=SUITES,
+        help='Only run this benchmark suite. Can be used multiple times '
+             '(default: all suites).')
+    args = parser.parse_args(argv)
+    suites = args.suites or SUITES
+
+    django.setup()
+
+    from encode.benchmarks.imports import run_imports
+    from encode.benchmarks.pipeline import run_pipeline
+    from encode.benchmarks.images import run_images
+
+    results = {}
+    if 'imports' in suites:
+        results['imports'] = run_imports(args.iterations)
+
+    if 'pipeline' in suites:
+        workdir = tempfile.mkdtemp(prefix='encode_bench_')
+        setup_test_environment()
+        db_name = connection.creation.create_test_db(verbosity=0)
+        try:
+            results['pipeline'] = run_pipeline(workdir, args.iterations,
+                args.scenarios)
+        finally:
+            connection.creation.destroy_test_db(db_name, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(workdir, ignore_errors=True)
+            shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+
+    if 'images' in suites:
+        workdir = tempfile.mkdtemp(prefix='encode_bench_')
+        try:
+            results['images'] = run_images(workdir, args.iterations)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    write_results(args.output, results)
+
+    for result in results.get('imports', []):
+        sys.stdout.write("{name}: django.setup() median {setup:.3f}s, "
+            "import median {imported:.3f}s\n".format(
+                name=result['name'],
+                setup=result['setup']['median'],
+                imported=result['import']['median']))
+    for result in results.get('pipeline', []):
+        sys.stdout.write("{name}: encode median {median:.3f}s, "
+            "{files:.2f} files/s\n".format(
+                name=result['name'],
+                median=result['stages']['encode']['median'],
+                files=result['throughput']['files_per_second']))
+    for result in results.get('images', []):
+        if result['error']:
+            sys.stdout.write("{name}: failed: {error}\n".format(**result))
+            continue
+        sys.stdout.write("{name}: {variants} variants median {median:.3f}s, "
+            "{rate:.1f} variants/s\n".format(
+                name=result['name'],
+                variants=result['variants'],
+                median=result['wall_time']['median'],
+                rate=result['variants_per_second']))
+    sys.stdout.write("Results written to {}\n".format(args.output))
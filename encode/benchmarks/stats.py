@@ -0,0 +1,68 @@
+# Copyright Collab 2016
+# See LICENSE for details.
+
+"""
+Statistics for benchmark samples.
+"""
+
+from __future__ import division, unicode_literals
+
+from timeit import default_timer
+
+
+__all__ = ['Timer', 'summarize']
+
+
+class Timer(object):
+    """
+    Context manager that measures the elapsed time of its block in seconds.
+    """
+    elapsed = 0.0
+
+    def __enter__(self):
+        self._started = default_timer()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.elapsed = default_timer() - self._started
+
+
+def percentile(samples, percent):
+    """
+    Nearest-rank percentile of sorted ``samples``.
+
+    :param samples: Sorted list of numbers.
+    :type samples: list
+    :param percent: Percentile, between 0 and 100.
+    :type percent: int
+    """
+    if not samples:
+        return None
+
+    rank = int(round(percent / 100 * (len(samples) - 1)))
+    return samples[rank]
+
+
+def summarize(samples):
+    """
+    Summarize latency samples.
+
+    :param samples: Elapsed times in seconds.
+    :type samples: list
+    :rtype: dict
+    :returns: Dictionary with ``count``, ``total``, ``min``, ``max``,
+        ``mean``, ``median`` and ``p95``.
+    """
+    ordered = sorted(samples)
+    total = sum(ordered)
+    count = len(ordered)
+
+    return {
+        'count': count,
+        'total': total,
+        'min': ordered[0] if ordered else None,
+        'max': ordered[-1] if ordered else None,
+        'mean': total / count if count else None,
+        'median': percentile(ordered, 50),
+        'p95': percentile(ordered, 95),
+    }
@@ -0,0 +1,182 @@
+# Copyright Collab 2016
+# See LICENSE for details.
+
+"""
+Bulk operations on many media objects.
+
+These functions use bulk queries to update the media objects and do not call
+:py:meth:`~encode.models.MediaBase.save` on them, so none of its side effects
+(signals, transfers of the input file, ``modified_at`` updates) happen for
+each object.
+"""
+
+from __future__ import unicode_literals
+
+import time
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+
+from encode.conf import settings
+from encode.models import MediaBase, MediaFile
+from encode.routing import default_options
+
+
+__all__ = ['batched', 'reencode', 'retry', 'cancel', 'defer']
+
+logger = logging.getLogger(__name__)
+
+
+def batched(queryset, batch_size=None):
+    """
+    Iterate over the primary keys of ``queryset`` in batches.
+
+    The batches are selected by seeking past the last primary key of the
+    previous batch, so rows that still match the queryset after they were
+    processed are not returned again.
+
+    :param queryset: The media objects.
+    :type queryset: :py:class:`django.db.models.query.QuerySet`
+    :param batch_size: Maximum number of primary keys in a batch. Defaults
+        to :py:data:`~encode.conf.EncodeConf.BULK_BATCH_SIZE`.
+    :type batch_size: int
+    :rtype: generator
+    """
+    batch_size = batch_size or settings.ENCODE_BULK_BATCH_SIZE
+    # order by the primary key column: ordering by ``pk`` on a subclass of
+    # MediaBase follows the parent link and uses the ordering of MediaBase
+    pk_column = queryset.model._meta.pk.attname
+    pks = queryset.order_by(pk_column).values_list('pk', flat=True)
+    last = None
+
+    while True:
+        batch = pks if last is None else pks.filter(pk__gt=last)
+        batch = list(batch[:batch_size])
+        if not batch:
+            break
+
+        yield batch
+        last = batch[-1]
+
+
+def reencode(queryset, batch_size=None, delay=None):
+    """
+    Encode the input files of the media objects in ``queryset`` again, with
+    all of their encoding profiles.
+
+    The previous output files are deleted, and their files in storage when
+    no other media file refers to them, see
+    :py:meth:`~encode.models.MediaFileManager.release`. Media objects
+    without an input file, e.g. because it was removed after encoding, are
+    skipped.
+
+    :param queryset: The media objects.
+    :type queryset: :py:class:`django.db.models.query.QuerySet`
+    :param batch_size: Number of media objects that are enqueued at once.
+        Defaults to :py:data:`~encode.conf.EncodeConf.BULK_BATCH_SIZE`.
+    :type batch_size: int
+    :param delay: Number of seconds to wait between batches, to throttle the
+        load on the broker and encoders. Defaults to
+        :py:data:`~encode.conf.EncodeConf.BULK_DELAY`.
+    :type delay: float
+    :rtype: dict
+    :returns: Number of ``queued`` and ``skipped`` media objects.
+    """
+    if delay is None:
+        delay = settings.ENCODE_BULK_DELAY
+    result = {'queued': 0, 'skipped': 0}
+
+    for index, pks in enumerate(batched(queryset, batch_size)):
+        if index and delay:
+            time.sleep(delay)
+
+        batch = list(MediaBase.objects.filter(pk__in=pks).exclude(
+            input_file='').exclude(input_file__isnull=True))
+        result['skipped'] += len(pks) - len(batch)
+        if not batch:
+            continue
+
+        # delete the previous output files and reset the status in bulk,
+        # before the jobs of the batch can store the new output files
+        encodable = [media.pk for media in batch]
+        with transaction.atomic():
+            links = MediaBase.output_files.through.objects.filter(
+                mediabase_id__in=encodable)
+            previous = list(links.values_list('mediafile_id', flat=True))
+            links.delete()
+            MediaFile.objects.release(previous)
+            MediaBase.objects.filter(pk__in=encodable).update(
+                encoded=False, uploaded=False, encoding=True,
+                modified_at=timezone.now())
+
+        # the jobs of the batch are sent to the broker at once, with the
+        # jobs of the media type, e.g. the thumbnail job of a video
+        with transaction.atomic():
+            for media in MediaBase.objects.get_media(batch, 'profiles'):
+                media.encoding = True
+                media.enqueue(list(media.profiles.all()), transfer=True)
+        result['queued'] += len(batch)
+
+        logger.info("Enqueued batch of {} media objects".format(len(batch)))
+
+    return result
+
+
+def retry(queryset, batch_size=None, delay=None):
+    """
+    Encode the media objects in ``queryset`` that did not complete encoding
+    again. See :py:func:`reencode`.
+
+    :rtype: dict
+    :returns: Number of ``queued`` and ``skipped`` media objects.
+    """
+    return reencode(queryset.filter(encoded=False), batch_size, delay)
+
+
+def cancel(queryset, batch_size=None):
+    """
+    Cancel encoding the media objects in ``queryset``.
+
+    Jobs that are already queued still run on the encoder, but their output
+    files are not stored by :py:class:`~encode.tasks.StoreMedia`.
+
+    :param queryset: The media objects.
+    :type queryset: :py:class:`django.db.models.query.QuerySet`
+    :param batch_size: Number of media objects that are updated at once.
+    :type batch_size: int
+    :rtype: int
+    :returns: Number of canceled media objects.
+    """
+    canceled = 0
+    for pks in batched(queryset.filter(encoded=False, encoding=True),
+                       batch_size):
+        canceled += MediaBase.objects.filter(pk__in=pks).update(
+            encoding=False, modified_at=timezone.now())
+
+    return canceled
+
+
+def defer(action, queryset):
+    """
+    Run the bulk ``action`` on the media objects in ``queryset`` in a
+    :py:class:`~encode.tasks.BulkMedia` task, e.g. for a selection that is
+    too large to process in a request.
+
+    The query of ``queryset`` is sent with the task, not the primary keys of
+    the media objects, so it is not evaluated here.
+
+    :param action: Name of the bulk function: ``reencode``, ``retry`` or
+        ``cancel``.
+    :type action: str
+    :param queryset: The media objects.
+    :type queryset: :py:class:`django.db.models.query.QuerySet`
+    """
+    if action not in ('reencode', 'retry', 'cancel'):
+        raise ValueError("Unknown bulk action: {}".format(action))
+
+    # import the tasks here to prevent a circular import
+    from encode.tasks import BulkMedia
+
+    BulkMedia().apply_async(args=[action, queryset.model, queryset.query],
+        **default_options())
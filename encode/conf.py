@@ -25,13 +25,16 @@ class EncodeConf(AppConf):
     #: files for the encode application.
     MEDIA_ROOT = os.path.join(settings.MEDIA_ROOT, MEDIA_PATH_NAME)
 
-    #: TODO
+    #: Names of the encoding profiles for audio files that are ingested by
+    #: the ``encode_ingest`` management command.
     AUDIO_PROFILES = []
 
-    #: TODO
+    #: Names of the encoding profiles for video files that are ingested by
+    #: the ``encode_ingest`` management command.
     VIDEO_PROFILES = []
 
-    #: TODO
+    #: Names of the encoding profiles for image files that are ingested by
+    #: the ``encode_ingest`` management command.
     IMAGE_PROFILES = []
 
     #: TODO
@@ -60,5 +63,128 @@ class EncodeConf(AppConf):
     #: TODO
     DEFAULT_ENCODER_CLASS = "encode.encoders.BasicEncoder"
 
+    #: Name of the Celery queue for the encoding jobs.
+    JOB_QUEUE = "encoder"
+
+    #: Routing key of the encoding jobs.
+    JOB_ROUTING_KEY = "media.encode"
+
+    #: Send the encoding jobs of each encoder to a queue of its own, named
+    #: after the :py:data:`JOB_QUEUE` and the encoder, e.g.
+    #: ``encoder.ffmpeg``. Workers only consume the queues of the encoders
+    #: that they can run, see :py:func:`encode.health.add_encoder_queues`.
+    QUEUE_PER_ENCODER = False
+
+    #: Send the encoding jobs of each profile to a queue that is named after
+    #: what the profile needs: the encoder, the codecs selected in its
+    #: command and the number of threads, e.g. ``encoder.ffmpeg.libx265``.
+    #: Workers only consume the queues of the profiles that their
+    #: capabilities satisfy, see :py:func:`encode.health.worker_capabilities`.
+    ROUTE_BY_CAPABILITIES = False
+
+    #: Capabilities that a worker advertises instead of probing its encoders,
+    #: e.g. ``{'cores': 4, 'encoders': {'ffmpeg': {'codecs': ['libx264']}}}``.
+    #: Useful to test the routing with several local workers.
+    WORKER_CAPABILITIES = None
+
+    #: Send the encoding jobs to the broker after the transaction that
+    #: enqueued them is committed, see :py:mod:`encode.outbox`. When
+    #: disabled, the jobs are sent right away, e.g. in tests that run in a
+    #: transaction that is never committed.
+    DISPATCH_ON_COMMIT = True
+
+    #: Number of media objects that are enqueued at once by the bulk admin
+    #: actions and the ``encode_reencode`` management command.
+    BULK_BATCH_SIZE = 100
+
+    #: Number of seconds to wait between batches of the ``encode_reencode``
+    #: management command, to throttle the load on the broker and encoders.
+    BULK_DELAY = 0
+
+    #: Maximum number of media objects that the bulk admin actions process
+    #: in the request. Larger selections are handed to the
+    #: :py:class:`~encode.tasks.BulkMedia` task.
+    BULK_ASYNC_THRESHOLD = 500
+
+    #: Number of files that the ``encode_ingest`` management command hashes,
+    #: stores and transfers in parallel.
+    INGEST_WORKERS = 4
+
+    #: Positions of the thumbnails that are extracted from every video, as
+    #: timestamps or percentages of the duration, e.g.
+    #: ``['10%', '50%', '00:01:30']``. The first thumbnail is the poster of
+    #: the video. No thumbnails are extracted when empty.
+    THUMBNAIL_POSITIONS = []
+
+    #: Width of the thumbnails in pixels, or ``None`` for the width of the
+    #: video.
+    THUMBNAIL_WIDTH = 320
+
+    #: Image format of the thumbnails.
+    THUMBNAIL_FORMAT = "jpg"
+
+    #: Name or path of the ``ffmpeg`` executable that extracts thumbnails.
+    FFMPEG_PATH = "ffmpeg"
+
+    #: Name or path of the ``ffprobe`` executable that finds the duration of
+    #: videos.
+    FFPROBE_PATH = "ffprobe"
+
+    #: Number of image variants that the
+    #: :py:class:`~encode.encoders.PillowEncoder` renders in parallel.
+    IMAGE_WORKERS = 4
+
+    #: Number of peaks in the waveform of audio that is encoded by the
+    #: :py:class:`~encode.encoders.AudioEncoder`.
+    WAVEFORM_PEAKS = 200
+
+    #: Number of output files of one encoding job that are uploaded to the
+    #: CDN storage in parallel.
+    UPLOAD_WORKERS = 4
+
+    #: Name the encoded files in the CDN storage after the hash of their
+    #: content, in sharded directories. Identical outputs are uploaded and
+    #: stored once and shared by the media objects, and a stored file is
+    #: deleted with the last media object that refers to it.
+    CONTENT_ADDRESSED_STORAGE = False
+
+    #: Number of seconds that the URLs of the encoded files in the CDN
+    #: storage are cached, at most half the lifetime of signed URLs. ``0``
+    #: disables the cache, ``None`` caches URLs that are not signed forever.
+    URL_CACHE_TIMEOUT = 3600
+
+    #: Number of times that an encoding or storing job is retried after a
+    #: transient error, e.g. an I/O error or a timeout of the CDN.
+    TASK_MAX_RETRIES = 5
+
+    #: Delay of the first retry in seconds. The delay doubles with every
+    #: retry.
+    RETRY_BACKOFF = 2
+
+    #: Maximum delay of a retry in seconds.
+    RETRY_BACKOFF_MAX = 600
+
+    #: Pick a random delay between zero and the backoff, so the retries of
+    #: many jobs that failed at the same time are spread out.
+    RETRY_JITTER = True
+
+    #: Maximum number of clients of each storage that a worker process uses
+    #: at the same time, see :py:mod:`encode.pool`. The clients are kept
+    #: alive and reused by the next tasks.
+    STORAGE_POOL_SIZE = 4
+
+    #: Number of seconds that a storage client can be idle before it's
+    #: checked, and replaced when the check fails, the next time it's used.
+    STORAGE_POOL_CHECK_INTERVAL = 60
+
+    #: Use the row count estimated by the database (PostgreSQL and MySQL)
+    #: instead of a full ``COUNT(*)`` in the admin changelists. The keyset
+    #: pages of the media changelists always use the estimate.
+    ADMIN_ESTIMATED_COUNT = False
+
+    #: Minimum number of estimated rows before the estimate is used instead of
+    #: an exact count.
+    ADMIN_ESTIMATED_COUNT_THRESHOLD = 100000
+
     # override the default prefix
     CACHE_PREFIX = 'encode'
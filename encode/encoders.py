@@ -5,27 +5,39 @@
 Encoders.
 """
 
-from __future__ import unicode_literals
+from __future__ import division, unicode_literals
 
 import os
+import re
 import shlex
 import logging
+import tempfile
 import subprocess
 
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
+
 try:
     from django.utils.module_loading import import_string
 except ImportError:
     from django.utils.module_loading import import_by_path as import_string
 
-from converter.ffmpeg import FFMpeg, FFMpegError, FFMpegConvertError
-
-from encode import EncodeError
+from encode import EncodeError, HLS, DASH
 from encode.conf import settings
+from encode.accounting import wait_process
+from encode.util import find_outputs, run_threads
+from encode.audio import ANALYSIS_RATE, Waveform, parse_loudness
 
 
 logger = logging.getLogger(__name__)
 
 
+#: Encoder classes that were imported, by import path.
+_encoder_classes = {}
+
+
 def get_encoder_class(import_path=None):
     """
     Get the encoder class by supplying a fully qualified path to
@@ -34,6 +46,8 @@ def get_encoder_class(import_path=None):
     If ``import_path`` is ``None`` the default encoder class specified in the
     :py:data:`~encode.conf.ENCODE_DEFAULT_ENCODER_CLASS` is returned.
 
+    The class is imported once and cached for the lifetime of the process.
+
     :param import_path: Fully qualified path of the encoder class, for example:
         ``encode.encoders.BasicEncoder``.
     :type import_path: str
@@ -41,7 +55,11 @@ def get_encoder_class(import_path=None):
     :returns: The encoder class.
     :rtype: class
     """
-    return import_string(import_path or settings.ENCODE_DEFAULT_ENCODER_CLASS)
+    import_path = import_path or settings.ENCODE_DEFAULT_ENCODER_CLASS
+    if import_path not in _encoder_classes:
+        _encoder_classes[import_path] = import_string(import_path)
+
+    return _encoder_classes[import_path]
 
 
 class BaseEncoder(object):
@@ -55,10 +73,70 @@ class BaseEncoder(object):
     :param output_path:
     :type output_path: str
     """
-    def __init__(self, profile, input_path=None, output_path=None):
+    #: Options that make the encoder executable print its version, tried in
+    #: order by :py:func:`~encode.health.probe_encoder`.
+    version_options = ('-version', '--version')
+
+    #: Indicates if the encoder runs an executable, see
+    #: :py:func:`~encode.health.probe_encoder`.
+    executable = True
+
+    #: Indicates if the encoder can encode the output of several profiles
+    #: from the same input in one job, see :py:attr:`variants`.
+    supports_variants = False
+
+    #: Analysis of the input that is stored on the media after encoding,
+    #: e.g. by the :py:class:`AudioEncoder`.
+    analysis = None
+
+    def __init__(self, profile, input_path=None, output_path=None,
+                 variants=None):
         self.profile = profile
         self.input_path = input_path
         self.output_path = output_path
+        #: The other profiles and their output paths, as ``(profile,
+        #: output_path)`` tuples, for encoders that
+        #: :py:attr:`supports_variants`.
+        self.variants = list(variants or [])
+
+    @classmethod
+    def check(cls):
+        """
+        Check that the Python dependencies of this encoder are installed.
+
+        :raises: :py:exc:`~encode.EncodeError` if a dependency is missing.
+        """
+        pass
+
+    @classmethod
+    def profile_options(cls, profile):
+        """
+        The options that this encoder passes on for ``profile``, see
+        :py:func:`~encode.routing.profile_requirements`.
+
+        :param profile: The encoding profile.
+        :type profile: :py:class:`~encode.models.EncodingProfile`
+        :rtype: list
+        """
+        return shlex.split(profile.command or '')
+
+    def prepare_output(self):
+        """
+        Create the output directory of a profile with multiple outputs.
+        """
+        directory = self.profile.directory_output
+        if directory and not os.path.isdir(self.output_path):
+            os.makedirs(self.output_path)
+
+    def outputs(self):
+        """
+        The manifest of the files produced by the encoder.
+
+        :rtype: list
+        :returns: Locations of the output file, or of the files below the
+            output directory of a profile with multiple outputs.
+        """
+        return find_outputs(self.output_path)
 
     def _build_exception(self, error, command):
         """
@@ -96,6 +174,15 @@ class BaseEncoder(object):
 
         return str(self.profile.encode_cmd.format(**args))
 
+    @property
+    def arguments(self):
+        """
+        The :py:attr:`command` split into a list of arguments.
+
+        :rtype: list
+        """
+        return shlex.split(self.command)
+
 
 class BasicEncoder(BaseEncoder):
     """
@@ -108,10 +195,12 @@ class BasicEncoder(BaseEncoder):
         :raises: :py:exc:`~encode.EncodeError` if something goes wrong
             during encoding.
         """
-        command = shlex.split(self.command)
+        command = self.arguments
+        self.prepare_output()
 
         try:
-            subprocess.check_output(command, stderr=subprocess.STDOUT)
+            process = subprocess.Popen(command, stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT)
 
         except OSError as error:
             if error.errno == os.errno.ENOENT:
@@ -122,7 +211,16 @@ class BasicEncoder(BaseEncoder):
                 exc = self._build_exception(str(error), self.command)
             raise exc
 
-        except subprocess.CalledProcessError as error:
+        try:
+            output = process.stdout.read()
+        finally:
+            process.stdout.close()
+            # measures the peak memory usage of the process
+            returncode = wait_process(process)
+
+        if returncode != 0:
+            error = subprocess.CalledProcessError(returncode, command,
+                output=output)
             exc = self._build_exception(error, self.command)
             raise exc
 
@@ -131,6 +229,14 @@ class FFMpegEncoder(BaseEncoder):
     """
     Encoder that uses the `FFMpeg <https://ffmpeg.org>`_ tool.
     """
+    @classmethod
+    def check(cls):
+        try:
+            import converter.ffmpeg  # noqa
+        except ImportError as error:
+            raise EncodeError("python-video-converter is not installed: "
+                              "{}".format(error))
+
     def start(self):
         """
         Start encoding.
@@ -138,7 +244,12 @@ class FFMpegEncoder(BaseEncoder):
         :raises: :py:exc:`~encode.EncodeError` if something goes wrong
             during encoding.
         """
+        # python-video-converter is only imported by the workers that use
+        # this encoder
+        from converter.ffmpeg import FFMpeg, FFMpegError, FFMpegConvertError
+
         command = shlex.split(self.profile.command)
+        self.prepare_output()
 
         try:
             ffmpeg = FFMpeg(self.profile.encoder.path)
@@ -153,3 +264,465 @@ class FFMpegEncoder(BaseEncoder):
         except FFMpegConvertError as error:
             exc = self._build_exception(error.details, self.profile.command)
             raise exc
+
+
+class LadderEncoder(BasicEncoder):
+    """
+    Encoder that uses `FFMpeg <https://ffmpeg.org>`_ to encode all
+    renditions of an adaptive bitrate ladder in one pass: the input is
+    decoded once and the video is split and scaled for each rendition.
+
+    The ``output_path`` is a directory that receives the master playlist
+    (HLS) or manifest (DASH) and the playlists and segments of the
+    renditions. The ``command`` of the profile holds extra output options,
+    e.g. ``-c:v libx264 -preset veryfast``.
+    """
+    #: Codecs that are used unless the profile command selects others.
+    default_options = ['-c:v', 'libx264', '-c:a', 'aac']
+
+    @classmethod
+    def profile_options(cls, profile):
+        """
+        The :py:attr:`default_options` followed by the options in the
+        command of ``profile``, which override them.
+
+        :param profile: The encoding profile.
+        :type profile: :py:class:`~encode.models.EncodingProfile`
+        :rtype: list
+        """
+        options = super(LadderEncoder, cls).profile_options(profile)
+        return list(cls.default_options) + options
+
+    @property
+    def renditions(self):
+        """
+        The renditions of the ladder, highest first.
+
+        :rtype: list
+        :raises: :py:exc:`~encode.EncodeError` if the profile has no
+            renditions.
+        """
+        renditions = self.profile.get_renditions()
+        if not renditions:
+            raise EncodeError("Profile '{}' has no renditions".format(
+                self.profile))
+
+        return renditions
+
+    def stream_options(self):
+        """
+        The filter graph, maps and bitrates of the renditions.
+
+        :rtype: list
+        """
+        renditions = self.renditions
+        graph = ['[0:v]split={}{}'.format(len(renditions), ''.join(
+            '[s{}]'.format(index) for index in range(len(renditions))))]
+        options = []
+        audio = 0
+
+        for index, rendition in enumerate(renditions):
+            graph.append('[s{0}]scale={1}:{2}[v{0}]'.format(index,
+                rendition.width, rendition.height))
+            options += [
+                '-map', '[v{}]'.format(index),
+                '-b:v:{}'.format(index), '{}k'.format(rendition.video_bitrate),
+            ]
+            if rendition.audio_bitrate:
+                options += [
+                    '-map', '0:a:0',
+                    '-b:a:{}'.format(audio),
+                    '{}k'.format(rendition.audio_bitrate),
+                ]
+                audio += 1
+
+        # segment boundaries need a keyframe in every rendition
+        options += [
+            '-force_key_frames',
+            'expr:gte(t,n_forced*{})'.format(self.profile.segment_duration),
+        ]
+
+        return ['-filter_complex', ';'.join(graph)] + options
+
+    def format_options(self):
+        """
+        The muxer options of the streaming format of the profile.
+
+        :rtype: list
+        """
+        segment_duration = str(self.profile.segment_duration)
+
+        if self.profile.streaming_format == HLS:
+            streams = []
+            audio = 0
+            for index, rendition in enumerate(self.renditions):
+                stream = 'v:{}'.format(index)
+                if rendition.audio_bitrate:
+                    stream += ',a:{}'.format(audio)
+                    audio += 1
+                streams.append(stream)
+
+            return [
+                '-f', 'hls',
+                '-hls_time', segment_duration,
+                '-hls_playlist_type', 'vod',
+                '-hls_segment_filename',
+                os.path.join(self.output_path, 'v%v', 'segment%05d.ts'),
+                '-master_pl_name', self.profile.playlist_name,
+                '-var_stream_map', ' '.join(streams),
+                os.path.join(self.output_path, 'v%v', 'index.m3u8'),
+            ]
+
+        elif self.profile.streaming_format == DASH:
+            sets = 'id=0,streams=v'
+            if any(rendition.audio_bitrate for rendition in self.renditions):
+                sets += ' id=1,streams=a'
+
+            return [
+                '-f', 'dash',
+                '-seg_duration', segment_duration,
+                '-use_template', '1',
+                '-use_timeline', '1',
+                '-adaptation_sets', sets,
+                os.path.join(self.output_path, self.profile.playlist_name),
+            ]
+
+        raise EncodeError("Unsupported streaming format: {}".format(
+            self.profile.streaming_format))
+
+    @property
+    def arguments(self):
+        """
+        The arguments of the ``ffmpeg`` command.
+
+        :rtype: list
+        """
+        command = self.profile.encoder.encode_cmd
+        if '-y' not in command:
+            command.append('-y')
+
+        command += ['-i', self.input_path]
+        command += self.stream_options()
+        command += self.profile_options(self.profile)
+
+        return command + self.format_options()
+
+    @property
+    def command(self):
+        """
+        The ``ffmpeg`` command, eg. ``ffmpeg -y -i /path/to/input.mov
+        -filter_complex ... -f hls ... /path/to/output/v%v/index.m3u8``.
+
+        :rtype: str
+        """
+        return ' '.join(quote(argument) for argument in self.arguments)
+
+
+#: Pillow formats of the profile containers.
+PILLOW_FORMATS = {
+    'bmp': 'BMP',
+    'gif': 'GIF',
+    'jpeg': 'JPEG',
+    'jpg': 'JPEG',
+    'png': 'PNG',
+    'tif': 'TIFF',
+    'tiff': 'TIFF',
+    'webp': 'WEBP',
+}
+
+#: ImageMagick geometry of the resize options, e.g. ``320x240``, ``320``,
+#: ``x240``, ``320x240!`` (exact size) or ``320x240^`` (fill the size).
+GEOMETRY = re.compile(r'^(?P<width>\d+)?(?:x(?P<height>\d+))?'
+                      r'(?P<flag>[!^>]?)$')
+
+
+class PillowEncoder(BaseEncoder):
+    """
+    Encoder that resizes and converts images in-process with
+    `Pillow <https://python-pillow.org>`_, instead of starting an
+    ImageMagick ``convert`` process for every profile.
+
+    The input is decoded once and the output of every profile in
+    :py:attr:`~BaseEncoder.variants` is rendered from the decoded image in
+    :py:data:`~encode.conf.EncodeConf.IMAGE_WORKERS` threads.
+
+    The command of the profile supports a subset of the ``convert``
+    options, so the ImageMagick profiles keep working: ``-resize``,
+    ``-thumbnail`` or ``-scale`` with a geometry, ``-quality`` and
+    ``-strip``. The container of the profile selects the image format.
+    Example: ``"{input}" -resize 320x240 -quality 85 "{output}"``.
+    """
+    executable = False
+    supports_variants = True
+
+    @classmethod
+    def check(cls):
+        try:
+            import PIL.Image  # noqa
+        except ImportError as error:
+            raise EncodeError("Pillow is not installed: {}".format(error))
+
+    @staticmethod
+    def parse_options(profile):
+        """
+        Parse the command of ``profile``.
+
+        :param profile: The encoding profile.
+        :type profile: :py:class:`~encode.models.EncodingProfile`
+        :rtype: dict
+        :returns: The ``format``, the ``width``, ``height`` and resize
+            ``mode`` (``fit``, ``exact``, ``fill`` or ``shrink``) and the
+            ``quality``.
+        :raises: :py:exc:`~encode.EncodeError` if the command contains an
+            unsupported option.
+        """
+        options = {
+            'format': PILLOW_FORMATS.get((profile.container or '').lower()),
+            'width': None,
+            'height': None,
+            'mode': None,
+            'quality': None,
+        }
+        if options['format'] is None:
+            raise EncodeError("Unsupported image format: {}".format(
+                profile.container))
+
+        args = shlex.split(profile.command or '')
+        while args:
+            arg = args.pop(0)
+            if arg in ('{input}', '{output}', '-strip'):
+                continue
+
+            if arg in ('-resize', '-thumbnail', '-scale') and args:
+                match = GEOMETRY.match(args.pop(0))
+                if match is None or not any(match.group('width', 'height')):
+                    raise EncodeError("Invalid geometry in: {}".format(
+                        profile.command))
+                options['width'] = int(match.group('width') or 0) or None
+                options['height'] = int(match.group('height') or 0) or None
+                options['mode'] = {'!': 'exact', '^': 'fill',
+                                   '>': 'shrink'}.get(match.group('flag'),
+                                                      'fit')
+
+            elif arg == '-quality' and args:
+                try:
+                    options['quality'] = int(args.pop(0))
+                except ValueError:
+                    raise EncodeError("Invalid quality in: {}".format(
+                        profile.command))
+
+            else:
+                raise EncodeError("Unsupported option for Pillow: "
+                                  "{}".format(arg))
+
+        return options
+
+    @staticmethod
+    def target_size(size, options):
+        """
+        The size of the output image.
+
+        :param size: Width and height of the input image.
+        :type size: tuple
+        :param options: See :py:meth:`parse_options`.
+        :type options: dict
+        :rtype: tuple
+        """
+        width, height = size
+        mode = options['mode']
+        if mode is None:
+            return size
+
+        if mode == 'exact' and options['width'] and options['height']:
+            return options['width'], options['height']
+
+        scales = []
+        if options['width']:
+            scales.append(options['width'] / width)
+        if options['height']:
+            scales.append(options['height'] / height)
+        scale = max(scales) if mode == 'fill' else min(scales)
+        if mode == 'shrink':
+            scale = min(scale, 1)
+
+        return (max(int(round(width * scale)), 1),
+                max(int(round(height * scale)), 1))
+
+    def render(self, image, profile, output_path):
+        """
+        Resize the decoded ``image`` for ``profile`` and save it to
+        ``output_path``.
+
+        :param image: The decoded input image.
+        :type image: :py:class:`PIL.Image.Image`
+        :param profile: The encoding profile.
+        :type profile: :py:class:`~encode.models.EncodingProfile`
+        :param output_path: Location of the output image.
+        :type output_path: str
+        """
+        from PIL import Image
+
+        options = self.parse_options(profile)
+        decoded = image
+        size = self.target_size(image.size, options)
+        if size != image.size:
+            image = image.resize(size, Image.LANCZOS)
+
+        if options['format'] == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+
+        if image is decoded:
+            # the variants are rendered in threads, and saving an image sets
+            # its save parameters: don't share the decoded image
+            image = image.copy()
+
+        params = {}
+        if options['quality'] is not None:
+            params['quality'] = options['quality']
+
+        image.save(output_path, options['format'], **params)
+
+    def start(self):
+        """
+        Start encoding.
+
+        :raises: :py:exc:`~encode.EncodeError` if something goes wrong
+            during encoding.
+        """
+        self.check()
+        from PIL import Image
+
+        jobs = [(self.profile, self.output_path)] + self.variants
+        for profile, output_path in jobs:
+            # fail before decoding
+            self.parse_options(profile)
+
+        try:
+            image = Image.open(self.input_path)
+            # decode once for all variants
+            image.load()
+        except (IOError, OSError) as error:
+            raise self._build_exception("Cannot decode {}: {}".format(
+                self.input_path, error), self.command)
+
+        def render(job):
+            self.render(image, *job)
+
+        try:
+            run_threads(render, jobs, settings.ENCODE_IMAGE_WORKERS)
+        except (IOError, OSError, ValueError) as error:
+            raise self._build_exception(error, self.command)
+
+
+class AudioEncoder(BaseEncoder):
+    """
+    Encoder that uses `FFMpeg <https://ffmpeg.org>`_ to encode the output of
+    every audio profile in :py:attr:`~BaseEncoder.variants` with a single
+    ``ffmpeg`` process: the input is decoded once and the decoded stream is
+    encoded to each output.
+
+    The same stream is analysed: its ``duration``, integrated ``loudness``
+    (EBU R128) and ``loudness_range``, and ``peaks`` for a waveform, are
+    available as :py:attr:`~BaseEncoder.analysis` after encoding.
+
+    The command of the profile holds the output options, e.g.
+    ``-c:a libmp3lame -b:a 192k``; an input (``-i "{input}"``) and output
+    (``"{output}"``) in the command are ignored.
+    """
+    supports_variants = True
+
+    #: Size of the chunks of the analysed stream that are read at once.
+    chunk_size = 64 * 1024
+
+    @staticmethod
+    def output_options(profile):
+        """
+        The output options in the command of ``profile``.
+
+        :param profile: The encoding profile.
+        :type profile: :py:class:`~encode.models.EncodingProfile`
+        :rtype: list
+        """
+        args = shlex.split(profile.command or '')
+        options = []
+        while args:
+            arg = args.pop(0)
+            if arg == '-i' and args:
+                args.pop(0)
+            elif arg not in ('-y', '{output}'):
+                options.append(arg)
+
+        return options
+
+    @property
+    def arguments(self):
+        """
+        The arguments of the ``ffmpeg`` command.
+
+        :rtype: list
+        """
+        command = shlex.split(self.profile.encoder.path)
+        command += ['-hide_banner', '-nostats', '-loglevel', 'info', '-y',
+                    '-i', self.input_path]
+
+        jobs = [(self.profile, self.output_path)] + self.variants
+        for profile, output_path in jobs:
+            command += ['-map', '0:a:0'] + self.output_options(profile)
+            command.append(output_path)
+
+        # loudness, reported in the log
+        command += ['-map', '0:a:0', '-af', 'ebur128', '-f', 'null', '-']
+        # mono PCM for the duration and waveform, on stdout
+        command += ['-map', '0:a:0', '-ac', '1', '-ar', str(ANALYSIS_RATE),
+                    '-c:a', 'pcm_s16le', '-f', 's16le', 'pipe:1']
+
+        return command
+
+    @property
+    def command(self):
+        """
+        The ``ffmpeg`` command, eg. ``ffmpeg ... -i /path/to/input.wav
+        -map 0:a:0 -c:a libmp3lame /path/to/output.mp3 ...``.
+
+        :rtype: str
+        """
+        return ' '.join(quote(argument) for argument in self.arguments)
+
+    def start(self):
+        """
+        Start encoding and analyse the decoded stream.
+
+        :raises: :py:exc:`~encode.EncodeError` if something goes wrong
+            during encoding.
+        """
+        command = self.arguments
+        waveform = Waveform()
+
+        with tempfile.TemporaryFile() as log:
+            try:
+                process = subprocess.Popen(command, stdout=subprocess.PIPE,
+                    stderr=log)
+            except OSError as error:
+                raise self._build_exception("{}: {}".format(
+                    command[0], str(error)), self.command)
+
+            try:
+                for chunk in iter(lambda: process.stdout.read(
+                        self.chunk_size), b''):
+                    waveform.feed(chunk)
+            finally:
+                process.stdout.close()
+                returncode = wait_process(process)
+
+            log.seek(0)
+            output = log.read().decode('utf-8', 'replace')
+
+        if returncode != 0:
+            error = subprocess.CalledProcessError(returncode, command,
+                output=output)
+            raise self._build_exception(error, self.command)
+
+        self.analysis = parse_loudness(output)
+        self.analysis['duration'] = waveform.duration
+        self.analysis['peaks'] = waveform.peaks(
+            settings.ENCODE_WAVEFORM_PEAKS)
@@ -0,0 +1,277 @@
+# Copyright Collab 2016
+# See LICENSE for details.
+
+"""
+Health checks for the encoders on a worker.
+"""
+
+from __future__ import unicode_literals
+
+import shlex
+import socket
+import logging
+import subprocess
+import multiprocessing
+
+try:
+    from shutil import which
+except ImportError:  # Python 2
+    from distutils.spawn import find_executable as which
+
+from django.db import DatabaseError
+
+from encode import EncodeError
+from encode.conf import settings
+from encode.models import Encoder, EncodingProfile
+from encode.encoders import get_encoder_class
+from encode.routing import (encoder_queue, profile_queue,
+    profile_requirements, satisfies, thumbnails_queue)
+
+
+__all__ = ['probe_encoder', 'check_encoders', 'probe_thumbnails',
+           'worker_capabilities', 'worker_queues', 'add_encoder_queues',
+           'encode_capabilities']
+
+logger = logging.getLogger(__name__)
+
+
+def get_version(executable, options):
+    """
+    The first line that ``executable`` prints when it's started with one of
+    the version ``options``.
+
+    :rtype: str or ``None``
+    """
+    for option in options:
+        try:
+            output = subprocess.check_output([executable, option],
+                stderr=subprocess.STDOUT)
+        except (OSError, subprocess.CalledProcessError):
+            continue
+
+        lines = output.decode('utf-8', 'replace').strip().splitlines()
+        if lines:
+            return lines[0].strip()
+
+    return None
+
+
+def get_codecs(executable):
+    """
+    Names of the codecs that an FFmpeg ``executable`` can encode with, as
+    listed by ``ffmpeg -encoders``.
+
+    :rtype: list
+    :returns: Sorted codec names, empty for other executables.
+    """
+    try:
+        output = subprocess.check_output([executable, '-hide_banner',
+            '-encoders'], stderr=subprocess.STDOUT)
+    except (OSError, subprocess.CalledProcessError):
+        return []
+
+    codecs = set()
+    listing = False
+    for line in output.decode('utf-8', 'replace').splitlines():
+        # the codecs are listed after the legend, e.g.
+        # " V..... libx264    libx264 H.264 / AVC / MPEG-4 AVC"
+        if line.strip().startswith('------'):
+            listing = True
+            continue
+        fields = line.split()
+        if listing and len(fields) > 1:
+            codecs.add(fields[1])
+
+    return sorted(codecs)
+
+
+def probe_encoder(encoder):
+    """
+    Check that ``encoder`` can run on this machine: its encoder class and the
+    Python dependencies of that class can be imported, and its executable
+    exists, unless the class runs in-process.
+
+    :param encoder: The encoder.
+    :type encoder: :py:class:`~encode.models.Encoder`
+    :rtype: dict
+    :returns: Dictionary with the ``name`` and ``queue`` of the encoder,
+        whether it's ``available``, the resolved ``executable``, its
+        ``version`` and ``codecs``, and the ``error`` that makes it
+        unavailable.
+    """
+    result = {
+        'name': encoder.name,
+        'queue': encoder_queue(encoder),
+        'available': False,
+        'executable': None,
+        'version': None,
+        'codecs': [],
+        'error': None,
+    }
+
+    try:
+        Encoder = get_encoder_class(encoder.klass)
+        Encoder.check()
+    except (ImportError, EncodeError) as error:
+        result['error'] = "Cannot load {}: {}".format(encoder.klass, error)
+        return result
+
+    if not Encoder.executable:
+        # runs in-process
+        result['available'] = True
+        return result
+
+    args = shlex.split(encoder.path)
+    executable = which(args[0]) if args else None
+    if executable is None:
+        result['error'] = "Executable not found: {}".format(encoder.path)
+        return result
+
+    result['available'] = True
+    result['executable'] = executable
+    result['version'] = get_version(executable, Encoder.version_options)
+    result['codecs'] = get_codecs(executable)
+
+    return result
+
+
+def check_encoders(encoders=None):
+    """
+    Probe ``encoders`` with :py:func:`probe_encoder`.
+
+    :param encoders: The encoders, defaults to all encoders.
+    :type encoders: list
+    :rtype: list
+    """
+    if encoders is None:
+        encoders = Encoder.objects.all()
+
+    return [probe_encoder(encoder) for encoder in encoders]
+
+
+def probe_thumbnails():
+    """
+    Check that this machine can extract thumbnails: the
+    :py:data:`~encode.conf.EncodeConf.FFMPEG_PATH` executable exists.
+
+    :rtype: bool
+    """
+    args = shlex.split(settings.ENCODE_FFMPEG_PATH)
+    return bool(args) and which(args[0]) is not None
+
+
+def worker_capabilities():
+    """
+    Capabilities of this worker: the encoders it can run, with their
+    version and codecs, its number of cores and whether it can extract
+    ``thumbnails``.
+
+    Returns the :py:data:`~encode.conf.EncodeConf.WORKER_CAPABILITIES`
+    setting instead when it's configured.
+
+    :rtype: dict
+    """
+    if settings.ENCODE_WORKER_CAPABILITIES is not None:
+        return settings.ENCODE_WORKER_CAPABILITIES
+
+    encoders = {}
+    for result in check_encoders():
+        if result['available']:
+            encoders[result['name']] = {
+                'version': result['version'],
+                'codecs': result['codecs'],
+            }
+        else:
+            logger.warning("Encoder {name} unavailable: {error}".format(
+                **result))
+
+    try:
+        cores = multiprocessing.cpu_count()
+    except NotImplementedError:  # pragma: no cover
+        cores = 1
+
+    return {
+        'hostname': socket.gethostname(),
+        'cores': cores,
+        'encoders': encoders,
+        'thumbnails': probe_thumbnails(),
+    }
+
+
+def worker_queues(capabilities, profiles=None):
+    """
+    Names of the queues of the ``profiles`` that a worker with
+    ``capabilities`` can run, see
+    :py:data:`~encode.conf.EncodeConf.ROUTE_BY_CAPABILITIES`.
+
+    :param capabilities: See :py:func:`worker_capabilities`.
+    :type capabilities: dict
+    :param profiles: The encoding profiles, defaults to all profiles.
+    :type profiles: list
+    :rtype: list
+    """
+    if profiles is None:
+        profiles = EncodingProfile.objects.filter(
+            encoder__isnull=False).select_related('encoder')
+
+    queues = set()
+    for profile in profiles:
+        if satisfies(capabilities, profile_requirements(profile)):
+            queues.add(profile_queue(profile))
+
+    return sorted(queues)
+
+
+def add_encoder_queues(sender=None, instance=None, **kwargs):
+    """
+    Make a starting Celery worker consume the queues of the profiles or
+    encoders that it can run, and the thumbnails queue when it can extract
+    thumbnails, see :py:func:`~encode.routing.thumbnails_queue`, when
+    :py:data:`~encode.conf.EncodeConf.ROUTE_BY_CAPABILITIES` or
+    :py:data:`~encode.conf.EncodeConf.QUEUE_PER_ENCODER` is enabled.
+
+    Profiles that are added later are only picked up when the worker
+    restarts.
+
+    Connected to the ``celeryd_after_setup`` signal.
+    """
+    if not any([settings.ENCODE_ROUTE_BY_CAPABILITIES,
+                settings.ENCODE_QUEUE_PER_ENCODER]):
+        return
+
+    try:
+        if settings.ENCODE_ROUTE_BY_CAPABILITIES:
+            capabilities = worker_capabilities()
+            names = worker_queues(capabilities)
+            thumbnails = capabilities.get('thumbnails', False)
+        else:
+            names = []
+            for result in check_encoders():
+                if result['available']:
+                    names.append(result['queue'])
+                else:
+                    logger.warning("Encoder {name} unavailable: "
+                        "{error}".format(**result))
+            thumbnails = probe_thumbnails()
+    except DatabaseError as error:
+        logger.error("Cannot check the encoders: {}".format(error),
+            exc_info=True)
+        return
+
+    if thumbnails:
+        names.append(thumbnails_queue())
+
+    queues = instance.app.amqp.queues
+    for name in names:
+        logger.info("Consuming encoding jobs from {}".format(name))
+        queues.select_add(name)
+
+
+def encode_capabilities(state, **kwargs):
+    """
+    Remote control command that returns the capabilities of a worker, e.g.
+    ``app.control.broadcast('encode_capabilities', reply=True)``.
+
+    :rtype: dict
+    """
+    return worker_capabilities()
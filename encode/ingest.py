@@ -0,0 +1,316 @@
+# Copyright Collab 2016
+# See LICENSE for details.
+
+"""
+Ingest directory trees of media files.
+"""
+
+from __future__ import unicode_literals
+
+import os
+import io
+import json
+import logging
+import threading
+
+from django.db import connection
+from django.core.files.base import File
+from django.utils.six.moves import queue
+
+from encode.conf import settings
+from encode.util import file_digest
+from encode import AUDIO, VIDEO, SNAPSHOT, EncodeError
+from encode.models import Audio, Video, Snapshot, EncodingProfile
+
+
+__all__ = ['EXTENSIONS', 'find_media', 'Manifest', 'ingest_file',
+           'ingest']
+
+logger = logging.getLogger(__name__)
+
+#: File extensions of each file type.
+EXTENSIONS = {
+    AUDIO: ('aac', 'flac', 'm4a', 'mp3', 'oga', 'ogg', 'wav'),
+    VIDEO: ('avi', 'flv', 'm4v', 'mkv', 'mov', 'mp4', 'mpeg', 'mpg', 'ogv',
+            'webm'),
+    SNAPSHOT: ('bmp', 'gif', 'jpeg', 'jpg', 'png', 'tif', 'tiff'),
+}
+
+MODELS = {
+    AUDIO: Audio,
+    VIDEO: Video,
+    SNAPSHOT: Snapshot,
+}
+
+
+def get_file_type(path, extensions=None):
+    """
+    The file type of ``path`` based on its extension.
+
+    :param path: Location of the media file.
+    :type path: str
+    :param extensions: Only accept these extensions.
+    :type extensions: list
+    :rtype: str or ``None``
+    """
+    extension = os.path.splitext(path)[1].lstrip('.').lower()
+    if extensions and extension not in extensions:
+        return None
+
+    for file_type, known in EXTENSIONS.items():
+        if extension in known:
+            return file_type
+
+    return None
+
+
+def find_media(root, extensions=None):
+    """
+    Walk the directory tree ``root`` and yield the media files in it.
+
+    :param root: Directory to walk.
+    :type root: str
+    :param extensions: Only yield files with these extensions, e.g.
+        ``['mp4', 'webm']``. Defaults to all known :py:data:`EXTENSIONS`.
+    :type extensions: list
+    :rtype: generator
+    :returns: ``(path, file type)`` tuples.
+    """
+    if extensions:
+        extensions = [x.lstrip('.').lower() for x in extensions]
+
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            file_type = get_file_type(path, extensions)
+            if file_type is not None:
+                yield path, file_type
+
+
+class Manifest(object):
+    """
+    Append-only record of ingested files, one JSON object per line, used to
+    resume an interrupted ingest.
+
+    :param path: Location of the manifest file. No manifest is kept when
+        ``None``.
+    :type path: str
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.done = {}
+        self.digests = set()
+        self._lock = threading.Lock()
+
+        if path and os.path.exists(path):
+            with io.open(path, encoding='utf-8') as manifest:
+                for line in manifest:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # line of an interrupted write
+                        continue
+                    if entry.get('status') == 'done':
+                        self.done[entry['path']] = entry
+                        self.digests.add(entry.get('sha256'))
+
+    def record(self, **entry):
+        """
+        Append an entry to the manifest.
+        """
+        with self._lock:
+            if entry.get('status') == 'done':
+                self.done[entry['path']] = entry
+                self.digests.add(entry.get('sha256'))
+
+            if self.path:
+                with io.open(self.path, 'a', encoding='utf-8') as manifest:
+                    manifest.write(json.dumps(entry, sort_keys=True) + '\n')
+                    manifest.flush()
+
+
+def get_profiles(file_type, names=None):
+    """
+    The encoding profiles for ``file_type``.
+
+    :param file_type: One of ``AUDIO``, ``VIDEO`` or ``SNAPSHOT``.
+    :type file_type: str
+    :param names: Names of the profiles. Defaults to the
+        :py:data:`~encode.conf.EncodeConf.AUDIO_PROFILES`,
+        :py:data:`~encode.conf.EncodeConf.VIDEO_PROFILES` or
+        :py:data:`~encode.conf.EncodeConf.IMAGE_PROFILES` setting.
+    :type names: list
+    :rtype: list
+    :raises: :py:class:`~encode.EncodeError` if there are no profiles or a
+        profile does not exist.
+    """
+    if names is None:
+        names = {
+            AUDIO: settings.ENCODE_AUDIO_PROFILES,
+            VIDEO: settings.ENCODE_VIDEO_PROFILES,
+            SNAPSHOT: settings.ENCODE_IMAGE_PROFILES,
+        }[file_type]
+    if not names:
+        raise EncodeError("No encoding profiles for {} files".format(
+            file_type))
+
+    profiles = dict((profile.name, profile) for profile in
+                    EncodingProfile.objects.filter(name__in=names))
+    missing = [name for name in names if name not in profiles]
+    if missing:
+        raise EncodeError("Profile '{}' does not exist".format(
+            "', '".join(missing)))
+
+    return [profiles[name] for name in names]
+
+
+def ingest_file(path, model, profiles, inputFileField='input_file'):
+    """
+    Store the media file at ``path`` and start encoding it.
+
+    Unlike :py:func:`~encode.util.storeMedia` the file is streamed into the
+    storage instead of being read into memory, and the profiles are resolved
+    beforehand.
+
+    :param path: Location of the media file.
+    :type path: str
+    :param model: A :py:class:`~encode.models.MediaBase` subclass.
+    :type model: class
+    :param profiles: The :py:class:`~encode.models.EncodingProfile`
+        instances.
+    :type profiles: list
+    :rtype: :py:class:`~encode.models.MediaBase` subclass.
+    """
+    title = os.path.basename(path)
+
+    # create the media object, but don't encode until the profiles are saved
+    media = model(title=title)
+    media.save()
+    media.profiles.add(*profiles)
+
+    with open(path, 'rb') as input_file:
+        getattr(media, inputFileField).save(title, File(input_file),
+            save=False)
+
+    # transfer the input file and enqueue the encoding jobs
+    media.save(profiles=profiles)
+
+    return media
+
+
+def ingest(root, extensions=None, profiles=None, manifest=None, workers=None,
+           skip_duplicates=False):
+    """
+    Ingest all media files in the directory tree ``root``.
+
+    The files are hashed, stored, transferred and enqueued for encoding by
+    ``workers`` threads that are fed through a bounded queue. Files that are
+    recorded as done in the ``manifest`` are skipped, so an interrupted
+    ingest can be resumed.
+
+    :param root: Directory to walk.
+    :type root: str
+    :param extensions: Only ingest files with these extensions.
+    :type extensions: list
+    :param profiles: Names of the encoding profiles. Defaults to the profiles
+        configured for each file type.
+    :type profiles: list
+    :param manifest: The manifest of a previous run.
+    :type manifest: :py:class:`Manifest`
+    :param workers: Number of worker threads. Files are ingested in the
+        calling thread when this is ``1``. Defaults to
+        :py:data:`~encode.conf.EncodeConf.INGEST_WORKERS`.
+    :type workers: int
+    :param skip_duplicates: Skip files with the same content as a file that
+        was ingested before.
+    :type skip_duplicates: bool
+    :rtype: dict
+    :returns: Number of ``ingested``, ``skipped`` and ``failed`` files.
+    """
+    if workers is None:
+        workers = settings.ENCODE_INGEST_WORKERS
+    manifest = manifest or Manifest()
+    result = {'ingested': 0, 'skipped': 0, 'failed': 0}
+    result_lock = threading.Lock()
+
+    # resolve the profiles once per file type
+    file_profiles = {}
+    for file_type in EXTENSIONS:
+        try:
+            file_profiles[file_type] = get_profiles(file_type, profiles)
+        except EncodeError as error:
+            file_profiles[file_type] = error
+
+    def count(key):
+        with result_lock:
+            result[key] += 1
+
+    def process(path, file_type):
+        relpath = os.path.relpath(path, root)
+        try:
+            digest = file_digest(path)
+            if skip_duplicates and digest in manifest.digests:
+                logger.info("Skipping duplicate: {}".format(relpath))
+                count('skipped')
+                return
+
+            profiles = file_profiles[file_type]
+            if isinstance(profiles, EncodeError):
+                raise profiles
+
+            media = ingest_file(path, MODELS[file_type], profiles)
+
+        except Exception as error:
+            logger.error("Ingest failed: {} ({})".format(relpath, error),
+                exc_info=True)
+            manifest.record(path=relpath, status='error', error=str(error))
+            count('failed')
+        else:
+            logger.info("Ingested {} as {} {}".format(relpath, file_type,
+                media.pk))
+            manifest.record(path=relpath, status='done', sha256=digest,
+                file_type=file_type, media=media.pk)
+            count('ingested')
+
+    def pending():
+        for path, file_type in find_media(root, extensions):
+            if os.path.relpath(path, root) in manifest.done:
+                count('skipped')
+                continue
+            yield path, file_type
+
+    if workers <= 1:
+        for path, file_type in pending():
+            process(path, file_type)
+        return result
+
+    jobs = queue.Queue(maxsize=workers * 2)
+
+    def work():
+        try:
+            while True:
+                job = jobs.get()
+                try:
+                    if job is None:
+                        return
+                    process(*job)
+                finally:
+                    jobs.task_done()
+        finally:
+            # every thread has its own database connection
+            connection.close()
+
+    threads = [threading.Thread(target=work) for index in range(workers)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    for job in pending():
+        jobs.put(job)
+    for thread in threads:
+        jobs.put(None)
+    for thread in threads:
+        thread.join()
+
+    return result
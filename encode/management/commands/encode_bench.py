@@ -0,0 +1,72 @@
+# Copyright Collab 2016
+# See LICENSE for details.
+
+"""
+Management command to benchmark encoding profiles on a reference input.
+"""
+
+from __future__ import unicode_literals
+
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from encode import EncodeError
+from encode.models import EncodingProfile
+from encode.benchmarks.runner import write_results
+from encode.benchmarks.profiles import bench_profile, format_comparison
+
+
+class Command(BaseCommand):
+    help = ("Encode a reference input file several times with one or more "
+            "encoding profiles and compare their cost.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', action='append', dest='profiles',
+            default=[],
+            help='Name of the encoding profile. Use it twice to compare two '
+                 'profiles side by side.')
+        parser.add_argument('--input', dest='input_path',
+            help='Location of the reference input file.')
+        parser.add_argument('-n', '--iterations', type=int, default=5,
+            help='Number of runs for each profile (default: 5).')
+        parser.add_argument('--ffprobe', default='ffprobe',
+            help='Name or path of the ffprobe executable, used to find the '
+                 'duration of the media.')
+        parser.add_argument('-o', '--output',
+            help='Also write the results to this JSON file.')
+
+    def handle(self, *args, **options):
+        names = options['profiles']
+        input_path = options['input_path']
+        if not names:
+            raise CommandError("Specify one or more --profile names.")
+        if not input_path or not os.path.isfile(input_path):
+            raise CommandError("Input file does not exist: {}".format(
+                input_path))
+        if options['iterations'] < 1:
+            raise CommandError("--iterations should be 1 or more.")
+
+        profiles = dict((profile.name, profile) for profile in
+            EncodingProfile.objects.filter(
+                name__in=names).select_related('encoder'))
+        missing = set(names) - set(profiles)
+        if missing:
+            raise CommandError("Encoding profile(s) do not exist: {}".format(
+                ", ".join(sorted(missing))))
+
+        results = []
+        for name in names:
+            try:
+                results.append(bench_profile(profiles[name], input_path,
+                    options['iterations'], options['ffprobe']))
+            except EncodeError as error:
+                raise CommandError("Encoding with '{}' failed: {}".format(
+                    name, error))
+
+        self.stdout.write(format_comparison(results))
+
+        if options['output']:
+            write_results(options['output'], {'profiles': results})
+            self.stdout.write("Results written to {}".format(
+                options['output']))
@@ -0,0 +1,35 @@
+# Copyright Collab 2016
+# See LICENSE for details.
+
+"""
+Management command to send the encoding jobs that are left in the outbox.
+"""
+
+from __future__ import unicode_literals
+
+from datetime import timedelta
+
+from django.utils import timezone
+from django.core.management.base import BaseCommand
+
+from encode.outbox import dispatch_outbox
+
+
+class Command(BaseCommand):
+    help = ("Send the encoding jobs in the outbox that were never sent to "
+            "the broker, e.g. because the process stopped right after the "
+            "transaction was committed.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=float, default=60,
+            dest='older_than',
+            help='Only send the jobs that were enqueued at least this many '
+                 'seconds ago, so the jobs of transactions that were just '
+                 'committed are sent by their own process.')
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(seconds=options['older_than'])
+
+        count = dispatch_outbox(before=before)
+        self.stdout.write("Sent the encoding jobs of {} media "
+                          "object(s).".format(count))
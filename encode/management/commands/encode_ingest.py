@@ -0,0 +1,73 @@
+# Copyright Collab 2016
+# See LICENSE for details.
+
+"""
+Management command to ingest a directory tree of media files.
+"""
+
+from __future__ import unicode_literals
+
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from encode.conf import settings
+from encode.ingest import ingest, Manifest
+from encode.models import EncodingProfile
+
+
+class Command(BaseCommand):
+    help = ("Store and encode all media files in a directory tree. Files "
+            "that are recorded in the manifest of a previous run are "
+            "skipped.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory',
+            help='Directory that holds the media files.')
+        parser.add_argument('--extension', action='append',
+            dest='extensions', default=[],
+            help='Only ingest files with this extension, e.g. mp4. Can be '
+                 'used multiple times.')
+        parser.add_argument('--profile', action='append', dest='profiles',
+            default=[],
+            help='Encode the files with the encoding profile with this '
+                 'name. Can be used multiple times. Defaults to the '
+                 'ENCODE_AUDIO_PROFILES, ENCODE_VIDEO_PROFILES and '
+                 'ENCODE_IMAGE_PROFILES settings.')
+        parser.add_argument('--manifest',
+            help='File that records the ingested files, used to resume an '
+                 'interrupted ingest. Defaults to .encode_ingest in the '
+                 'directory.')
+        parser.add_argument('--workers', type=int,
+            default=settings.ENCODE_INGEST_WORKERS,
+            help='Number of files that are processed in parallel.')
+        parser.add_argument('--skip-duplicates', action='store_true',
+            help='Skip files with the same content as an ingested file.')
+
+    def handle(self, *args, **options):
+        directory = options['directory']
+        if not os.path.isdir(directory):
+            raise CommandError("Directory does not exist: {}".format(
+                directory))
+        if options['workers'] < 1:
+            raise CommandError("--workers should be 1 or more.")
+
+        profiles = options['profiles'] or None
+        if profiles:
+            missing = set(profiles) - set(EncodingProfile.objects.filter(
+                name__in=profiles).values_list('name', flat=True))
+            if missing:
+                raise CommandError(
+                    "Encoding profile(s) do not exist: {}".format(
+                        ", ".join(sorted(missing))))
+
+        manifest_path = options['manifest']
+        if manifest_path is None:
+            manifest_path = os.path.join(directory, '.encode_ingest')
+        manifest = Manifest(manifest_path)
+
+        result = ingest(directory, options['extensions'], profiles,
+            manifest, options['workers'], options['skip_duplicates'])
+        self.stdout.write(
+            "{ingested} file(s) ingested, {skipped} file(s) skipped, "
+            "{failed} file(s) failed.".format(**result))
@@ -0,0 +1,78 @@
+# Copyright Collab 2016
+# See LICENSE for details.
+
+"""
+Management command to encode many media objects again.
+"""
+
+from __future__ import unicode_literals
+
+from django.core.management.base import BaseCommand, CommandError
+
+from encode import bulk
+from encode.conf import settings
+from encode.models import MediaBase, EncodingProfile
+
+
+class Command(BaseCommand):
+    help = ("Encode media objects again, in throttled batches. Select the "
+            "media by primary key or by encoding profile.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('ids', nargs='*', type=int,
+            help='Primary keys of the media objects.')
+        parser.add_argument('--profile', action='append', dest='profiles',
+            default=[],
+            help='Select all media objects that use the encoding profile '
+                 'with this name. Can be used multiple times.')
+        parser.add_argument('--retry', action='store_true',
+            help='Only select media objects that did not complete encoding.')
+        parser.add_argument('--cancel', action='store_true',
+            help='Cancel encoding the selected media objects instead.')
+        parser.add_argument('--batch-size', type=int,
+            default=settings.ENCODE_BULK_BATCH_SIZE,
+            help='Number of media objects that are enqueued at once.')
+        parser.add_argument('--delay', type=float,
+            default=settings.ENCODE_BULK_DELAY,
+            help='Number of seconds to wait between batches.')
+        parser.add_argument('--dry-run', action='store_true',
+            help='Only report the number of selected media objects.')
+
+    def handle(self, *args, **options):
+        ids = options['ids']
+        profiles = options['profiles']
+        if not ids and not profiles:
+            raise CommandError("Specify the primary keys of the media "
+                               "objects or one or more --profile names.")
+
+        missing = set(profiles) - set(EncodingProfile.objects.filter(
+            name__in=profiles).values_list('name', flat=True))
+        if missing:
+            raise CommandError("Encoding profile(s) do not exist: {}".format(
+                ", ".join(sorted(missing))))
+
+        queryset = MediaBase.objects.all()
+        if ids:
+            queryset = queryset.filter(pk__in=ids)
+        if profiles:
+            queryset = queryset.filter(profiles__name__in=profiles).distinct()
+        if options['retry'] or options['cancel']:
+            queryset = queryset.filter(encoded=False)
+
+        if options['dry_run']:
+            self.stdout.write("{} media object(s) selected.".format(
+                queryset.count()))
+            return
+
+        if options['cancel']:
+            canceled = bulk.cancel(queryset, options['batch_size'])
+            self.stdout.write("Canceled encoding {} media object(s).".format(
+                canceled))
+            return
+
+        result = bulk.reencode(queryset, options['batch_size'],
+            options['delay'])
+        self.stdout.write(
+            "{queued} media object(s) are being encoded, {skipped} media "
+            "object(s) skipped because their input file is missing.".format(
+                **result))
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 07:29
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encode', '0002_auto_20151125_1022'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EncodingJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('wall_time', models.FloatField(default=0, help_text='Elapsed real time of the encoder, in seconds.', verbose_name='Wall time')),
+                ('user_time', models.FloatField(default=0, help_text='CPU time spent in user mode, in seconds.', verbose_name='User time')),
+                ('system_time', models.FloatField(default=0, help_text='CPU time spent in kernel mode, in seconds.', verbose_name='System time')),
+                ('max_rss', models.BigIntegerField(default=0, help_text='Peak resident set size of the encoder, in kilobytes.', verbose_name='Peak RSS')),
+                ('input_blocks', models.BigIntegerField(default=0, help_text='Number of blocks read from the filesystem.', verbose_name='Input blocks')),
+                ('output_blocks', models.BigIntegerField(default=0, help_text='Number of blocks written to the filesystem.', verbose_name='Output blocks')),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='The date and time the job was recorded.', verbose_name='Created at')),
+                ('media', models.ForeignKey(help_text='The encoded media object.', on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='encode.MediaBase')),
+                ('profile', models.ForeignKey(help_text='The encoding profile used for the job.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='jobs', to='encode.EncodingProfile')),
+            ],
+            options={
+                'verbose_name': 'Encoding job',
+                'verbose_name_plural': 'Encoding jobs',
+                'ordering': ('-created_at',),
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 07:34
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encode', '0003_encodingjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='encodingprofile',
+            name='name',
+            field=models.CharField(db_index=True, help_text='Title for this encoding profile. Example: WebM', max_length=255, verbose_name='Name'),
+        ),
+        migrations.AlterField(
+            model_name='mediabase',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, help_text='The date and time the object was created.', verbose_name='Created at'),
+        ),
+        migrations.AlterField(
+            model_name='mediabase',
+            name='encoded',
+            field=models.BooleanField(db_index=True, default=False, editable=False, help_text='Indicates that the input file has finished encoding.', verbose_name='Encoded'),
+        ),
+        migrations.AlterField(
+            model_name='mediabase',
+            name='modified_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, help_text='The date and time the object was last modified.', verbose_name='Modified at'),
+        ),
+        migrations.AlterField(
+            model_name='mediabase',
+            name='uploaded',
+            field=models.BooleanField(db_index=True, default=False, editable=False, help_text='Indicates that the output file(s) have been uploaded.', verbose_name='Uploaded'),
+        ),
+        migrations.AlterField(
+            model_name='mediafile',
+            name='title',
+            field=models.CharField(blank=True, db_index=True, help_text='Title for this file.', max_length=255, null=True, verbose_name='Title'),
+        ),
+    ]
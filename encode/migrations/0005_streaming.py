@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 07:53
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encode', '0004_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Rendition',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Name for this rendition. Example: 720p', max_length=50, verbose_name='Name')),
+                ('width', models.PositiveIntegerField(help_text='Width of the video in pixels. Example: 1280', verbose_name='Width')),
+                ('height', models.PositiveIntegerField(help_text='Height of the video in pixels. Example: 720', verbose_name='Height')),
+                ('video_bitrate', models.PositiveIntegerField(help_text='Video bitrate in kbit/s. Example: 2800', verbose_name='Video bitrate')),
+                ('audio_bitrate', models.PositiveIntegerField(blank=True, help_text='Audio bitrate in kbit/s, empty for a rendition without audio. Example: 128', null=True, verbose_name='Audio bitrate')),
+            ],
+            options={
+                'verbose_name': 'Rendition',
+                'verbose_name_plural': 'Renditions',
+                'ordering': ['-height', '-video_bitrate'],
+            },
+        ),
+        migrations.AddField(
+            model_name='encodingprofile',
+            name='segment_duration',
+            field=models.PositiveSmallIntegerField(default=6, help_text='Target duration of the streaming segments in seconds.', verbose_name='Segment duration'),
+        ),
+        migrations.AddField(
+            model_name='encodingprofile',
+            name='streaming_format',
+            field=models.CharField(blank=True, choices=[('hls', 'HLS'), ('dash', 'MPEG-DASH')], default='', help_text='Encode a ladder of renditions for adaptive bitrate streaming instead of a single file. The command then only holds extra output options. Example: -c:v libx264 -preset veryfast', max_length=10, verbose_name='Streaming format'),
+        ),
+        migrations.AddField(
+            model_name='mediafile',
+            name='profile',
+            field=models.ForeignKey(blank=True, help_text='The encoding profile that created this file.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='media_files', to='encode.EncodingProfile'),
+        ),
+        migrations.AddField(
+            model_name='rendition',
+            name='profile',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='renditions', to='encode.EncodingProfile'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 07:56
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encode', '0005_streaming'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='encodingprofile',
+            name='multiple_outputs',
+            field=models.BooleanField(default=False, help_text='The command writes several files, e.g. thumbnails or sprites, to the output directory. Example: -i "{input}" -vf fps=1/10 "{output}/thumb%03d.jpg"', verbose_name='Multiple outputs'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 07:59
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encode', '0006_multiple_outputs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='thumbnails',
+            field=models.ManyToManyField(blank=True, help_text='Thumbnails extracted from the video. The first thumbnail is the poster. Stored in CDN.', related_name='thumbnail_videos', to='encode.MediaFile', verbose_name='Thumbnails'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 08:05
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encode', '0007_thumbnails'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audio',
+            name='duration',
+            field=models.FloatField(blank=True, help_text='Duration of the audio clip in seconds.', null=True, verbose_name='Duration'),
+        ),
+        migrations.AddField(
+            model_name='audio',
+            name='loudness',
+            field=models.FloatField(blank=True, help_text='Integrated loudness of the audio clip in LUFS.', null=True, verbose_name='Loudness'),
+        ),
+        migrations.AddField(
+            model_name='audio',
+            name='loudness_range',
+            field=models.FloatField(blank=True, help_text='Loudness range of the audio clip in LU.', null=True, verbose_name='Loudness range'),
+        ),
+        migrations.AddField(
+            model_name='audio',
+            name='waveform',
+            field=models.TextField(blank=True, default='', help_text='Peaks of the waveform between 0 and 255, as a JSON array.', verbose_name='Waveform'),
+        ),
+    ]
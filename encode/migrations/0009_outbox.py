@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 08:12
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encode', '0008_audio_analysis'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('profiles', models.TextField(default='[]', help_text='Primary keys of the encoding profiles, as JSON.', verbose_name='Profiles')),
+                ('transfer', models.BooleanField(default=False, help_text='Transfer the input file to the encoder first.', verbose_name='Transfer')),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='The date and time the jobs were enqueued.', verbose_name='Created at')),
+                ('media', models.ForeignKey(help_text='The media object to encode.', on_delete=django.db.models.deletion.CASCADE, related_name='outbox_jobs', to='encode.MediaBase')),
+            ],
+            options={
+                'verbose_name': 'Outbox job',
+                'verbose_name_plural': 'Outbox jobs',
+                'ordering': ('created_at',),
+            },
+        ),
+    ]
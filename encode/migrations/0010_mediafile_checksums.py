@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 08:27
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encode', '0009_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediafile',
+            name='md5',
+            field=models.CharField(blank=True, editable=False, help_text='MD5 digest of the content of the file.', max_length=32, verbose_name='MD5'),
+        ),
+        migrations.AddField(
+            model_name='mediafile',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='SHA-256 digest of the content of the file.', max_length=64, verbose_name='SHA-256'),
+        ),
+        migrations.AddField(
+            model_name='mediafile',
+            name='size',
+            field=models.BigIntegerField(blank=True, editable=False, help_text='Size of the file in bytes.', null=True, verbose_name='Size'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 08:29
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encode', '0010_mediafile_checksums'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediafile',
+            name='duration',
+            field=models.FloatField(blank=True, editable=False, help_text='Duration of the video or audio in seconds.', null=True, verbose_name='Duration'),
+        ),
+        migrations.AddField(
+            model_name='mediafile',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, editable=False, help_text='Height of the video or image in pixels.', null=True, verbose_name='Height'),
+        ),
+        migrations.AddField(
+            model_name='mediafile',
+            name='mime_type',
+            field=models.CharField(blank=True, editable=False, help_text='MIME type of the file, e.g. video/mp4.', max_length=255, verbose_name='MIME type'),
+        ),
+        migrations.AddField(
+            model_name='mediafile',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, editable=False, help_text='Width of the video or image in pixels.', null=True, verbose_name='Width'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 08:41
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encode', '0011_mediafile_metadata'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='encodingjob',
+            name='max_rss',
+            field=models.BigIntegerField(blank=True, help_text='Peak resident set size of the encoder, in kilobytes. Empty when it was not measured.', null=True, verbose_name='Peak RSS'),
+        ),
+    ]
@@ -8,14 +8,18 @@ Models.
 from __future__ import unicode_literals
 
 import os
+import json
 import shlex
+import hashlib
 import logging
 import socket
+from collections import OrderedDict
 
-from django.db import models
-from django.db.models.signals import pre_save
-from django.core.files.base import File as DjangoFile
-from django.core.files.storage import get_storage_class
+from django.db import models, transaction
+from django.core.files.base import File
+from django.db.models import Avg, Count, Max, Sum, Q
+from django.db.models.signals import pre_save, pre_delete, post_delete
+from django.utils.text import get_valid_filename
 from django.utils.translation import ugettext_lazy as _
 from django.utils.encoding import python_2_unicode_compatible
 
@@ -24,25 +28,126 @@ from django.contrib.auth.models import User
 from queued_storage.fields import QueuedFileField
 
 from encode.conf import settings
-from encode.signals import check_file_changed
-from encode.storage import QueuedEncodeSystemStorage
-from encode import UploadError, FILE_TYPES, VIDEO, AUDIO, SNAPSHOT
-from encode.util import get_random_filename, get_media_upload_to, short_path
+from encode.routing import encode_options, thumbnails_options
+from encode.encoders import get_encoder_class
+from encode.signals import (check_file_changed, collect_media_files,
+    release_media_files)
+from encode.pool import storage_pool
+from encode.storage import (CDNStorage, InputStorage, cached_urls,
+    invalidate_urls)
+from encode import (UploadError, FILE_TYPES, VIDEO, AUDIO, SNAPSHOT, HLS,
+    DASH, STREAMING_FORMATS)
+from encode.util import (get_random_string, get_media_upload_to,
+    short_path, find_outputs, remove_path, run_threads, sharded_name,
+    HashingFile, guess_mime_type, probe_media)
+
+
+__all__ = ['MediaFile', 'Encoder', 'EncodingProfile', 'Rendition',
+           'MediaBase', 'Audio', 'Video', 'Snapshot', 'EncodingJob',
+           'OutboxJob']
+
+#: Encoder class for profiles with a
+#: :py:attr:`~EncodingProfile.streaming_format`.
+LADDER_ENCODER_CLASS = 'encode.encoders.LadderEncoder'
+
+#: Name of the master playlist or manifest of each streaming format.
+PLAYLISTS = {
+    HLS: 'master.m3u8',
+    DASH: 'manifest.mpd',
+}
 
+logger = logging.getLogger(__name__)
 
-__all__ = ['MediaFile', 'Encoder', 'EncodingProfile', 'MediaBase', 'Audio',
-           'Video', 'Snapshot']
+# storages, created on first use
+cdnStorage = CDNStorage()
 
-logger = logging.getLogger(__name__)
+#: Storage class of the input files, whose clients are pooled by the workers.
+INPUT_STORAGE_CLASS = 'encode.storage.QueuedEncodeSystemStorage'
+
+
+class MediaFileManager(models.Manager):
+    """
+    Manager for :py:class:`MediaFile`.
+    """
+    def referring_to(self, media):
+        """
+        The output files and thumbnails of a media object.
+
+        :param media: The media object.
+        :type media: :py:class:`MediaBase`
+        :rtype: :py:class:`django.db.models.query.QuerySet`
+        """
+        thumbnails = Q(thumbnail_videos=media.pk)
+        return self.filter(Q(encoding_profiles=media.pk) | thumbnails)
+
+    def urls(self, media_files):
+        """
+        The URLs of media files, resolved with one cache lookup. Only the
+        URLs that are not cached are asked from the storage, see
+        :py:func:`~encode.storage.cached_urls`.
+
+        :param media_files: The media files, e.g. a queryset.
+        :type media_files: list
+        :rtype: dict
+        :returns: The URLs by primary key.
+        """
+        media_files = [media_file for media_file in media_files
+                       if media_file.file]
+        urls = cached_urls(cdnStorage, [media_file.file.name
+                                        for media_file in media_files])
+
+        return dict((media_file.pk, urls[media_file.file.name])
+                    for media_file in media_files)
+
+    def release(self, ids):
+        """
+        Delete the media files that no media object refers to anymore, and
+        the files in storage that no other media file refers to, e.g. with
+        :py:data:`~encode.conf.EncodeConf.CONTENT_ADDRESSED_STORAGE`.
+
+        The files in storage are deleted when the current transaction is
+        committed.
 
-# storages
-cdnStorage = get_storage_class(settings.ENCODE_CDN_FILE_STORAGE)()
+        :param ids: Primary keys of the media files.
+        :type ids: list
+        :rtype: set
+        :returns: Names of the files that are deleted from storage.
+        """
+        unused = self.filter(pk__in=ids, encoding_profiles=None,
+            thumbnail_videos=None)
+        names = set(unused.values_list('file', flat=True))
+        unused.delete()
+
+        # files that are shared with the media files of other objects
+        names -= set(self.filter(file__in=names).values_list('file',
+            flat=True))
+
+        def delete_files():
+            pool = storage_pool(settings.ENCODE_CDN_FILE_STORAGE)
+            with pool.acquire() as storage:
+                for name in names:
+                    logger.debug("Deleting unused file {0}".format(name))
+                    storage.delete(name)
+            invalidate_urls(names)
+
+        on_commit = getattr(transaction, 'on_commit', None)
+        if names:
+            if on_commit is None:
+                delete_files()
+            else:
+                on_commit(delete_files)
+
+        return names
 
 
 @python_2_unicode_compatible
 class MediaFile(models.Model):
     """
     Model for media files.
+
+    A file in storage is referred to by more than one media file, and media
+    object, when its name is derived from its content, see
+    :py:data:`~encode.conf.EncodeConf.CONTENT_ADDRESSED_STORAGE`.
     """
     title = models.CharField(
         _('Title'),
@@ -50,6 +155,7 @@ class MediaFile(models.Model):
         max_length=255,
         blank=True,
         null=True,
+        db_index=True,
     )
     file = models.FileField(
         help_text=_('File for this model.'),
@@ -57,6 +163,64 @@ class MediaFile(models.Model):
         storage=cdnStorage,
         upload_to=get_media_upload_to,
     )
+    profile = models.ForeignKey(
+        'EncodingProfile',
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='media_files',
+        help_text=_('The encoding profile that created this file.')
+    )
+    size = models.BigIntegerField(
+        _('Size'),
+        null=True,
+        blank=True,
+        editable=False,
+        help_text=_('Size of the file in bytes.')
+    )
+    md5 = models.CharField(
+        _('MD5'),
+        max_length=32,
+        blank=True,
+        editable=False,
+        help_text=_('MD5 digest of the content of the file.')
+    )
+    sha256 = models.CharField(
+        _('SHA-256'),
+        max_length=64,
+        blank=True,
+        editable=False,
+        db_index=True,
+        help_text=_('SHA-256 digest of the content of the file.')
+    )
+    mime_type = models.CharField(
+        _('MIME type'),
+        max_length=255,
+        blank=True,
+        editable=False,
+        help_text=_('MIME type of the file, e.g. video/mp4.')
+    )
+    width = models.PositiveIntegerField(
+        _('Width'),
+        null=True,
+        blank=True,
+        editable=False,
+        help_text=_('Width of the video or image in pixels.')
+    )
+    height = models.PositiveIntegerField(
+        _('Height'),
+        null=True,
+        blank=True,
+        editable=False,
+        help_text=_('Height of the video or image in pixels.')
+    )
+    duration = models.FloatField(
+        _('Duration'),
+        null=True,
+        blank=True,
+        editable=False,
+        help_text=_('Duration of the video or audio in seconds.')
+    )
 
     created_at = models.DateTimeField(
         _('Created at'),
@@ -69,6 +233,8 @@ class MediaFile(models.Model):
         auto_now=True
     )
 
+    objects = MediaFileManager()
+
     class Meta:
         verbose_name = _('Media file')
         verbose_name_plural = _('Media files')
@@ -76,6 +242,36 @@ class MediaFile(models.Model):
     def __str__(self):
         return self.title or os.path.basename(self.file.name)
 
+    @property
+    def url(self):
+        """
+        The URL of the file, cached for
+        :py:data:`~encode.conf.EncodeConf.URL_CACHE_TIMEOUT` seconds. Use
+        :py:meth:`MediaFileManager.urls` for many files.
+
+        :rtype: str
+        """
+        return cached_urls(cdnStorage, [self.file.name])[self.file.name]
+
+    def describe(self, path, probe=True):
+        """
+        Fill in the metadata of the file, so listings don't need to ask the
+        storage.
+
+        :param path: Location of the file on the local filesystem.
+        :type path: str
+        :param probe: Probe the dimensions and duration of the file, see
+            :py:func:`~encode.util.probe_media`.
+        :type probe: bool
+        """
+        self.mime_type = guess_mime_type(self.file.name or path)
+
+        if probe:
+            info = probe_media(path, settings.ENCODE_FFPROBE_PATH)
+            self.width = info['width']
+            self.height = info['height']
+            self.duration = info['duration']
+
 
 @python_2_unicode_compatible
 class Encoder(models.Model):
@@ -178,6 +374,7 @@ class EncodingProfile(models.Model):
     name = models.CharField(
         _('Name'),
         max_length=255,
+        db_index=True,
         help_text=_(
             "Title for this encoding profile. Example: WebM"
         )
@@ -230,6 +427,32 @@ class EncodingProfile(models.Model):
             '-acodec libvorbis -ab 128k -vcodec libvpx -s 320x240 "{output}"'
         )
     )
+    streaming_format = models.CharField(
+        _('Streaming format'),
+        max_length=10,
+        blank=True,
+        default='',
+        choices=STREAMING_FORMATS,
+        help_text=_(
+            "Encode a ladder of renditions for adaptive bitrate streaming "
+            "instead of a single file. The command then only holds extra "
+            "output options. Example: -c:v libx264 -preset veryfast"
+        )
+    )
+    multiple_outputs = models.BooleanField(
+        _('Multiple outputs'),
+        default=False,
+        help_text=_(
+            "The command writes several files, e.g. thumbnails or sprites, "
+            "to the output directory. Example: -i \"{input}\" -vf fps=1/10 "
+            "\"{output}/thumb%03d.jpg\""
+        )
+    )
+    segment_duration = models.PositiveSmallIntegerField(
+        _('Segment duration'),
+        default=6,
+        help_text=_('Target duration of the streaming segments in seconds.')
+    )
 
     created_at = models.DateTimeField(
         _('Created at'),
@@ -254,6 +477,52 @@ class EncodingProfile(models.Model):
         """
         return " ".join(self.encoder.encode_cmd + shlex.split(self.command))
 
+    @property
+    def encoder_class(self):
+        """
+        Import path of the encoder class for this profile: the
+        :py:data:`LADDER_ENCODER_CLASS` for streaming profiles, otherwise the
+        class of the encoder.
+
+        :rtype: str
+        """
+        if self.streaming_format:
+            return LADDER_ENCODER_CLASS
+
+        return self.encoder.klass
+
+    @property
+    def directory_output(self):
+        """
+        Indicates if the encoder writes its files to an output directory,
+        instead of a single output file.
+
+        :rtype: bool
+        """
+        return bool(self.streaming_format or self.multiple_outputs)
+
+    @property
+    def playlist_name(self):
+        """
+        File name of the master playlist or manifest of a streaming profile,
+        e.g. ``master.m3u8``.
+
+        :rtype: str or ``None``
+        """
+        return PLAYLISTS.get(self.streaming_format)
+
+    def get_renditions(self):
+        """
+        The renditions of the ladder. They are loaded once and kept on the
+        instance, so they are sent along with the profile to the encoder.
+
+        :rtype: list
+        """
+        if not hasattr(self, '_renditions'):
+            self._renditions = list(self.renditions.all())
+
+        return self._renditions
+
     class Meta:
         ordering = ["-name"]
         verbose_name = _('Encoding profile')
@@ -263,6 +532,83 @@ class EncodingProfile(models.Model):
         return self.name
 
 
+@python_2_unicode_compatible
+class Rendition(models.Model):
+    """
+    A rendition in the adaptive bitrate ladder of an
+    :py:class:`EncodingProfile`.
+    """
+    profile = models.ForeignKey(
+        EncodingProfile,
+        on_delete=models.CASCADE,
+        related_name='renditions',
+    )
+    name = models.CharField(
+        _('Name'),
+        max_length=50,
+        help_text=_("Name for this rendition. Example: 720p")
+    )
+    width = models.PositiveIntegerField(
+        _('Width'),
+        help_text=_("Width of the video in pixels. Example: 1280")
+    )
+    height = models.PositiveIntegerField(
+        _('Height'),
+        help_text=_("Height of the video in pixels. Example: 720")
+    )
+    video_bitrate = models.PositiveIntegerField(
+        _('Video bitrate'),
+        help_text=_("Video bitrate in kbit/s. Example: 2800")
+    )
+    audio_bitrate = models.PositiveIntegerField(
+        _('Audio bitrate'),
+        null=True,
+        blank=True,
+        help_text=_("Audio bitrate in kbit/s, empty for a rendition without "
+                    "audio. Example: 128")
+    )
+
+    class Meta:
+        ordering = ["-height", "-video_bitrate"]
+        verbose_name = _('Rendition')
+        verbose_name_plural = _('Renditions')
+
+    def __str__(self):
+        return self.name
+
+
+class MediaBaseManager(models.Manager):
+    """
+    Manager for :py:class:`MediaBase`.
+    """
+    def get_media(self, bases, *related):
+        """
+        The media objects of ``bases``, see :py:meth:`MediaBase.get_media`,
+        with a query for each media type instead of each object.
+
+        :param bases: The :py:class:`MediaBase` instances.
+        :type bases: list
+        :param related: Relations of the media objects to prefetch.
+        :type related: str
+        :rtype: list
+        :returns: The :py:class:`MediaBase` subclass instances, in the order
+            of ``bases``.
+        """
+        media_models = {VIDEO: Video, AUDIO: Audio, SNAPSHOT: Snapshot}
+        pks = {}
+        for base in bases:
+            pks.setdefault(base.file_type, []).append(base.pk)
+
+        media = {}
+        for file_type, type_pks in pks.items():
+            model = media_models.get(file_type)
+            if model is not None:
+                media.update(model.objects.prefetch_related(
+                    *related).in_bulk(type_pks))
+
+        return [media.get(base.pk, base) for base in bases]
+
+
 @python_2_unicode_compatible
 class MediaBase(models.Model):
     """
@@ -286,7 +632,7 @@ class MediaBase(models.Model):
         # False), then self.input_file will *not* be deleted from the
         # webserver serving the Django application.
         upload_to=get_media_upload_to,
-        storage=QueuedEncodeSystemStorage(),
+        storage=InputStorage(),
         help_text=_("The uploaded source file."),
         null=True,
         blank=True,
@@ -295,6 +641,7 @@ class MediaBase(models.Model):
         _('Uploaded'),
         default=False,
         editable=False,
+        db_index=True,
         help_text=_(
             "Indicates that the output file(s) have been uploaded.")
     )
@@ -302,6 +649,7 @@ class MediaBase(models.Model):
         _('Encoded'),
         default=False,
         editable=False,
+        db_index=True,
         help_text=_("Indicates that the input file has finished encoding.")
     )
     encoding = models.BooleanField(
@@ -341,14 +689,18 @@ class MediaBase(models.Model):
     created_at = models.DateTimeField(
         _('Created at'),
         help_text=_('The date and time the object was created.'),
-        auto_now_add=True
+        auto_now_add=True,
+        db_index=True
     )
     modified_at = models.DateTimeField(
         _('Modified at'),
         help_text=_('The date and time the object was last modified.'),
-        auto_now=True
+        auto_now=True,
+        db_index=True
     )
 
+    objects = MediaBaseManager()
+
     @property
     def ready(self):
         """
@@ -359,7 +711,13 @@ class MediaBase(models.Model):
         :rtype: boolean
         """
         if self.id:
-            return self.output_files.count() == self.profiles.count()
+            # streaming profiles store many files: count each profile once
+            stored = self.output_files.aggregate(files=Count('pk'),
+                profiled=Count('profile'),
+                profiles=Count('profile', distinct=True))
+            done = stored['files'] - stored['profiled'] + stored['profiles']
+
+            return done == self.profiles.count()
 
         return False
 
@@ -374,6 +732,18 @@ class MediaBase(models.Model):
         """
         return not self.encoded
 
+    @property
+    def canceled(self):
+        """
+        Indicates if encoding was canceled, see :py:func:`encode.bulk.cancel`.
+
+        Storing the output files of the last profile clears the ``encoding``
+        status as well, but it marks the media object ``encoded``.
+
+        :rtype: boolean
+        """
+        return not self.encoding and not self.encoded
+
     @property
     def input_path(self):
         """
@@ -392,21 +762,33 @@ class MediaBase(models.Model):
         """
         The path of the encoded output file.
 
+        The encoder of a profile with multiple outputs, e.g. the playlists
+        and segments of a streaming profile, writes them to a directory.
+
         :param profile: The :py:class:`EncodingProfile` instance that contains
             the encoding data.
         :type profile: :py:class:`EncodingProfile`
         :return: For example:
-            ``[ENCODE_MEDIA_ROOT]/[ENCODE_MEDIA_PATH_NAME]/audio/51.mp3``.
+            ``[ENCODE_MEDIA_ROOT]/[ENCODE_MEDIA_PATH_NAME]/audio/51.mp3``, or
+            ``[ENCODE_MEDIA_ROOT]/[ENCODE_MEDIA_PATH_NAME]/video/51-hls`` for
+            a streaming profile.
         :rtype: str
         """
+        if profile.streaming_format:
+            name = "{id}-{format}".format(id=self.id,
+                format=profile.streaming_format)
+        elif profile.multiple_outputs:
+            name = "{id}-{container}".format(id=self.id,
+                container=profile.container)
+        else:
+            name = "{id}.{container}".format(id=self.id,
+                container=profile.container)
+
         return os.path.join(
             settings.ENCODE_MEDIA_ROOT,
             settings.ENCODE_MEDIA_PATH_NAME,
             self.file_type,
-            "{id}.{container}".format(
-            container=profile.container,
-            id=self.id
-        ))
+            name)
 
     def get_media(self):
         """
@@ -422,46 +804,287 @@ class MediaBase(models.Model):
         elif self.file_type == SNAPSHOT:
             return self.snapshot
 
-    def store_file(self, profile):
+    def store_file(self, profile, outputs=None, job=None):
         """
-        Add the encoded input file to the ``output_files`` field.
+        Add the encoded input file(s) to the ``output_files`` field, see
+        :py:meth:`store_files`.
 
         :param profile: The :py:class:`EncodingProfile` instance that contains
             the encoding data.
         :type profile: :py:class:`EncodingProfile`
+        :param outputs: Locations of the files that the encoder produced, see
+            :py:meth:`~encode.encoders.BaseEncoder.outputs`. Defaults to the
+            file or the files below the directory at :py:meth:`output_path`.
+        :type outputs: list
+        :param job: Identifier of the encoding job, e.g. its task id.
+        :type job: str
+        :rtype: list
+        :returns: The stored :py:class:`MediaFile` instances.
         :raises: :py:class:`~encode.UploadError`: Something went wrong while
             uploading the file or the file does not exist.
         """
-        # use random name for (encoded) output file
-        file_name = get_random_filename(profile.container)
-        path = self.output_path(profile)
+        return self.store_files([(profile, outputs)], job)
+
+    def store_files(self, outputs, job=None):
+        """
+        Add the encoded input files of one or more profiles, e.g. the
+        variants of an encoding job, to the ``output_files`` field.
+
+        The files are uploaded in
+        :py:data:`~encode.conf.EncodeConf.UPLOAD_WORKERS` threads and added
+        to the ``output_files`` field at once.
+
+        :param outputs: The :py:class:`EncodingProfile` instances and the
+            locations of the files that the encoder produced for them, see
+            :py:meth:`~encode.encoders.BaseEncoder.outputs`. The locations
+            default to the file or the files below the directory at
+            :py:meth:`output_path`.
+        :type outputs: list
+        :param job: Identifier of the encoding job, e.g. its task id. The
+            names of the files in storage are derived from it instead of
+            random, so they are the same for every attempt to store the
+            output of the job. The files that an earlier attempt stored
+            under these names, e.g. before the task was retried or
+            redelivered, are skipped: their :py:class:`MediaFile` rows are
+            reused, and files that exist in storage are not uploaded again.
+        :type job: str
+        :rtype: list
+        :returns: The stored :py:class:`MediaFile` instances.
+        :raises: :py:class:`~encode.UploadError`: Something went wrong while
+            uploading a file or a file does not exist.
+        """
+        addressed = settings.ENCODE_CONTENT_ADDRESSED_STORAGE
+        checksums = {}
+        uploads = []
+        for profile, files in outputs:
+            path = self.output_path(profile)
+            if files is None:
+                files = find_outputs(path)
+
+            if not files:
+                raise UploadError("{} does not exist".format(path))
+
+            if addressed:
+                # the same output is stored once, whichever object or job
+                # made it; the files are hashed once, for their names and
+                # checksums
+                profile_checksums = self._hash_outputs(files)
+                checksums.update(profile_checksums)
+                prefix = sharded_name(self._content_digest(path,
+                    profile_checksums))
+            elif job is None:
+                prefix = get_random_string(12)
+            else:
+                # the same for every attempt to store the output of the job
+                prefix = hashlib.sha1('{}:{}:{}'.format(job, self.pk,
+                    profile.pk).encode('utf-8')).hexdigest()[:12]
+
+            if profile.directory_output:
+                # e.g. the playlists and segments of a streaming profile:
+                # keep their relative paths, below the prefix directory, so
+                # the playlists keep pointing at the segments
+                names = ['/'.join([prefix] + os.path.relpath(output,
+                    path).split(os.sep)) for output in files]
+            else:
+                # name the (encoded) output file after the prefix
+                names = ['{}.{}'.format(prefix,
+                    get_valid_filename(profile.container))]
+
+            uploads += [(profile, output, name)
+                        for output, name in zip(files, names)]
+
+        # stored files are shared, or can only have been stored by an
+        # earlier attempt to store the output of the same job
+        resume = addressed or job is not None
+        stored = []
+        if resume:
+            field = MediaFile._meta.get_field('file')
+            keys = dict(((profile.pk, field.generate_filename(
+                MediaFile(profile=profile), name)), name)
+                for profile, output, name in uploads)
+            # the rows of all profiles at once, each of its own profile:
+            # another profile that produced the same content gets a row of
+            # its own for the shared file
+            candidates = MediaFile.objects.filter(
+                profile__in=set(key[0] for key in keys),
+                file__in=set(key[1] for key in keys))
+            stored = [media_file for media_file in candidates
+                      if (media_file.profile_id, media_file.file.name) in keys]
+            done = set((media_file.profile_id,
+                        keys[media_file.profile_id, media_file.file.name])
+                       for media_file in stored)
+            uploads = [upload for upload in uploads
+                       if (upload[0].pk, upload[2]) not in done]
+
+        def upload(args):
+            profile, output, name = args
+            # the playlists and segments of streaming formats are not
+            # probed: there are many segments, and they are not played on
+            # their own
+            return self._upload_output(profile, output, name, resume=resume,
+                probe=not profile.streaming_format,
+                checksums=checksums.get(output))
+
+        media_files = run_threads(upload, uploads,
+            settings.ENCODE_UPLOAD_WORKERS)
+        if media_files:
+            stored += self._create_media_files(media_files)
+
+        self.output_files.add(*stored)
+
+        # when all output_files have been saved (cq. uploaded)
+        if self.ready:
+            self.encoded = True
+            self.encoding = False
+            self.uploaded = True
+        self.save()
+
+        return stored
+
+    @staticmethod
+    def _hash_outputs(outputs):
+        """
+        Hash the content of the files that an encoder produced.
+
+        :param outputs: Locations of the files.
+        :type outputs: list
+        :rtype: dict
+        :returns: The ``md5`` and ``sha256`` hexadecimal digests and the
+            ``size`` of each file, by location.
+        """
+        checksums = {}
+        for output in outputs:
+            with open(output, 'rb') as output_file:
+                content = HashingFile(output_file)
+                checksums[output] = content.hexdigests()
+            checksums[output]['size'] = content.hashed
+
+        return checksums
+
+    @staticmethod
+    def _content_digest(path, checksums):
+        """
+        The digest of the content of the files that an encoder produced.
+
+        :param path: The output path of the encoding profile, see
+            :py:meth:`output_path`.
+        :type path: str
+        :param checksums: The checksums of the files, see
+            :py:meth:`_hash_outputs`.
+        :type checksums: dict
+        :rtype: str
+        :returns: The SHA-256 digest of the file, or of the files and their
+            paths below the output directory.
+        """
+        if list(checksums) == [path]:
+            return checksums[path]['sha256']
+
+        digest = hashlib.sha256()
+        for output in sorted(checksums):
+            digest.update(os.path.relpath(output, path).encode('utf-8'))
+            digest.update(checksums[output]['sha256'].encode('ascii'))
+
+        return digest.hexdigest()
 
-        logger.info("Saving encoded file {0} in storage as {1}".format(
-            short_path(path), file_name))
+    def _create_media_files(self, media_files):
+        """
+        Insert the uploaded ``media_files`` at once.
 
-        if os.path.exists(path):
-            # put encoded file in external storage
-            with open(path, 'rb') as encoded_file:
+        :param media_files: Unsaved :py:class:`MediaFile` instances.
+        :type media_files: list
+        :rtype: list
+        :returns: The saved :py:class:`MediaFile` instances.
+        """
+        MediaFile.objects.bulk_create(media_files)
+        if media_files and media_files[0].pk is None:
+            # the primary keys are only set on some databases
+            media_files = list(MediaFile.objects.filter(file__in=[
+                media_file.file.name for media_file in media_files]))
 
-                media_file = MediaFile(title=file_name)
+        return media_files
+
+    def _upload_output(self, profile, path, file_name, resume=False,
+                       probe=True, checksums=None):
+        """
+        Put the encoded file at ``path`` in external storage.
+
+        :param profile: The :py:class:`EncodingProfile` instance that created
+            the file.
+        :type profile: :py:class:`EncodingProfile`
+        :param path: Location of the encoded file.
+        :type path: str
+        :param file_name: Name of the file in storage.
+        :type file_name: str
+        :param resume: Don't upload the file again when it exists in storage.
+        :type resume: bool
+        :param probe: Probe the dimensions and duration of the file, see
+            :py:meth:`MediaFile.describe`.
+        :type probe: bool
+        :param checksums: The checksums of the file, when it was hashed
+            before, see :py:meth:`_hash_outputs`.
+        :type checksums: dict
+        :rtype: :py:class:`MediaFile`
+        :returns: The unsaved :py:class:`MediaFile`.
+        :raises: :py:class:`~encode.UploadError`: Something went wrong while
+            uploading the file.
+        """
+        pool = storage_pool(settings.ENCODE_CDN_FILE_STORAGE)
+        media_file = MediaFile(title=file_name, profile=profile)
+
+        with open(path, 'rb') as encoded_file, pool.acquire() as storage:
+            # hashed while it's uploaded, unless it was hashed before
+            if checksums is None:
+                content = HashingFile(encoded_file)
+            else:
+                content = File(encoded_file)
+
+            name = media_file.file.field.generate_filename(media_file,
+                file_name)
+            if resume and storage.exists(name):
+                logger.info("Encoded file {0} was stored before".format(name))
+                media_file.file = name
+            else:
+                logger.info("Saving encoded file {0} in storage as {1}".format(
+                    short_path(path), file_name))
+
+                # upload with a client of the pool of this worker instead of
+                # the storage that is shared by the upload threads
+                media_file.file.storage = storage
                 try:
-                    media_file.file.save(file_name, DjangoFile(encoded_file))
-                    self.output_files.add(media_file)
+                    media_file.file.save(file_name, content, save=False)
 
+                    # cache the URL for the pages that show the file
+                    name = media_file.file.name
                     logger.info("Stored {0} at {1}".format(file_name,
-                        media_file.file.url))
+                        cached_urls(storage, [name])[name]))
 
                 except socket.error as error:  # pragma: no cover
                     raise UploadError(error)
-        else:
-            raise UploadError("{} does not exist".format(path))
 
-        # when all output_files have been saved (cq. uploaded)
-        if self.ready:
-            self.encoded = True
-            self.encoding = False
-            self.uploaded = True
-        self.save()
+            if checksums is None:
+                checksums = content.hexdigests()
+                checksums['size'] = content.hashed
+
+        media_file.size = checksums['size']
+        media_file.md5 = checksums['md5']
+        media_file.sha256 = checksums['sha256']
+        media_file.describe(path, probe)
+
+        return media_file
+
+    def playlist(self, profile):
+        """
+        The master playlist or manifest stored for a streaming profile.
+
+        :param profile: The streaming :py:class:`EncodingProfile`.
+        :type profile: :py:class:`EncodingProfile`
+        :rtype: :py:class:`MediaFile` or ``None``
+        """
+        if not profile.playlist_name:
+            return None
+
+        return self.output_files.filter(profile=profile,
+            file__endswith='/' + profile.playlist_name).first()
 
     def remove_file(self, profile):
         """
@@ -472,15 +1095,19 @@ class MediaBase(models.Model):
         :type profile: :py:class:`EncodingProfile`
         """
         # when all output_files have been saved (cq. uploaded)
-        if self.ready and not self.keep_input_file:
+        if self.ready and not self.keep_input_file and self.input_file:
             input_path = str(self.input_path)
 
             logger.debug(
                 "Removing original input file in remote storage: {0}".format(
-                self.input_file.file))
+                self.input_file.name))
 
-            # remove original file in remote storage of input_file field
-            self.input_file.delete(save=False)
+            # remove original file in remote storage of input_file field,
+            # with a client of the pool of this worker
+            pool = storage_pool(INPUT_STORAGE_CLASS)
+            with pool.acquire() as storage:
+                self.input_file.storage = storage
+                self.input_file.delete(save=False)
 
             # remove original file in local storage of input file
             if os.path.exists(input_path):
@@ -490,12 +1117,11 @@ class MediaBase(models.Model):
                 )
                 os.remove(input_path)
 
-        # remove encoded file
+        # remove encoded file(s)
         path = self.output_path(profile)
-        if os.path.exists(path):
-            logger.debug("Removing local encoded file: {0}".format(
+        if remove_path(path):
+            logger.debug("Removed local encoded file: {0}".format(
                 short_path(path)))
-            os.remove(path)
 
         self.save()
 
@@ -518,47 +1144,164 @@ class MediaBase(models.Model):
         # the input file has not completed encoding yet but it exists on
         # the local disk and is ready to be processed
         if self.encodable and self.input_path:
-            # import the tasks here to prevent a circular import
-            from encode.tasks import EncodeMedia, StoreMedia
+            self.enqueue(profiles)
 
-            # transfer input file from local disk to remote encoder *once*
-            if self.output_files.count() == 0:
-                try:
-                    # transfer_file is a celery.result.EagerResult instance
-                    transfer_file = self.input_file.transfer()
+    @staticmethod
+    def _get_profile(profile):
+        """
+        :param profile: An :py:class:`EncodingProfile` instance or its
+            primary key.
+        :rtype: :py:class:`EncodingProfile`
+        :raises: :py:exc:`EncodingProfile.DoesNotExist` when there is no
+            profile with the primary key.
+        """
+        if isinstance(profile, EncodingProfile):
+            return profile
 
-                    logger.debug("Transferred file: {} (success: {})".format(
-                        short_path(self.input_path),
-                        transfer_file.result))
+        try:
+            return EncodingProfile.objects.get(id=profile)
+        except EncodingProfile.DoesNotExist:
+            logger.error("Cannot encode: EncodingProfile with pk "
+                "'{0}' does not exist.".format(profile))
+            raise
 
-                except Exception as e:  # pragma: no cover
-                    logger.error("Error transferring file: {}".format(e))
-                    raise
+    def enqueue(self, profiles, transfer=None):
+        """
+        Start an encoding job for each profile, without saving the model.
 
-            # encode input files on encoder
-            # XXX: chain these tasks
-            for profile_id in profiles:
-                try:
-                    # get the encoding profile
-                    profile = EncodingProfile.objects.get(id=profile_id)
-
-                except EncodingProfile.DoesNotExist:
-                    logger.error("Cannot encode: EncodingProfile with pk '{0}'"
-                        " does not exist.".format(profile_id))
-                    raise
-
-                encode_media = EncodeMedia()
-                store_media = StoreMedia()
-                encode_media.apply_async(
-                    args=[profile, self.id, self.input_path,
-                          self.output_path(profile)],
-                    # XXX: don't hardcode
-                    queue='encoder',
-                    routing_key='media.encode',
-                    # add callback to transfer output file(s) from encoder to
-                    # cdn
-                    link=store_media.s()
-                )
+        The jobs are recorded in the outbox and sent to the broker when the
+        current transaction is committed, see :py:mod:`encode.outbox`.
+
+        :param profiles: List of :py:class:`EncodingProfile` instances or
+            their primary keys.
+        :type profiles: `list`
+        :param transfer: Transfer the input file from the local disk to the
+            remote encoder. Defaults to transferring the file *once*, when
+            there are no output files yet.
+        :type transfer: bool
+        """
+        # import the outbox here to prevent a circular import
+        from encode.outbox import enqueue_on_commit
+
+        encoding_profiles = [self._get_profile(profile)
+                             for profile in profiles]
+
+        # the jobs of media that are not encoding, e.g. because encoding was
+        # canceled, are not stored
+        if not self.encoding:
+            self.encoding = True
+            MediaBase.objects.filter(pk=self.pk).update(encoding=True)
+
+        if transfer is None:
+            transfer = self.output_files.count() == 0
+
+        if encoding_profiles or transfer:
+            enqueue_on_commit(self, encoding_profiles, transfer)
+
+    def dispatch(self, profiles, transfer=False):
+        """
+        Send the chain of tasks that transfers the input file to the encoder
+        and encodes it with each profile to the broker.
+
+        The encoding jobs are linked to the transfer of the input file, which
+        runs on a worker as the first task of the chain: transfer, encode and
+        store. Nothing waits for the transfer.
+
+        :param profiles: List of :py:class:`EncodingProfile` instances or
+            their primary keys.
+        :type profiles: `list`
+        :param transfer: Transfer the input file from the local disk to the
+            remote encoder.
+        :type transfer: bool
+        """
+        # the encoder reads the input file where it is when the local and
+        # remote storage are the same
+        if self.input_file.storage.shared:
+            transfer = False
+
+        jobs = self.encoding_jobs(profiles)
+
+        if transfer:
+            # transfer input file from local disk to remote encoder and
+            # start the jobs when it's done
+            transfer_file = self.input_file.storage.transfer_task(
+                self.input_file.name)
+            transfer_file.apply_async(link=jobs)
+
+            logger.debug("Enqueued transfer of {} and {} jobs".format(
+                short_path(self.input_path), len(jobs)))
+        else:
+            for job in jobs:
+                job.apply_async()
+
+    def encoding_jobs(self, profiles):
+        """
+        The encoding jobs of ``profiles``, each linked to a job that stores
+        the output files.
+
+        :param profiles: List of :py:class:`EncodingProfile` instances or
+            their primary keys.
+        :type profiles: `list`
+        :rtype: list
+        :returns: Immutable :py:class:`celery.canvas.Signature` instances,
+            that ignore the result of the transfer they're linked to.
+        """
+        # import the tasks here to prevent a circular import
+        from encode.tasks import EncodeMedia, StoreMedia
+
+        # profiles of encoders that support variants, e.g. image sizes, and
+        # are routed to the same queue are encoded in one job
+        jobs = OrderedDict()
+        for index, profile in enumerate(profiles):
+            profile = self._get_profile(profile)
+            if profile.streaming_format:
+                # send the ladder along with the profile
+                profile.get_renditions()
+
+            options = encode_options(profile)
+            key = index
+            if self._supports_variants(profile):
+                key = (profile.encoder_class,) + tuple(sorted(
+                    options.items()))
+            jobs.setdefault(key, (options, []))[1].append(profile)
+
+        signatures = []
+        for options, job_profiles in jobs.values():
+            profile = job_profiles[0]
+            variants = [(variant, self.output_path(variant))
+                        for variant in job_profiles[1:]]
+
+            # add callback to transfer output file(s) from encoder to cdn
+            options = dict(options, link=StoreMedia().s())
+
+            signatures.append(EncodeMedia().subtask(
+                args=[profile, self.id, self.input_path,
+                      self.output_path(profile)],
+                kwargs={'variants': variants} if variants else {},
+                options=options,
+                immutable=True
+            ))
+
+        return signatures
+
+    @staticmethod
+    def _supports_variants(profile):
+        """
+        Indicates if the encoder class of ``profile`` can encode several
+        profiles in one job.
+
+        :rtype: bool
+        """
+        if profile.encoder_id is None:
+            return False
+
+        try:
+            Encoder = get_encoder_class(profile.encoder_class)
+        except ImportError:
+            # the encoder class is only needed by the encoders
+            return False
+
+        return Encoder.supports_variants
 
     class Meta:
         ordering = ("-created_at",)
@@ -569,10 +1312,23 @@ class MediaBase(models.Model):
         return self.title
 
 
+pre_delete.connect(collect_media_files, sender=MediaBase)
+post_delete.connect(release_media_files, sender=MediaBase)
+
+
 class Video(MediaBase):
     """
     Model for video files.
     """
+    thumbnails = models.ManyToManyField(
+        MediaFile,
+        blank=True,
+        help_text=_('Thumbnails extracted from the video. The first '
+                    'thumbnail is the poster. Stored in CDN.'),
+        related_name='thumbnail_videos',
+        verbose_name=_('Thumbnails'),
+    )
+
     def save(self, *args, **kwargs):
         """
         Encode and upload the video.
@@ -582,6 +1338,100 @@ class Video(MediaBase):
 
         super(Video, self).save(*args, **kwargs)
 
+    @property
+    def poster(self):
+        """
+        The first thumbnail of the video.
+
+        :rtype: :py:class:`MediaFile` or ``None``
+        """
+        return self.thumbnails.order_by('title').first()
+
+    @property
+    def thumbnails_path(self):
+        """
+        The directory for the extracted thumbnails.
+
+        :return: For example:
+            ``[ENCODE_MEDIA_ROOT]/[ENCODE_MEDIA_PATH_NAME]/video/51-thumbnails``.
+        :rtype: str
+        """
+        return os.path.join(
+            settings.ENCODE_MEDIA_ROOT,
+            settings.ENCODE_MEDIA_PATH_NAME,
+            self.file_type,
+            "{id}-thumbnails".format(id=self.id))
+
+    def encoding_jobs(self, profiles):
+        """
+        The encoding jobs and, when
+        :py:data:`~encode.conf.EncodeConf.THUMBNAIL_POSITIONS` is set, a
+        thumbnail job.
+        """
+        jobs = super(Video, self).encoding_jobs(profiles)
+
+        if settings.ENCODE_THUMBNAIL_POSITIONS:
+            jobs.append(self.thumbnails_job())
+
+        return jobs
+
+    def thumbnails_job(self, positions=None):
+        """
+        The job that extracts thumbnails from the input file, see
+        :py:meth:`extract_thumbnails`.
+
+        :rtype: :py:class:`celery.canvas.Signature`
+        """
+        # import the tasks here to prevent a circular import
+        from encode.tasks import ExtractThumbnails
+
+        return ExtractThumbnails().subtask(
+            args=[self.id, self.input_path, self.thumbnails_path, positions],
+            options=thumbnails_options(),
+            immutable=True
+        )
+
+    def extract_thumbnails(self, positions=None):
+        """
+        Start a job that extracts thumbnails from the input file on the
+        encoder and stores them in the ``thumbnails`` field, replacing the
+        current thumbnails.
+
+        :param positions: Timestamps or percentages of the duration, see
+            :py:data:`~encode.thumbnails.POSITION`. Defaults to
+            :py:data:`~encode.conf.EncodeConf.THUMBNAIL_POSITIONS`.
+        :type positions: list
+        """
+        self.thumbnails_job(positions).apply_async()
+
+    def store_thumbnails(self, paths):
+        """
+        Put the thumbnails at ``paths`` in external storage and replace the
+        ``thumbnails`` field.
+
+        The previous thumbnails are deleted, see
+        :py:meth:`MediaFileManager.release`.
+
+        :param paths: Locations of the thumbnails, the poster first.
+        :type paths: list
+        :raises: :py:class:`~encode.UploadError`: Something went wrong while
+            uploading a file.
+        """
+        prefix = get_random_string(12)
+
+        def upload(path):
+            name = '/'.join([prefix, os.path.basename(path)])
+            return self._upload_output(None, path, name)
+
+        media_files = run_threads(upload, paths,
+            settings.ENCODE_UPLOAD_WORKERS)
+
+        with transaction.atomic():
+            previous = list(self.thumbnails.values_list('pk', flat=True))
+            self.thumbnails.clear()
+            self.thumbnails.add(*self._create_media_files(media_files))
+            MediaFile.objects.release(previous)
+
     class Meta:
         verbose_name = _("Video Clip")
         verbose_name_plural = _("Video Clips")
@@ -594,6 +1444,32 @@ class Audio(MediaBase):
     """
     Model for audio files.
     """
+    duration = models.FloatField(
+        _('Duration'),
+        null=True,
+        blank=True,
+        help_text=_('Duration of the audio clip in seconds.')
+    )
+    loudness = models.FloatField(
+        _('Loudness'),
+        null=True,
+        blank=True,
+        help_text=_('Integrated loudness of the audio clip in LUFS.')
+    )
+    loudness_range = models.FloatField(
+        _('Loudness range'),
+        null=True,
+        blank=True,
+        help_text=_('Loudness range of the audio clip in LU.')
+    )
+    waveform = models.TextField(
+        _('Waveform'),
+        blank=True,
+        default='',
+        help_text=_('Peaks of the waveform between 0 and 255, as a JSON '
+                    'array.')
+    )
+
     def save(self, *args, **kwargs):
         """
         Encode and upload the audio clip.
@@ -603,6 +1479,38 @@ class Audio(MediaBase):
 
         super(Audio, self).save(*args, **kwargs)
 
+    @property
+    def peaks(self):
+        """
+        The peaks of the waveform, for drawing it in a player.
+
+        :rtype: list
+        """
+        if not self.waveform:
+            return []
+
+        return json.loads(self.waveform)
+
+    def store_analysis(self, analysis):
+        """
+        Store the ``analysis`` of the :py:class:`~encode.encoders.AudioEncoder`
+        without saving the other fields of the model.
+
+        :param analysis: Dictionary with the ``duration``, ``loudness``,
+            ``loudness_range`` and ``peaks``.
+        :type analysis: dict
+        """
+        fields = {
+            'duration': analysis.get('duration'),
+            'loudness': analysis.get('loudness'),
+            'loudness_range': analysis.get('loudness_range'),
+            'waveform': json.dumps(analysis.get('peaks') or []),
+        }
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+        Audio.objects.filter(pk=self.pk).update(**fields)
+
     class Meta:
         verbose_name = _("Audio Clip")
         verbose_name_plural = _("Audio Clips")
@@ -630,3 +1538,145 @@ class Snapshot(MediaBase):
 
 
 pre_save.connect(check_file_changed, sender=Snapshot)
+
+
+class EncodingJobManager(models.Manager):
+    """
+    Manager for :py:class:`EncodingJob` models.
+    """
+    def summary(self):
+        """
+        Aggregate the resource usage of the jobs per encoding profile, for
+        capacity planning.
+
+        :rtype: :py:class:`django.db.models.query.ValuesQuerySet`
+        :returns: One dictionary per profile with the ``profile`` primary key,
+            ``profile__name``, the number of ``jobs``, the total and average
+            ``wall_time``, ``user_time`` and ``system_time``, the highest
+            ``max_rss`` and the total ``input_blocks`` and ``output_blocks``.
+        """
+        return self.values('profile', 'profile__name').annotate(
+            jobs=Count('id'),
+            total_wall_time=Sum('wall_time'),
+            avg_wall_time=Avg('wall_time'),
+            total_user_time=Sum('user_time'),
+            avg_user_time=Avg('user_time'),
+            total_system_time=Sum('system_time'),
+            avg_system_time=Avg('system_time'),
+            peak_rss=Max('max_rss'),
+            total_input_blocks=Sum('input_blocks'),
+            total_output_blocks=Sum('output_blocks'),
+        ).order_by('profile__name')
+
+
+@python_2_unicode_compatible
+class EncodingJob(models.Model):
+    """
+    Resources used while encoding a media object with an encoding profile.
+    """
+    media = models.ForeignKey(
+        MediaBase,
+        on_delete=models.CASCADE,
+        related_name='jobs',
+        help_text=_("The encoded media object.")
+    )
+    profile = models.ForeignKey(
+        EncodingProfile,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name='jobs',
+        help_text=_("The encoding profile used for the job.")
+    )
+    wall_time = models.FloatField(
+        _('Wall time'),
+        default=0,
+        help_text=_("Elapsed real time of the encoder, in seconds.")
+    )
+    user_time = models.FloatField(
+        _('User time'),
+        default=0,
+        help_text=_("CPU time spent in user mode, in seconds.")
+    )
+    system_time = models.FloatField(
+        _('System time'),
+        default=0,
+        help_text=_("CPU time spent in kernel mode, in seconds.")
+    )
+    max_rss = models.BigIntegerField(
+        _('Peak RSS'),
+        null=True,
+        blank=True,
+        help_text=_("Peak resident set size of the encoder, in kilobytes. "
+                    "Empty when it was not measured.")
+    )
+    input_blocks = models.BigIntegerField(
+        _('Input blocks'),
+        default=0,
+        help_text=_("Number of blocks read from the filesystem.")
+    )
+    output_blocks = models.BigIntegerField(
+        _('Output blocks'),
+        default=0,
+        help_text=_("Number of blocks written to the filesystem.")
+    )
+
+    created_at = models.DateTimeField(
+        _('Created at'),
+        help_text=_('The date and time the job was recorded.'),
+        auto_now_add=True
+    )
+
+    objects = EncodingJobManager()
+
+    class Meta:
+        ordering = ("-created_at",)
+        verbose_name = _("Encoding job")
+        verbose_name_plural = _("Encoding jobs")
+
+    def __str__(self):
+        return "{} ({})".format(self.media, self.profile)
+
+
+@python_2_unicode_compatible
+class OutboxJob(models.Model):
+    """
+    Encoding jobs of a media object that are sent to the broker after the
+    transaction that enqueued them is committed, see :py:mod:`encode.outbox`.
+    """
+    media = models.ForeignKey(
+        MediaBase,
+        on_delete=models.CASCADE,
+        related_name='outbox_jobs',
+        help_text=_("The media object to encode.")
+    )
+    profiles = models.TextField(
+        _('Profiles'),
+        default='[]',
+        help_text=_("Primary keys of the encoding profiles, as JSON.")
+    )
+    transfer = models.BooleanField(
+        _('Transfer'),
+        default=False,
+        help_text=_("Transfer the input file to the encoder first.")
+    )
+
+    created_at = models.DateTimeField(
+        _('Created at'),
+        help_text=_('The date and time the jobs were enqueued.'),
+        auto_now_add=True
+    )
+
+    class Meta:
+        ordering = ("created_at",)
+        verbose_name = _("Outbox job")
+        verbose_name_plural = _("Outbox jobs")
+
+    def __str__(self):
+        return "{}".format(self.media)
+
+    def get_profiles(self):
+        """
+        :rtype: list
+        :returns: Primary keys of the encoding profiles.
+        """
+        return json.loads(self.profiles)
@@ -0,0 +1,186 @@
+# Copyright Collab 2016
+# See LICENSE for details.
+
+"""
+Transactional dispatch of the encoding jobs.
+
+:py:meth:`~encode.models.MediaBase.enqueue` records the jobs in an
+:py:class:`~encode.models.OutboxJob` row, in the same transaction as the
+media object. When the transaction is committed, the rows that it recorded
+are sent to the broker in one :py:class:`~encode.tasks.DispatchJobs`
+message, and a worker starts their chains of tasks. Workers never receive
+jobs of media objects that are not committed yet, and a transaction that
+enqueues many media objects costs one round-trip to the broker.
+
+Rows of jobs that were never sent, e.g. because the process stopped right
+after the commit or the broker was down, are sent by the ``encode_dispatch``
+management command.
+"""
+
+from __future__ import unicode_literals
+
+import json
+import logging
+import threading
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from encode.conf import settings
+from encode.models import MediaBase, OutboxJob
+from encode.routing import default_options
+
+
+__all__ = ['OutboxBatch', 'enqueue_on_commit', 'dispatch_outbox']
+
+logger = logging.getLogger(__name__)
+
+#: The batches of the transactions of this thread, by database alias.
+_batches = threading.local()
+
+
+class OutboxBatch(object):
+    """
+    The outbox rows that a transaction recorded, sent to the broker when it
+    is committed.
+
+    :param ids: Primary keys of :py:class:`~encode.models.OutboxJob` rows.
+    :type ids: list
+    :param using: Alias of the database.
+    :type using: str
+    """
+    def __init__(self, ids=None, using=None):
+        self.ids = list(ids or [])
+        self.using = using or DEFAULT_DB_ALIAS
+        self.sent = False
+
+    def __call__(self):
+        # every row registers the batch, the first hook that runs after the
+        # commit sends it
+        if self.sent:
+            return
+        self.sent = True
+        if current_batch(self.using) is self:
+            del _batches.batches[self.using]
+
+        # import the tasks here to prevent a circular import
+        from encode.tasks import DispatchJobs
+
+        DispatchJobs().apply_async(args=[self.ids], **default_options())
+
+
+def current_batch(using=None):
+    """
+    The batch that is sent when the current transaction of this thread is
+    committed.
+
+    :param using: Alias of the database.
+    :type using: str
+    :rtype: :py:class:`OutboxBatch`
+    :returns: ``None`` if no batch is waiting for the commit yet.
+    """
+    batches = getattr(_batches, 'batches', None)
+    if batches is None:
+        batches = _batches.batches = {}
+
+    return batches.get(using or DEFAULT_DB_ALIAS)
+
+
+def enqueue_on_commit(media, profiles, transfer=False, using=None):
+    """
+    Record the encoding jobs of ``media`` and send them to the broker when
+    the current transaction is committed.
+
+    Without :py:data:`~encode.conf.EncodeConf.DISPATCH_ON_COMMIT`, or on
+    Django versions without ``on_commit`` hooks, the jobs are sent right
+    away and not recorded.
+
+    :param media: The media object to encode.
+    :type media: :py:class:`~encode.models.MediaBase`
+    :param profiles: The encoding profiles.
+    :type profiles: list
+    :param transfer: Transfer the input file to the encoder first.
+    :type transfer: bool
+    :param using: Alias of the database.
+    :type using: str
+    :rtype: :py:class:`~encode.models.OutboxJob`
+    :returns: The outbox row, ``None`` if the jobs were sent right away.
+    """
+    on_commit = getattr(transaction, 'on_commit', None)
+    if not settings.ENCODE_DISPATCH_ON_COMMIT or on_commit is None:
+        media.dispatch(profiles, transfer)
+        return None
+
+    job = OutboxJob.objects.using(using).create(media=media,
+        profiles=json.dumps([profile.pk for profile in profiles]),
+        transfer=transfer)
+
+    batch = current_batch(using)
+    if batch is None:
+        batch = OutboxBatch(using=using)
+        _batches.batches[batch.using] = batch
+    batch.ids.append(job.pk)
+
+    # a hook that is registered in a savepoint is dropped when the savepoint
+    # rolls back, so every row registers the batch. The batch of a
+    # transaction that rolled back is sent with the next one: the ids of
+    # its rows no longer match any row.
+    on_commit(batch, using)
+
+    return job
+
+
+def dispatch_outbox(ids=None, before=None):
+    """
+    Start the chains of tasks of outbox rows and delete the rows.
+
+    The rows are locked until their chains are sent, so they are only sent
+    once. A row is deleted after its chain was sent: the rows of the jobs
+    that cannot be sent, e.g. because the broker is down, stay in the outbox
+    and are sent by the next ``encode_dispatch`` command.
+
+    :param ids: Primary keys of the :py:class:`~encode.models.OutboxJob`
+        rows. Defaults to all rows.
+    :type ids: list
+    :param before: Only the rows that were created before this time.
+    :type before: :py:class:`datetime.datetime`
+    :rtype: int
+    :returns: Number of media objects whose jobs were started.
+    :raises: The first error of a media object whose jobs cannot be started,
+        after the jobs of the others were started.
+    """
+    sent = 0
+    errors = []
+
+    with transaction.atomic():
+        jobs = OutboxJob.objects.select_for_update()
+        if ids is not None:
+            jobs = jobs.filter(pk__in=ids)
+        if before is not None:
+            jobs = jobs.filter(created_at__lt=before)
+
+        jobs = list(jobs)
+
+        # the media objects of the rows, by their media type, without
+        # locking them along with the rows
+        bases = MediaBase.objects.in_bulk([job.media_id for job in jobs])
+        media = dict((obj.pk, obj) for obj in MediaBase.objects.get_media(
+            list(bases.values())))
+
+        # the jobs of the other media objects are started when one fails
+        for job in jobs:
+            try:
+                with transaction.atomic():
+                    media[job.media_id].dispatch(job.get_profiles(),
+                        job.transfer)
+                    job.delete()
+            except Exception as error:
+                logger.error("Cannot start the encoding jobs of {}".format(
+                    media.get(job.media_id, job.media_id)), exc_info=True)
+                errors.append(error)
+            else:
+                sent += 1
+
+    if errors:
+        raise errors[0]
+
+    return sent
@@ -0,0 +1,245 @@
+# Copyright Collab 2016
+# See LICENSE for details.
+
+"""
+Pagination for large admin changelists.
+"""
+
+from __future__ import unicode_literals
+
+from django.utils import six
+from django.core import signing
+from django.db import connections
+from django.db.models import Q
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+from django.contrib.admin.views.main import ChangeList, PAGE_VAR
+
+try:
+    from django.core.exceptions import FieldDoesNotExist
+except ImportError:  # pragma: no cover
+    # django < 1.8
+    from django.db.models.fields import FieldDoesNotExist
+
+from encode.conf import settings
+
+
+__all__ = ['EstimatedCountPaginator', 'KeysetChangeList', 'CURSOR_VAR']
+
+#: Query string parameter that holds the keyset pagination cursor.
+CURSOR_VAR = 'cursor'
+
+#: Queries that return the number of rows in a table as estimated by the
+#: query planner, by database vendor.
+ESTIMATE_QUERIES = {
+    'postgresql': "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+    'mysql': ("SELECT table_rows FROM information_schema.tables "
+              "WHERE table_schema = DATABASE() AND table_name = %s"),
+}
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that uses the row count estimated by the database instead of
+    running a full ``COUNT(*)`` when the queryset is not filtered and the
+    table holds more than
+    :py:data:`~encode.conf.EncodeConf.ADMIN_ESTIMATED_COUNT_THRESHOLD` rows.
+
+    Falls back to an exact count on databases without estimates, e.g. SQLite.
+    """
+    def estimate(self):
+        """
+        Number of rows estimated by the database, or ``None`` if no estimate
+        is available.
+
+        :rtype: int or ``None``
+        """
+        queryset = self.object_list
+        query = getattr(queryset, 'query', None)
+        if query is None or query.where:
+            # not a queryset or filtered: estimates are for whole tables
+            return None
+
+        connection = connections[queryset.db]
+        sql = ESTIMATE_QUERIES.get(connection.vendor)
+        if sql is None:
+            return None
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+
+        if row is None or row[0] is None:
+            return None
+        return int(row[0])
+
+    @cached_property
+    def count(self):
+        """
+        Total number of objects, across all pages.
+        """
+        threshold = settings.ENCODE_ADMIN_ESTIMATED_COUNT_THRESHOLD
+        estimate = self.estimate()
+        if estimate is not None and estimate >= threshold:
+            return estimate
+
+        try:
+            return self.object_list.count()
+        except (AttributeError, TypeError):
+            return len(self.object_list)
+
+
+class KeysetChangeList(ChangeList):
+    """
+    Changelist that pages through the results by seeking past the last row
+    of the previous page (``WHERE (modified_at, id) < (...)``) instead of
+    using an ``OFFSET``, which gets slower for every page on large tables.
+
+    Keyset pagination is used when the changelist is ordered by a single
+    non-nullable field (plus the primary key that the admin always adds) and
+    no page number is requested. Otherwise the regular offset pagination is
+    used.
+
+    The results are counted once, on the first page, with the
+    :py:class:`EstimatedCountPaginator`.
+    """
+    #: Indicates that the results were paginated with a cursor.
+    keyset = False
+
+    #: Cursor of the current page, ``None`` on the first page.
+    cursor = None
+
+    #: Cursor for the next page, ``None`` on the last page.
+    next_cursor = None
+
+    def get_filters_params(self, params=None):
+        lookup_params = super(KeysetChangeList, self).get_filters_params(
+            params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_keyset_field(self, request):
+        """
+        The field that the keyset pagination seeks on.
+
+        :rtype: tuple
+        :returns: ``(field name, descending, pk descending)`` or ``None`` if
+            the ordering of the changelist cannot be paginated with a keyset.
+        """
+        # the queryset is already ordered by the admin, which repeats the
+        # ordering fields
+        ordering = []
+        for name in self.get_ordering(request, self.queryset):
+            if name not in ordering:
+                ordering.append(name)
+        if len(ordering) != 2 or ordering[1] not in ('pk', '-pk'):
+            return None
+
+        name = ordering[0]
+        if not isinstance(name, six.string_types):
+            # expressions cannot be used in seek conditions
+            return None
+
+        descending = name.startswith('-')
+        name = name.lstrip('-')
+        try:
+            field = self.lookup_opts.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        if field.null or not field.concrete:
+            return None
+
+        return name, descending, ordering[1] == '-pk'
+
+    def make_cursor(self, obj, name, count):
+        """
+        Encode the position of ``obj`` in the results and the number of
+        results, so the next pages don't count them again.
+
+        :rtype: str
+        """
+        field = self.lookup_opts.get_field(name)
+        return signing.dumps([field.value_to_string(obj), str(obj.pk), count],
+            salt=__name__)
+
+    def read_cursor(self, cursor, name):
+        """
+        Decode a cursor created by :py:meth:`make_cursor`.
+
+        :rtype: tuple
+        :returns: ``(field value, primary key, count)`` or ``None`` if the
+            cursor is invalid.
+        """
+        try:
+            value, pk, count = signing.loads(cursor, salt=__name__)
+        except (signing.BadSignature, ValueError, TypeError):
+            return None
+
+        field = self.lookup_opts.get_field(name)
+        return (field.to_python(value), self.lookup_opts.pk.to_python(pk),
+                count)
+
+    def get_results(self, request):
+        keyset_field = self.get_keyset_field(request)
+        cursor = self.params.pop(CURSOR_VAR, None)
+
+        if keyset_field is None or self.page_num != 0 or self.show_all:
+            return super(KeysetChangeList, self).get_results(request)
+
+        name, descending, pk_descending = keyset_field
+        # order and seek on the primary key column: ordering by ``pk`` on a
+        # subclass of MediaBase follows the parent link and uses the
+        # ordering of MediaBase, which disagrees with the seek condition for
+        # rows with the same value
+        pk_column = self.lookup_opts.pk.attname
+        queryset = self.queryset.order_by(
+            '{}{}'.format('-' if descending else '', name),
+            '{}{}'.format('-' if pk_descending else '', pk_column))
+        position = self.read_cursor(cursor, name) if cursor else None
+        if position is not None:
+            value, pk, count = position
+            seek = 'lt' if descending else 'gt'
+            after = {'{}__{}'.format(name, seek): value}
+            tie = {name: value, '{}__{}'.format(pk_column,
+                'lt' if pk_descending else 'gt'): pk}
+            queryset = queryset.filter(Q(**after) | Q(**tie))
+
+        # fetch one extra row to find out if there's a next page
+        rows = list(queryset[:self.list_per_page + 1])
+        result_list = rows[:self.list_per_page]
+
+        paginator = self.model_admin.get_paginator(request, self.queryset,
+            self.list_per_page)
+        if position is None:
+            # counted on the first page only, preferably estimated: the
+            # cursors of the next pages carry the count
+            count = EstimatedCountPaginator(self.queryset,
+                self.list_per_page).count
+
+        self.keyset = True
+        self.cursor = cursor if position is not None else None
+        self.next_cursor = None
+        if len(rows) > self.list_per_page:
+            self.next_cursor = self.make_cursor(result_list[-1], name, count)
+
+        self.result_count = count
+        self.show_full_result_count = getattr(self.model_admin,
+            'show_full_result_count', False)
+        self.full_result_count = None
+        if self.show_full_result_count:
+            self.full_result_count = self.root_queryset.count()
+        self.show_admin_actions = bool(
+            not self.show_full_result_count or self.full_result_count)
+        self.result_list = result_list
+        self.can_show_all = False
+        self.multi_page = bool(self.next_cursor or self.cursor)
+        self.paginator = paginator
+
+    @property
+    def next_url(self):
+        return self.get_query_string({CURSOR_VAR: self.next_cursor},
+            [PAGE_VAR])
+
+    @property
+    def first_url(self):
+        return self.get_query_string(remove=[CURSOR_VAR, PAGE_VAR])
@@ -0,0 +1,208 @@
+# Copyright Collab 2016
+# See LICENSE for details.
+
+"""
+Pools of storage clients that are reused by the tasks of a worker process.
+
+Storage backends of remote services keep a connection, or a session with a
+pool of connections, per instance. Creating an instance for every upload
+starts a new connection and TLS handshake each time, and one instance that
+is shared by the upload threads is not thread-safe for most backends. A
+pool hands every thread an instance of its own and keeps the instances,
+and their connections, alive between tasks:
+
+- at most :py:data:`~encode.conf.EncodeConf.STORAGE_POOL_SIZE` clients are
+  in use at the same time, other threads wait for a client;
+- a client that was idle for longer than
+  :py:data:`~encode.conf.EncodeConf.STORAGE_POOL_CHECK_INTERVAL` seconds is
+  checked before it's handed out, and replaced when the check fails;
+- a client that raised an error is discarded, because its connection may be
+  broken, e.g. after a read timeout.
+
+The pools of a process are reset when a worker forks a child process, so
+connections are never shared between processes.
+"""
+
+from __future__ import unicode_literals
+
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+from django.core.files.storage import get_storage_class
+
+from encode.conf import settings
+
+
+__all__ = ['StoragePool', 'storage_pool', 'reset_pools', 'close_pools']
+
+logger = logging.getLogger(__name__)
+
+#: Name of the file whose existence is checked to test an idle client. The
+#: file does not need to exist: only errors fail the check.
+HEALTH_CHECK_NAME = '.encode-health-check'
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class StoragePool(object):
+    """
+    A bounded pool of storage clients.
+
+    :param factory: Creates a new client.
+    :type factory: callable
+    :param size: Maximum number of clients that are in use at the same time.
+        Defaults to :py:data:`~encode.conf.EncodeConf.STORAGE_POOL_SIZE`.
+    :type size: int
+    :param check_interval: Number of seconds that a client can be idle
+        before it's checked. Defaults to
+        :py:data:`~encode.conf.EncodeConf.STORAGE_POOL_CHECK_INTERVAL`.
+    :type check_interval: float
+    """
+    def __init__(self, factory, size=None, check_interval=None):
+        if size is None:
+            size = settings.ENCODE_STORAGE_POOL_SIZE
+        if check_interval is None:
+            check_interval = settings.ENCODE_STORAGE_POOL_CHECK_INTERVAL
+
+        self.factory = factory
+        self.size = max(size, 1)
+        self.check_interval = check_interval
+        self.created = 0
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.size)
+
+    def check(self, client):
+        """
+        Test an idle client.
+
+        :param client: A storage client of the pool.
+        :type client: :py:class:`django.core.files.storage.Storage`
+        :rtype: bool
+        """
+        try:
+            client.exists(HEALTH_CHECK_NAME)
+        except Exception as error:
+            logger.warning("Discarding storage client {}: {}".format(client,
+                error))
+            return False
+
+        return True
+
+    def _get(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                client, released_at = self._idle.pop()
+
+            idle = time.time() - released_at
+            if idle < self.check_interval or self.check(client):
+                return client
+            self.discard(client)
+
+        with self._lock:
+            self.created += 1
+        return self.factory()
+
+    def _put(self, client):
+        with self._lock:
+            self._idle.append((client, time.time()))
+
+    @contextmanager
+    def acquire(self):
+        """
+        Use a client of the pool, waiting for one when all of them are in
+        use. The client is returned to the pool afterwards, or discarded
+        when an error was raised.
+
+        :rtype: :py:class:`django.core.files.storage.Storage`
+        """
+        with self._slots:
+            client = self._get()
+            try:
+                yield client
+            except Exception:
+                self.discard(client)
+                raise
+            else:
+                self._put(client)
+
+    def discard(self, client):
+        """
+        Close a client instead of returning it to the pool.
+
+        :param client: A storage client of the pool.
+        :type client: :py:class:`django.core.files.storage.Storage`
+        """
+        close = getattr(client, 'close', None)
+        if callable(close):
+            try:
+                close()
+            except Exception:  # pragma: no cover
+                logger.debug("Cannot close storage client", exc_info=True)
+
+    def close(self):
+        """
+        Close the idle clients.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+
+        for client, released_at in idle:
+            self.discard(client)
+
+
+def storage_pool(import_path, options=None):
+    """
+    The pool of the current process for a storage class and its options.
+
+    :param import_path: Import path of the storage class.
+    :type import_path: str
+    :param options: Keyword arguments of the storage class.
+    :type options: dict
+    :rtype: :py:class:`StoragePool`
+    """
+    options = options or {}
+    key = (import_path, repr(sorted(options.items())))
+
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            def factory():
+                return get_storage_class(import_path)(**options)
+
+            pool = _pools[key] = StoragePool(factory)
+
+    return pool
+
+
+def reset_pools(**kwargs):
+    """
+    Forget the pools without closing their clients, whose connections belong
+    to the parent process.
+
+    Connected to the ``worker_process_init`` signal.
+    """
+    global _pools, _pools_lock
+
+    # the lock may be held by a thread that does not exist in this process
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+
+def close_pools(**kwargs):
+    """
+    Close the idle clients of all pools.
+
+    Connected to the ``worker_process_shutdown`` signal.
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+
+    for pool in pools:
+        pool.close()
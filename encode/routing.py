@@ -0,0 +1,185 @@
+# Copyright Collab 2016
+# See LICENSE for details.
+
+"""
+Routing of the encoding jobs to the Celery queues.
+"""
+
+from __future__ import unicode_literals
+
+import re
+
+from django.utils.text import slugify
+
+from encode.conf import settings
+from encode.encoders import BaseEncoder, get_encoder_class
+
+
+__all__ = ['encoder_queue', 'profile_requirements', 'profile_queue',
+           'satisfies', 'thumbnails_queue', 'default_options',
+           'encode_options', 'thumbnails_options']
+
+#: FFmpeg options that select a codec, e.g. ``-c:v``, ``-codec:a:0`` or
+#: ``-vcodec``, with the streams they apply to.
+CODEC_OPTION = re.compile(r'^-(?:(?:c|codec)(?::(?P<streams>[avs](?::\d+)?))?'
+                          r'|(?P<type>[avs])codec)$')
+
+
+def encoder_queue(encoder):
+    """
+    Name of the queue for the encoding jobs of ``encoder`` when
+    :py:data:`~encode.conf.EncodeConf.QUEUE_PER_ENCODER` is enabled.
+
+    :param encoder: The encoder.
+    :type encoder: :py:class:`~encode.models.Encoder`
+    :rtype: str
+    """
+    return '{}.{}'.format(settings.ENCODE_JOB_QUEUE,
+        slugify(encoder.name))
+
+
+def profile_requirements(profile):
+    """
+    What a worker needs to run the encoding jobs of ``profile``: the
+    encoder, the codecs that are selected in the options of its encoder
+    class, e.g. ``-c:v libx265``, and the number of cores that are requested
+    with ``-threads``.
+
+    The options include the defaults of the encoder class, see
+    :py:meth:`~encode.encoders.BaseEncoder.profile_options`; a later codec
+    option for the same streams replaces an earlier one.
+
+    :param profile: The encoding profile.
+    :type profile: :py:class:`~encode.models.EncodingProfile`
+    :rtype: dict
+    :returns: Dictionary with the ``encoder`` name, a sorted list of
+        ``codecs`` and the minimum number of ``cores``.
+    """
+    try:
+        Encoder = get_encoder_class(profile.encoder_class)
+    except ImportError:
+        # the encoder class is only installed on the workers
+        Encoder = BaseEncoder
+
+    codecs = {}
+    cores = 1
+    args = Encoder.profile_options(profile)
+
+    for option, value in zip(args, args[1:]):
+        match = CODEC_OPTION.match(option)
+        if match:
+            streams = match.group('streams') or match.group('type') or ''
+            codecs[streams] = value
+        elif option == '-threads' and value.isdigit():
+            cores = max(cores, int(value))
+
+    return {
+        'encoder': profile.encoder.name,
+        'codecs': sorted(set(codecs.values()) - set(['copy'])),
+        'cores': cores,
+    }
+
+
+def profile_queue(profile):
+    """
+    Name of the queue for the encoding jobs of ``profile`` when
+    :py:data:`~encode.conf.EncodeConf.ROUTE_BY_CAPABILITIES` is enabled.
+
+    Profiles with the same requirements share a queue, e.g.
+    ``encoder.ffmpeg.libvpx-vp9+libvorbis`` or ``encoder.ffmpeg.libx265.t8``
+    for a profile that uses 8 threads.
+
+    :param profile: The encoding profile.
+    :type profile: :py:class:`~encode.models.EncodingProfile`
+    :rtype: str
+    """
+    requirements = profile_requirements(profile)
+    parts = [encoder_queue(profile.encoder)]
+    if requirements['codecs']:
+        parts.append('+'.join(requirements['codecs']))
+    if requirements['cores'] > 1:
+        parts.append('t{}'.format(requirements['cores']))
+
+    return '.'.join(parts)
+
+
+def satisfies(capabilities, requirements):
+    """
+    Whether a worker with ``capabilities`` can run jobs with
+    ``requirements``.
+
+    :param capabilities: Capabilities of the worker, see
+        :py:func:`encode.health.worker_capabilities`.
+    :type capabilities: dict
+    :param requirements: See :py:func:`profile_requirements`.
+    :type requirements: dict
+    :rtype: bool
+    """
+    encoder = capabilities.get('encoders', {}).get(requirements['encoder'])
+    if encoder is None:
+        return False
+
+    if not set(requirements['codecs']).issubset(encoder.get('codecs', [])):
+        return False
+
+    return requirements['cores'] <= capabilities.get('cores', 1)
+
+
+def thumbnails_queue():
+    """
+    Name of the queue for the jobs that extract thumbnails with
+    :py:data:`~encode.conf.EncodeConf.FFMPEG_PATH`, when
+    :py:data:`~encode.conf.EncodeConf.ROUTE_BY_CAPABILITIES` or
+    :py:data:`~encode.conf.EncodeConf.QUEUE_PER_ENCODER` is enabled.
+
+    :rtype: str
+    """
+    return '{}.thumbnails'.format(settings.ENCODE_JOB_QUEUE)
+
+
+def default_options():
+    """
+    Options for :py:meth:`celery.app.task.Task.apply_async` that route a job
+    to the :py:data:`~encode.conf.EncodeConf.JOB_QUEUE`.
+
+    :rtype: dict
+    """
+    return {
+        'queue': settings.ENCODE_JOB_QUEUE,
+        'routing_key': settings.ENCODE_JOB_ROUTING_KEY,
+    }
+
+
+def encode_options(profile):
+    """
+    Options for :py:meth:`celery.app.task.Task.apply_async` that route the
+    encoding job of ``profile`` to a queue.
+
+    :param profile: The encoding profile.
+    :type profile: :py:class:`~encode.models.EncodingProfile`
+    :rtype: dict
+    """
+    if settings.ENCODE_ROUTE_BY_CAPABILITIES and profile.encoder is not None:
+        queue = profile_queue(profile)
+        return {'queue': queue, 'routing_key': queue}
+
+    if settings.ENCODE_QUEUE_PER_ENCODER and profile.encoder is not None:
+        queue = encoder_queue(profile.encoder)
+        return {'queue': queue, 'routing_key': queue}
+
+    return default_options()
+
+
+def thumbnails_options():
+    """
+    Options for :py:meth:`celery.app.task.Task.apply_async` that route a job
+    that extracts thumbnails to a queue, see :py:func:`thumbnails_queue`.
+
+    :rtype: dict
+    """
+    if any([settings.ENCODE_ROUTE_BY_CAPABILITIES,
+            settings.ENCODE_QUEUE_PER_ENCODER]):
+        queue = thumbnails_queue()
+        return {'queue': queue, 'routing_key': queue}
+
+    return default_options()
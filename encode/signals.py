@@ -11,6 +11,8 @@ import logging
 
 from django.core.files.base import File
 
+from encode.conf import settings
+
 
 logger = logging.getLogger(__name__)
 
@@ -23,3 +25,26 @@ def check_file_changed(sender, **kwargs):
     if instance.id and instance.input_file:
         if isinstance(instance.input_file.file, File):
             instance.encoding = True
+
+
+def collect_media_files(sender, **kwargs):
+    """
+    Remember the media files of a media object that is deleted, with
+    :py:data:`~encode.conf.EncodeConf.CONTENT_ADDRESSED_STORAGE`.
+    """
+    instance = kwargs['instance']
+    if settings.ENCODE_CONTENT_ADDRESSED_STORAGE:
+        manager = instance.output_files.model.objects
+        instance._media_file_ids = list(manager.referring_to(
+            instance).values_list('pk', flat=True).distinct())
+
+
+def release_media_files(sender, **kwargs):
+    """
+    Delete the media files of a deleted media object, and their files in
+    storage, unless another media object refers to them.
+    """
+    instance = kwargs['instance']
+    ids = getattr(instance, '_media_file_ids', None)
+    if ids:
+        instance.output_files.model.objects.release(ids)
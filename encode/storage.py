@@ -7,12 +7,34 @@ Storage.
 
 from __future__ import unicode_literals
 
+import hashlib
+
+from django.core.cache import cache
+from django.utils.functional import LazyObject
+from django.core.files.storage import get_storage_class
+
 from queued_storage.backends import QueuedStorage
 
 from encode.conf import settings
+from encode.routing import default_options
+
+
+__all__ = ['QueuedEncodeSystemStorage', 'LazyStorage', 'CDNStorage',
+           'InputStorage', 'url_cache_timeout', 'cached_urls',
+           'invalidate_urls']
 
 
 class QueuedEncodeSystemStorage(QueuedStorage):
+    """
+    Storage for the uploaded input files, which are saved on the local
+    storage and transferred to the remote storage of the encoders.
+
+    Input files are hard linked or reflinked instead of copied when both
+    storages are on the same filesystem, see
+    :py:class:`~encode.transfer.TransferInput`.
+    """
+    task = 'encode.transfer.TransferInput'
+
     def __init__(self,
                 local=settings.ENCODE_LOCAL_FILE_STORAGE,
                 remote=settings.ENCODE_REMOTE_FILE_STORAGE,
@@ -27,3 +49,146 @@ class QueuedEncodeSystemStorage(QueuedStorage):
             remote_options=remote_options,
             delayed=delayed,
             *args, **kwargs)
+
+    @property
+    def shared(self):
+        """
+        Indicates if the local and remote storage are the same, so the input
+        files do not need a transfer.
+
+        :rtype: bool
+        """
+        same_backend = self.local_path == self.remote_path
+
+        return same_backend and self.local_options == self.remote_options
+
+    def transfer_task(self, name, cache_key=None):
+        """
+        The task that transfers the file with the given name to the remote
+        storage, to start in a chain of tasks instead of right away like
+        :py:meth:`~queued_storage.backends.QueuedStorage.transfer`.
+
+        :param name: Name of the file.
+        :type name: str
+        :param cache_key: The cache key to set after a successful transfer.
+        :type cache_key: str
+        :rtype: :py:class:`celery.canvas.Signature`
+        """
+        if cache_key is None:
+            cache_key = self.get_cache_key(name)
+
+        return self.task.subtask((name, cache_key,
+                                  self.local_path, self.remote_path,
+                                  self.local_options, self.remote_options),
+                                 options=default_options())
+
+
+class LazyStorage(LazyObject):
+    """
+    Storage that is created when it's first used instead of when the models
+    are imported, so processes that never touch the files don't pay for
+    importing and configuring the storage backends.
+
+    Subclasses create the storage in ``_setup()``.
+    """
+    def __bool__(self):
+        # storages are always true, which is checked by ``FileField`` on
+        # import: don't create the storage for that
+        return True
+
+    __nonzero__ = __bool__
+
+
+class CDNStorage(LazyStorage):
+    """
+    Storage for the encoded media, configured with the
+    :py:data:`~encode.conf.EncodeConf.CDN_FILE_STORAGE` setting.
+    """
+    def _setup(self):
+        self._wrapped = get_storage_class(settings.ENCODE_CDN_FILE_STORAGE)()
+
+
+class InputStorage(LazyStorage):
+    """
+    Storage for the uploaded input files, see
+    :py:class:`QueuedEncodeSystemStorage`.
+    """
+    def _setup(self):
+        self._wrapped = QueuedEncodeSystemStorage()
+
+
+def url_cache_key(name):
+    """
+    :param name: Name of a file in the CDN storage.
+    :type name: str
+    :rtype: str
+    """
+    digest = hashlib.md5(name.encode('utf-8')).hexdigest()
+
+    return 'encode:url:{}'.format(digest)
+
+
+def url_cache_timeout(storage):
+    """
+    Number of seconds that the URLs of ``storage`` are cached:
+    :py:data:`~encode.conf.EncodeConf.URL_CACHE_TIMEOUT`, and at most half
+    the lifetime of signed URLs, e.g. of S3 storages with
+    ``querystring_auth``, so a cached URL does not expire while it's used.
+
+    :param storage: A Django file storage.
+    :type storage: :py:class:`django.core.files.storage.Storage`
+    :rtype: int
+    :returns: ``None`` to cache the URLs without expiry, ``0`` to not cache
+        them.
+    """
+    timeout = settings.ENCODE_URL_CACHE_TIMEOUT
+
+    expire = None
+    if getattr(storage, 'querystring_auth', False):
+        expire = getattr(storage, 'querystring_expire', None)
+
+    if expire:
+        lifetime = int(expire) // 2
+        timeout = lifetime if timeout is None else min(timeout, lifetime)
+
+    return timeout
+
+
+def cached_urls(storage, names):
+    """
+    The URLs of files in the CDN storage. URLs that are not cached are asked
+    from ``storage`` and cached for :py:func:`url_cache_timeout` seconds.
+
+    :param storage: The CDN storage, or a client of its pool.
+    :type storage: :py:class:`django.core.files.storage.Storage`
+    :param names: Names of the files.
+    :type names: list
+    :rtype: dict
+    :returns: The URLs by name.
+    """
+    names = set(names)
+    timeout = url_cache_timeout(storage)
+    if timeout == 0:
+        return dict((name, storage.url(name)) for name in names)
+
+    keys = dict((url_cache_key(name), name) for name in names)
+    urls = dict((keys[key], url) for key, url in cache.get_many(
+        list(keys)).items())
+
+    missing = dict((key, storage.url(name)) for key, name in keys.items()
+                   if name not in urls)
+    if missing:
+        cache.set_many(missing, timeout)
+        urls.update((keys[key], url) for key, url in missing.items())
+
+    return urls
+
+
+def invalidate_urls(names):
+    """
+    Remove the cached URLs of files, e.g. of files that are deleted.
+
+    :param names: Names of the files.
+    :type names: list
+    """
+    cache.delete_many([url_cache_key(name) for name in names])
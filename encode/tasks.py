@@ -8,15 +8,27 @@ Tasks.
 from __future__ import unicode_literals
 
 from celery import Task
+from celery.signals import (celeryd_after_setup, worker_process_init,
+    worker_process_shutdown)
+from celery.worker.control import Panel
 from celery.utils.log import get_task_logger
 
-from encode.models import MediaBase
-from encode.util import fqn, short_path
-from encode import EncodeError, UploadError
+from encode.models import MediaBase, MediaFile, EncodingJob
+from encode.conf import settings
+from encode.util import (fqn, short_path, find_outputs, remove_path,
+    backoff)
+from encode import EncodeError, UploadError, bulk
 from encode.encoders import get_encoder_class
+from encode.accounting import ResourceUsage
+from encode.health import add_encoder_queues, encode_capabilities
+from encode.thumbnails import extract_thumbnails
+from encode.transfer import TransferInput
+from encode.outbox import dispatch_outbox
+from encode.pool import reset_pools, close_pools
 
 
-__all__ = ['EncodeMedia', 'StoreMedia']
+__all__ = ['EncodeMedia', 'StoreMedia', 'ExtractThumbnails', 'TransferInput',
+           'DispatchJobs', 'BulkMedia']
 
 logger = get_task_logger(__name__)
 
@@ -42,11 +54,62 @@ def media_base(obj_id):
     return base
 
 
-class EncodeMedia(Task):
+class AutoRetryTask(Task):
+    """
+    Task that is retried with exponential backoff and jitter, see
+    :py:func:`~encode.util.backoff`, when it raises one of the
+    :py:attr:`autoretry_for` exceptions. It's retried at most
+    :py:data:`~encode.conf.EncodeConf.TASK_MAX_RETRIES` times.
+    """
+    abstract = True
+
+    #: Exceptions of transient errors that are retried.
+    autoretry_for = ()
+
+    def __init__(self):
+        # wrap run() like the ``autoretry_for`` option of the task decorator,
+        # so the worker and apply() keep managing the request stack
+        if self.autoretry_for and not hasattr(self, '_run'):
+            self._run, self.run = self.run, self._autoretry
+
+    def _autoretry(self, *args, **kwargs):
+        """
+        Run the task and retry it after one of the :py:attr:`autoretry_for`
+        exceptions.
+        """
+        try:
+            return self._run(*args, **kwargs)
+        except self.autoretry_for as exc:
+            request = self.request
+            if request.is_eager:
+                # retry() applies an eager retry too, but raises Retry
+                # instead of returning its result
+                if request.retries >= settings.ENCODE_TASK_MAX_RETRIES:
+                    raise
+                return self.subtask_from_request(request, args, kwargs,
+                    retries=request.retries + 1).apply().get()
+
+            countdown = backoff(request.retries,
+                settings.ENCODE_RETRY_BACKOFF,
+                settings.ENCODE_RETRY_BACKOFF_MAX,
+                settings.ENCODE_RETRY_JITTER)
+            logger.warning("{0} failed: {1} - retrying in {2:.1f}s".format(
+                self.name, exc, countdown))
+
+            raise self.retry(exc=exc, countdown=countdown,
+                max_retries=settings.ENCODE_TASK_MAX_RETRIES)
+
+
+class EncodeMedia(AutoRetryTask):
     """
     Encode a :py:class:`~encode.models.MediaBase` model's ``input_file``.
+
+    I/O errors, e.g. of a network filesystem, are retried. Errors of the
+    encoder are not: encoding the same input again fails the same way.
     """
-    def run(self, profile, media_id, input_path, output_path):
+    autoretry_for = (EnvironmentError,)
+
+    def run(self, profile, media_id, input_path, output_path, variants=None):
         """
         Execute the task.
 
@@ -60,14 +123,28 @@ class EncodeMedia(Task):
         :type input_path: str
         :param output_path:
         :type output_path:
+        :param variants: Other profiles and their output paths, as
+            ``(profile, output_path)`` tuples, that are encoded from the same
+            input by encoders that
+            :py:attr:`~encode.encoders.BaseEncoder.supports_variants`.
+        :type variants: list
 
         :rtype: dict
-        :returns: Dictionary with ``id`` (media object's id) and ``profile``
-            (encoding profile instance).
+        :returns: Dictionary with ``id`` (media object's id), ``profile``
+            (encoding profile instance), ``outputs`` (locations of the files
+            produced by the encoder), ``usage`` (resources used by the
+            encoder, see :py:class:`~encode.accounting.ResourceUsage`), the
+            ``analysis`` of the input by the encoder, if any, the
+            ``profile`` and ``outputs`` of the ``variants`` and the ``job``
+            id.
         """
         # find encoder
-        Encoder = get_encoder_class(profile.encoder.klass)
-        encoder = Encoder(profile, input_path, output_path)
+        Encoder = get_encoder_class(profile.encoder_class)
+        if variants:
+            encoder = Encoder(profile, input_path, output_path,
+                variants=variants)
+        else:
+            encoder = Encoder(profile, input_path, output_path)
 
         logger.debug("***** New '{}' encoder job *****".format(profile))
         logger.debug("Loading encoder: {0} ({1})".format(profile.encoder,
@@ -89,8 +166,10 @@ class EncodeMedia(Task):
            })
 
         # start encoding
+        usage = ResourceUsage()
         try:
-            encoder.start()
+            with usage:
+                encoder.start()
         except EncodeError as error:
             error_msg = "Encoding Media failed: {0}".format(
                 encoder.input_path)
@@ -102,19 +181,34 @@ class EncodeMedia(Task):
             raise
 
         logger.debug("Completed encoding ({0}) - output file: {1}".format(
-            profile.mime_type, short_path(encoder.output_path)))
+            profile.mime_type, short_path(encoder.output_path)), extra={
+            'encoder_usage': usage.as_dict()
+        })
 
         return {
             "id": media_id,
-            "profile": profile
+            "job": self.request.id,
+            "profile": profile,
+            "outputs": encoder.outputs(),
+            "usage": usage.as_dict(),
+            "analysis": encoder.analysis,
+            "variants": [{
+                "profile": variant,
+                "outputs": find_outputs(variant_path),
+            } for variant, variant_path in encoder.variants],
         }
 
 
-class StoreMedia(Task):
+class StoreMedia(AutoRetryTask):
     """
     Upload an instance :py:class:`~encode.models.MediaBase` model's
     ``output_files`` m2m field.
+
+    Upload and I/O errors, e.g. timeouts of the CDN, are retried. A retry
+    doesn't store the files that an earlier attempt stored again.
     """
+    autoretry_for = (UploadError, EnvironmentError)
+
     #: If enabled the worker will not store task state and return values
     #: for this task.
     ignore_result = True
@@ -128,26 +222,167 @@ class StoreMedia(Task):
         """
         media_id = data.get('id')
         profile = data.get('profile')
+        usage = data.get('usage')
         base = media_base(media_id)
         media = base.get_media()
 
-        logger.debug("Uploading encoded file: {0}".format(
-            short_path(media.output_path(profile))))
+        # the profiles that were encoded in this job and their output files
+        outputs = [(profile, data.get('outputs'))]
+        outputs += [(variant['profile'], variant['outputs'])
+                    for variant in data.get('variants', [])]
+
+        if media.canceled:
+            for profile, files in outputs:
+                logger.info("Encoding canceled: {0} - discarding {1}".format(
+                    media, short_path(media.output_path(profile))))
+                remove_path(media.output_path(profile))
+            return
+
+        # the files are named after the job, so a retry or a redelivery of
+        # the task skips the files that were stored before
+        job = data.get('job') or self.request.id
+
+        for profile, files in outputs:
+            logger.debug("Uploading encoded file: {0}".format(
+                short_path(media.output_path(profile))))
 
         try:
             # store the media object
-            media.store_file(profile)
+            media_files = media.store_files(outputs, job=job)
         except (UploadError, Exception) as exc:
-            # XXX: handle exception: SSLError('The read operation timed out',)
-            logger.error("Upload media failed: '{0}' - retrying ({1})".format(
+            logger.error("Upload media failed: '{0}' ({1})".format(
                 media, exc), exc_info=True)
             raise
 
-        logger.info("Upload complete: {0}".format(
-            short_path(media.output_path(profile))), extra={
-            'output_files': [x.file.url for x in media.output_files.all()],
-        })
+        urls = MediaFile.objects.urls(media_files)
+        for profile, files in outputs:
+            logger.info("Upload complete: {0}".format(
+                short_path(media.output_path(profile))), extra={
+                'output_files': [urls[media_file.pk]
+                                 for media_file in media_files
+                                 if media_file.profile_id == profile.pk],
+            })
+
+        # store the duration, loudness and waveform of audio
+        analysis = data.get('analysis')
+        if analysis and hasattr(media, 'store_analysis'):
+            media.store_analysis(analysis)
 
         # remove the original input file
         if media.keep_input_file is False:
-            media.remove_file(profile)
+            for profile, files in outputs:
+                media.remove_file(profile)
+
+        # record the resources used by the encoder, once for a job with
+        # variants, when nothing can fail and retry the job anymore
+        if usage is not None:
+            EncodingJob.objects.create(media=base, profile=data['profile'],
+                **usage)
+
+
+class ExtractThumbnails(Task):
+    """
+    Extract thumbnails from the ``input_file`` of a
+    :py:class:`~encode.models.Video` and store them in its ``thumbnails``
+    field.
+    """
+    #: If enabled the worker will not store task state and return values
+    #: for this task.
+    ignore_result = True
+
+    def run(self, media_id, input_path, output_path, positions=None):
+        """
+        Execute the task.
+
+        :param media_id: The primary key of the
+            :py:class:`~encode.models.Video` model.
+        :type media_id: int
+        :param input_path: Location of the input file.
+        :type input_path: str
+        :param output_path: Directory for the thumbnails.
+        :type output_path: str
+        :param positions: Timestamps or percentages of the duration, see
+            :py:data:`~encode.thumbnails.POSITION`.
+        :type positions: list
+        """
+        try:
+            with ResourceUsage() as usage:
+                paths = extract_thumbnails(input_path, output_path,
+                    positions)
+        except EncodeError as error:
+            logger.error("Extracting thumbnails failed: {0}".format(
+                input_path), exc_info=True, extra={
+                'output': getattr(error, 'output', None),
+                'command': getattr(error, 'command', None)
+            })
+            raise
+
+        logger.debug("Extracted {0} thumbnails in {1:.3f}s".format(
+            len(paths), usage.wall_time))
+
+        try:
+            media_base(media_id).get_media().store_thumbnails(paths)
+        finally:
+            remove_path(output_path)
+
+
+class DispatchJobs(Task):
+    """
+    Start the chains of tasks of the outbox rows that a transaction
+    recorded, see :py:mod:`encode.outbox`.
+    """
+    #: If enabled the worker will not store task state and return values
+    #: for this task.
+    ignore_result = True
+
+    def run(self, outbox_ids):
+        """
+        Execute the task.
+
+        :param outbox_ids: Primary keys of the
+            :py:class:`~encode.models.OutboxJob` rows.
+        :type outbox_ids: list
+        """
+        count = dispatch_outbox(outbox_ids)
+
+        logger.debug("Started the encoding jobs of {0} media objects".format(
+            count))
+
+
+class BulkMedia(Task):
+    """
+    Run a bulk operation of :py:mod:`encode.bulk` on a selection of media
+    objects, in throttled batches, see :py:func:`encode.bulk.defer`.
+    """
+    #: If enabled the worker will not store task state and return values
+    #: for this task.
+    ignore_result = True
+
+    def run(self, action, model, query):
+        """
+        Execute the task.
+
+        :param action: Name of the bulk function: ``reencode``, ``retry`` or
+            ``cancel``.
+        :type action: str
+        :param model: The model of the media objects.
+        :type model: :py:class:`~encode.models.MediaBase` subclass
+        :param query: The query that selects the media objects.
+        :type query: :py:class:`django.db.models.sql.Query`
+        """
+        queryset = model.objects.all()
+        queryset.query = query
+
+        result = getattr(bulk, action)(queryset)
+
+        logger.info("Bulk {0} of {1} completed: {2}".format(action,
+            model._meta.verbose_name_plural, result))
+
+
+# probe the encoders when a worker starts, and advertise its capabilities
+celeryd_after_setup.connect(add_encoder_queues)
+Panel.register(encode_capabilities)
+
+# every worker process has storage clients of its own
+worker_process_init.connect(reset_pools)
+worker_process_shutdown.connect(close_pools)
@@ -58,6 +58,9 @@ ENCODE_MEDIA_ROOT = MEDIA_ROOT
 
 ENCODE_DEFAULT_ENCODER_CLASS = "encode.encoders.BasicEncoder"
 
+#: The test cases run in a transaction that is never committed.
+ENCODE_DISPATCH_ON_COMMIT = False
+
 #: Encoding profiles configuration.
 ENCODE_AUDIO_PROFILES = ["MP3 Audio", "Ogg Audio"]
 ENCODE_VIDEO_PROFILES = ["MP4", "WebM Audio/Video"]
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# Copyright Collab 2016
+# See LICENSE for details.
+
+"""
+Tests for the :py:mod:`encode.accounting` module.
+"""
+
+from __future__ import unicode_literals
+
+import sys
+import time
+import subprocess
+
+from django.test import TestCase
+
+from encode.accounting import (ResourceUsage, USAGE_FIELDS, wait_process,
+    peak_rss)
+
+
+class ResourceUsageTestCase(TestCase):
+    """
+    Tests for :py:class:`encode.accounting.ResourceUsage`.
+    """
+    def test_childProcess(self):
+        """
+        The resources used by a child process started within the block are
+        measured.
+        """
+        with ResourceUsage() as usage:
+            process = subprocess.Popen(['sleep', '0.1'])
+            self.assertEqual(wait_process(process), 0)
+
+        self.assertEqual(process.returncode, 0)
+        self.assertGreaterEqual(usage.wall_time, 0.1)
+        self.assertGreaterEqual(usage.user_time, 0)
+        self.assertGreaterEqual(usage.system_time, 0)
+        self.assertGreater(usage.max_rss, 0)
+
+    def test_peakOfJob(self):
+        """
+        The peak memory usage of a child process of an earlier job is not
+        measured.
+        """
+        subprocess.check_call([sys.executable, '-c',
+            'data = bytearray(256 * 1024 * 1024)'])
+
+        with ResourceUsage() as usage:
+            wait_process(subprocess.Popen(['true']))
+
+        self.assertLess(usage.max_rss, 128 * 1024)
+
+    def test_notMeasured(self):
+        """
+        The peak memory usage is unknown when no child process was reaped
+        with `wait_process`.
+        """
+        with ResourceUsage() as usage:
+            subprocess.check_call(['true'])
+
+        self.assertIsNone(usage.max_rss)
+
+    def test_peak_rss(self):
+        """
+        `peak_rss` ignores the runs that did not measure the peak.
+        """
+        self.assertEqual(peak_rss([None, 10, 30, 20]), 30)
+        self.assertIsNone(peak_rss([None, None]))
+
+    def test_asDict(self):
+        """
+        `as_dict` returns all measurements.
+        """
+        with ResourceUsage() as usage:
+            pass
+
+        result = usage.as_dict()
+        self.assertEqual(sorted(result.keys()), sorted(USAGE_FIELDS))
+        self.assertAlmostEqual(result['user_time'], 0, places=1)
+
+    def test_inProcess(self):
+        """
+        The resources used by the current process, e.g. by an in-process
+        encoder, are measured.
+        """
+        with ResourceUsage() as usage:
+            started = time.time()
+            while time.time() - started < 0.2:
+                pass
+            # raises the peak of the process
+            data = b'x' * (768 * 1024 * 1024)
+
+        del data
+        self.assertGreater(usage.user_time + usage.system_time, 0.1)
+        self.assertGreaterEqual(usage.max_rss, 768 * 1024)
@@ -8,15 +8,24 @@ Tests for the :py:mod:`encode.admin` module.
 
 from __future__ import unicode_literals
 
-from django.test import TestCase
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.contrib import admin as django_admin
 from django.core.urlresolvers import reverse
 
 from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
+from django.contrib.messages.storage.fallback import FallbackStorage
 from django.contrib.admin.sites import AdminSite
 
 from webtest import Upload
 
 from encode import admin, models
+from encode.pagination import EstimatedCountPaginator
 from encode.util import get_random_filename, parseMedia
 from encode.tests.helpers import (PNG_DATA, DJANGO_19_AND_NEWER,
     DummyDataMixin, FileTestCase)
@@ -42,7 +51,7 @@ class MediaFileAdminTests(TestCase):
         ma = admin.MediaFileAdmin(models.MediaFile, self.site)
 
         self.assertEqual(list(ma.get_form(request).base_fields),
-            ['title', 'file'])
+            ['title', 'file', 'profile'])
         self.assertEqual(ma.search_fields, ['title'])
         self.assertEqual(ma.ordering, ['title'])
 
@@ -93,14 +102,17 @@ class EncodingProfileAdminTests(TestCase):
     def test_fields(self):
         self.assertEqual(list(self.ma.get_form(request).base_fields),
             ['name', 'description', 'mime_type', 'container', 'video_codec',
-             'audio_codec', 'encoder', 'command'])
+             'audio_codec', 'encoder', 'command', 'streaming_format',
+             'multiple_outputs', 'segment_duration'])
         self.assertEqual(self.ma.search_fields, ['name', 'description',
              'mime_type', 'container'])
         self.assertEqual(self.ma.ordering, ['name'])
         self.assertEqual(self.ma.list_display, ('name', 'encoder_link',
-             'container', 'mime_type', 'video_codec', 'audio_codec'))
+             'container', 'mime_type', 'video_codec', 'audio_codec',
+             'streaming_format'))
         self.assertEqual(self.ma.list_filter, ('container', 'mime_type',
-            'encoder'))
+            'encoder', 'streaming_format'))
+        self.assertEqual(self.ma.list_select_related, ('encoder',))
 
     def test_encoder_link(self):
         result = "<b><a href='/encode/encoder/{}/".format(self.profile.id)
@@ -149,3 +161,110 @@ class MediaAdminTests(FileTestCase, DummyDataMixin):
             get_random_filename('png'), parseMedia(PNG_DATA))
         response.form['profiles'].force_value(['8'])
         response = response.form.submit().follow(status=200)
+
+    def test_keyset_pagination(self):
+        """
+        The changelist pages through the media with a cursor.
+        """
+        user = User.objects.create_superuser('thijs', 'foo@example.com',
+            'secret')
+        for index in range(3):
+            models.Snapshot.objects.create(title='snapshot{}'.format(index))
+
+        model_admin = django_admin.site._registry[models.Snapshot]
+        model_admin.list_per_page = 2
+        try:
+            url = reverse('admin:encode_snapshot_changelist')
+            response = self.app.get(url, user=user)
+
+            self.assertIn('snapshot2', response)
+            self.assertIn('snapshot1', response)
+            self.assertNotIn('snapshot0', response)
+            self.assertIn('cursor=', response)
+
+            # the next page is not counted again
+            with CaptureQueriesContext(connection) as queries:
+                response = response.click(href='cursor=')
+            self.assertFalse([query for query in queries.captured_queries
+                              if 'COUNT(' in query['sql'].upper()])
+
+            self.assertIn('snapshot0', response)
+            self.assertNotIn('snapshot1', response)
+            self.assertNotIn('snapshot2', response)
+            self.assertIn('3 Snapshots', response)
+        finally:
+            model_admin.list_per_page = admin.MediaAdmin.list_per_page
+
+
+    def test_keyset_pagination_ties(self):
+        """
+        Media that were modified at the same time, e.g. by a bulk action,
+        are shown once, on one of the pages.
+        """
+        user = User.objects.create_superuser('thijs', 'foo@example.com',
+            'secret')
+        now = timezone.now()
+        for index in range(5):
+            media = models.Snapshot.objects.create(
+                title='snapshot{}'.format(index))
+            # the ordering of MediaBase disagrees with the primary keys
+            models.Snapshot.objects.filter(pk=media.pk).update(
+                created_at=now - timedelta(minutes=(index * 3) % 5))
+        models.Snapshot.objects.update(modified_at=now)
+
+        model_admin = django_admin.site._registry[models.Snapshot]
+        model_admin.list_per_page = 2
+        try:
+            url = reverse('admin:encode_snapshot_changelist')
+            response = self.app.get(url, user=user)
+            pages = []
+            while True:
+                pages.append([index for index in range(5)
+                              if 'snapshot{}'.format(index) in response])
+                if 'cursor=' not in response:
+                    break
+                response = response.click(href='cursor=')
+
+            self.assertEqual(pages, [[3, 4], [1, 2], [0]])
+        finally:
+            model_admin.list_per_page = admin.MediaAdmin.list_per_page
+
+    @override_settings(ENCODE_BULK_ASYNC_THRESHOLD=1)
+    def test_defer_action(self):
+        """
+        A selection that is too large to process in the request is handed to
+        the :py:class:`~encode.tasks.BulkMedia` task.
+        """
+        for index in range(2):
+            models.Snapshot.objects.create(title='snapshot{}'.format(index))
+        self.assertEqual(models.Snapshot.objects.filter(
+            encoding=True).count(), 2)
+
+        action_request = RequestFactory().post('/')
+        action_request.session = {}
+        action_request._messages = FallbackStorage(action_request)
+        self.ma.cancel(action_request, models.Snapshot.objects.all())
+
+        self.assertFalse(models.Snapshot.objects.filter(
+            encoding=True).exists())
+        self.assertIn('processed in the background', [str(message)
+            for message in get_messages(action_request)][0])
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    """
+    Tests for :py:class:`encode.pagination.EstimatedCountPaginator`.
+    """
+    def test_exactCount(self):
+        """
+        The paginator falls back to an exact count when the database has no
+        estimate, like SQLite.
+        """
+        models.MediaFile.objects.create(title='foo')
+        models.MediaFile.objects.create(title='bar')
+
+        paginator = EstimatedCountPaginator(models.MediaFile.objects.all(), 1)
+
+        self.assertIsNone(paginator.estimate())
+        self.assertEqual(paginator.count, 2)
+        self.assertEqual(paginator.num_pages, 2)
@@ -0,0 +1,132 @@
+# Copyright Collab 2016
+# See LICENSE for details.
+
+"""
+Tests for the :py:mod:`encode.audio` module.
+"""
+
+from __future__ import unicode_literals
+
+import struct
+
+from django.test import TestCase
+
+from encode import models
+from encode.audio import Waveform, parse_loudness
+from encode.encoders import AudioEncoder
+
+
+def pcm(samples):
+    """
+    Mono 16-bit little-endian PCM bytes of ``samples``.
+    """
+    return struct.pack(str('<{}h'.format(len(samples))), *samples)
+
+
+class WaveformTestCase(TestCase):
+    """
+    Tests for :py:class:`encode.audio.Waveform`.
+    """
+    def test_peaks(self):
+        """
+        The peaks are the largest absolute sample of each part of the stream,
+        scaled to 0-255.
+        """
+        waveform = Waveform(rate=100, resolution=10)
+        data = pcm([0] * 50 + [16384] * 10 + [-32768] * 10 + [0] * 30)
+
+        # odd chunk sizes split the samples
+        for start in range(0, len(data), 7):
+            waveform.feed(data[start:start + 7])
+
+        self.assertEqual(waveform.duration, 1)
+        self.assertEqual(waveform.peaks(10),
+            [0, 0, 0, 0, 0, 128, 255, 0, 0, 0])
+        self.assertEqual(waveform.peaks(5), [0, 0, 128, 255, 0])
+        self.assertEqual(waveform.peaks(20), waveform.peaks(10))
+
+
+class ParseLoudnessTestCase(TestCase):
+    """
+    Tests for :py:func:`encode.audio.parse_loudness`.
+    """
+    def test_summary(self):
+        output = "\n".join([
+            "[Parsed_ebur128_0 @ 0x7f] t: 2.9 M: -20.1 S: -21.0 I: -20.3 "
+            "LUFS LRA: 0.0 LU",
+            "[Parsed_ebur128_0 @ 0x7f] Summary:",
+            "",
+            "  Integrated loudness:",
+            "    I:         -19.8 LUFS",
+            "    Threshold: -30.1 LUFS",
+            "",
+            "  Loudness range:",
+            "    LRA:         3.2 LU",
+        ])
+
+        self.assertEqual(parse_loudness(output),
+            {'loudness': -19.8, 'loudness_range': 3.2})
+
+    def test_silence(self):
+        self.assertEqual(parse_loudness("    I:         -inf LUFS"),
+            {'loudness': None, 'loudness_range': None})
+
+
+class AudioEncoderTestCase(TestCase):
+    """
+    Tests for :py:class:`encode.encoders.AudioEncoder`.
+    """
+    def setUp(self):
+        enc = models.Encoder.objects.create(name="ffmpeg", path="ffmpeg",
+            klass="encode.encoders.AudioEncoder")
+        self.mp3 = models.EncodingProfile.objects.create(name="MP3",
+            container="mp3", encoder=enc,
+            command='-i "{input}" -c:a libmp3lame -b:a 192k "{output}"')
+        self.ogg = models.EncodingProfile.objects.create(name="Ogg",
+            container="oga", encoder=enc, command='-c:a libvorbis')
+
+    def test_arguments(self):
+        """
+        The input is decoded once and encoded to every output and the
+        analysis streams.
+        """
+        encoder = AudioEncoder(self.mp3, 'in.wav', 'out.mp3',
+            variants=[(self.ogg, 'out.oga')])
+        arguments = encoder.arguments
+
+        self.assertEqual(arguments.count('-i'), 1)
+        self.assertEqual(arguments[arguments.index('-i') + 1], 'in.wav')
+        start = arguments.index('-map')
+        self.assertEqual(arguments[start:start + 12], ['-map', '0:a:0',
+            '-c:a', 'libmp3lame', '-b:a', '192k', 'out.mp3', '-map', '0:a:0',
+            '-c:a', 'libvorbis', 'out.oga'])
+        self.assertIn('ebur128', arguments)
+        self.assertEqual(arguments[-3:], ['-f', 's16le', 'pipe:1'])
+
+    def test_missingProgram(self):
+        """
+        An :py:class:`encode.EncodeError` is raised when the FFmpeg
+        executable cannot be found.
+        """
+        from encode import EncodeError
+
+        self.mp3.encoder.path = '/fake/path/to/ffmpeg'
+        encoder = AudioEncoder(self.mp3, 'in.wav', 'out.mp3')
+
+        self.assertRaises(EncodeError, encoder.start)
+
+
+class StoreAnalysisTestCase(TestCase):
+    """
+    Tests for :py:meth:`encode.models.Audio.store_analysis`.
+    """
+    def test_store(self):
+        audio = models.Audio.objects.create(title='Foo')
+
+        audio.store_analysis({'duration': 12.5, 'loudness': -16.2,
+            'loudness_range': 4.1, 'peaks': [0, 12, 255]})
+        audio = models.Audio.objects.get(pk=audio.pk)
+
+        self.assertEqual(audio.duration, 12.5)
+        self.assertEqual(audio.loudness, -16.2)
+        self.assertEqual(audio.peaks, [0, 12, 255])
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+# Copyright Collab 2016
+# See LICENSE for details.
+
+"""
+Tests for the :py:mod:`encode.benchmarks` package and the ``encode_bench``
+management command.
+"""
+
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+
+from django.test import TestCase
+from django.utils.six import StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from encode import models, EncodeError
+from encode.util import parseMedia
+from encode.benchmarks import stats, profiles, imports, images, pipeline
+from encode.tests.helpers import PNG_DATA, FileTestCase
+
+
+class SummarizeTestCase(TestCase):
+    """
+    Tests for :py:func:`encode.benchmarks.stats.summarize`.
+    """
+    def test_samples(self):
+        """
+        `summarize` returns the latency statistics of the samples.
+        """
+        result = stats.summarize([0.4, 0.1, 0.3, 0.2, 1.0])
+
+        self.assertEqual(result['count'], 5)
+        self.assertAlmostEqual(result['total'], 2.0)
+        self.assertEqual(result['min'], 0.1)
+        self.assertEqual(result['max'], 1.0)
+        self.assertAlmostEqual(result['mean'], 0.4)
+        self.assertEqual(result['median'], 0.3)
+        self.assertEqual(result['p95'], 1.0)
+
+    def test_empty(self):
+        """
+        `summarize` does not fail without samples.
+        """
+        result = stats.summarize([])
+
+        self.assertEqual(result['count'], 0)
+        self.assertIsNone(result['mean'])
+        self.assertIsNone(result['median'])
+
+
+class BenchProfileTestCase(FileTestCase):
+    """
+    Tests for :py:mod:`encode.benchmarks.profiles` and the ``encode_bench``
+    management command.
+    """
+    def setUp(self):
+        FileTestCase.setUp(self)
+
+        encoder = models.Encoder.objects.create(name='cp', path='cp')
+        for name in ('Copy', 'Copy again'):
+            models.EncodingProfile.objects.create(name=name, encoder=encoder,
+                container='png', command='"{input}" "{output}"')
+
+        fd, self.input_path = tempfile.mkstemp(suffix='.png')
+        with os.fdopen(fd, 'wb') as input_file:
+            input_file.write(parseMedia(PNG_DATA))
+        self.addCleanup(os.remove, self.input_path)
+
+    def test_benchProfile(self):
+        """
+        `bench_profile` measures every run of the encoder.
+        """
+        profile = models.EncodingProfile.objects.get(name='Copy')
+
+        result = profiles.bench_profile(profile, self.input_path,
+            iterations=2, ffprobe='/nonexistent/ffprobe')
+
+        self.assertEqual(result['profile'], 'Copy')
+        self.assertEqual(result['wall_time']['count'], 2)
+        self.assertEqual(result['cpu_time']['count'], 2)
+        self.assertEqual(result['output_size'],
+            os.path.getsize(self.input_path))
+        # the duration of still images is unknown
+        self.assertIsNone(result['realtime_factor'])
+        self.assertIsNone(result['output_bitrate'])
+
+    def test_encodeError(self):
+        """
+        Errors of the encoder are raised in the calling process.
+        """
+        profile = models.EncodingProfile.objects.get(name='Copy')
+
+        self.assertRaises(EncodeError, profiles.bench_profile, profile,
+            os.path.join(tempfile.gettempdir(), 'missing.png'), 1)
+
+    def test_command(self):
+        """
+        The command compares the profiles side by side.
+        """
+        out = StringIO()
+
+        call_command('encode_bench', profiles=['Copy', 'Copy again'],
+            input_path=self.input_path, iterations=1, stdout=out)
+
+        header = out.getvalue().splitlines()[0]
+        self.assertIn('Copy', header)
+        self.assertIn('Copy again', header)
+        self.assertIn('peak rss', out.getvalue())
+
+    def test_commandUnknownProfile(self):
+        self.assertRaises(CommandError, call_command, 'encode_bench',
+            profiles=['Unknown'], input_path=self.input_path)
+
+
+class PipelineTestCase(FileTestCase):
+    """
+    Tests for :py:mod:`encode.benchmarks.pipeline`.
+    """
+    def setUp(self):
+        FileTestCase.setUp(self)
+
+        fd, self.input_path = tempfile.mkstemp(suffix='.png')
+        with os.fdopen(fd, 'wb') as input_file:
+            input_file.write(parseMedia(PNG_DATA))
+        self.addCleanup(os.remove, self.input_path)
+
+    def test_scenarios(self):
+        """
+        Every built-in encoder class has a scenario.
+        """
+        self.assertEqual(set(scenario['klass'].rsplit('.', 1)[1]
+                             for scenario in pipeline.SCENARIOS),
+            set(['BasicEncoder', 'FFMpegEncoder', 'AudioEncoder',
+                 'LadderEncoder', 'PillowEncoder']))
+
+    def test_runScenario(self):
+        """
+        The stages of the Pillow scenario, which runs in-process, are
+        measured.
+        """
+        scenario = [scenario for scenario in pipeline.SCENARIOS
+                    if scenario['name'] == 'snapshot-pillow'][0]
+
+        result = pipeline.run_scenario(scenario, self.input_path,
+            iterations=1)
+
+        self.assertEqual(result['encoder_class'],
+            'encode.encoders.PillowEncoder')
+        self.assertGreater(result['output_size'], 0)
+        self.assertEqual(result['stages']['encode']['count'], 1)
+
+
+class ImagesTestCase(TestCase):
+    """
+    Tests for :py:mod:`encode.benchmarks.images`.
+    """
+    def test_run_images(self):
+        """
+        The variants are rendered by both encoders.
+        """
+        workdir = tempfile.mkdtemp()
+        try:
+            results = images.run_images(workdir, iterations=1)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        self.assertEqual([result['name'] for result in results],
+            ['convert', 'pillow'])
+        self.assertEqual(results[1]['variants'], len(images.VARIANTS))
+        self.assertIsNone(results[1]['error'])
+        self.assertEqual(results[1]['wall_time']['count'], 1)
+
+
+class ImportsTestCase(TestCase):
+    """
+    Tests for :py:mod:`encode.benchmarks.imports`.
+    """
+    def test_lazy(self):
+        """
+        Importing the encoders does not import the converter or create the
+        storages.
+        """
+        result = imports.measure_import('encode.encoders')
+
+        self.assertGreater(result['setup'], 0)
+        self.assertEqual(result['loaded'], [])
+        self.assertEqual(result['storages'], 0)
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+# Copyright Collab 2016
+# See LICENSE for details.
+
+"""
+Tests for the :py:mod:`encode.bulk` module and the ``encode_reencode``
+management command.
+"""
+
+from __future__ import unicode_literals
+
+import os
+import pickle
+
+from django.test import override_settings
+from django.core.management import call_command
+from django.core.files.base import ContentFile
+from django.core.management.base import CommandError
+from django.utils.six import StringIO
+
+from encode import bulk, models, tasks
+from encode.util import parseMedia
+from encode.tests.helpers import PNG_DATA, FileTestCase
+
+
+class CopyTestCase(FileTestCase):
+    """
+    Creates an encoding profile that copies the input file.
+    """
+    def setUp(self):
+        FileTestCase.setUp(self)
+
+        encoder = models.Encoder.objects.create(name='cp', path='cp')
+        self.profile = models.EncodingProfile.objects.create(name='Copy',
+            encoder=encoder, container='png', command='"{input}" "{output}"')
+
+    def createMedia(self, title='test.png'):
+        """
+        Create an encoded snapshot that keeps its input file.
+        """
+        media = models.Snapshot.objects.create(title=title,
+            keep_input_file=True)
+        media.profiles.add(self.profile)
+        media.input_file.save(title, ContentFile(parseMedia(PNG_DATA)),
+            save=False)
+        media.save(profiles=[self.profile.pk])
+
+        return models.Snapshot.objects.get(pk=media.pk)
+
+
+class BulkTestCase(CopyTestCase):
+    """
+    Tests for :py:mod:`encode.bulk`.
+    """
+    def test_batched(self):
+        """
+        `batched` returns the primary keys in batches.
+        """
+        pks = [models.Audio.objects.create(title=str(x)).pk for x in range(5)]
+
+        batches = list(bulk.batched(models.Audio.objects.all(), 2))
+
+        self.assertEqual(batches, [pks[:2], pks[2:4], pks[4:]])
+
+    def test_reencode(self):
+        """
+        `reencode` replaces the output files of the media objects.
+        """
+        media = self.createMedia()
+        previous = list(media.output_files.all())
+        self.assertTrue(media.encoded)
+
+        result = bulk.reencode(models.Snapshot.objects.all(), batch_size=1)
+
+        self.assertEqual(result, {'queued': 1, 'skipped': 0})
+        media = models.Snapshot.objects.get(pk=media.pk)
+        self.assertTrue(media.encoded)
+        self.assertEqual(media.output_files.count(), 1)
+        self.assertNotEqual(list(media.output_files.all()), previous)
+        # the previous output files are released
+        self.assertFalse(models.MediaFile.objects.filter(
+            pk__in=[media_file.pk for media_file in previous]).exists())
+
+    @override_settings(ENCODE_DISPATCH_ON_COMMIT=False)
+    def test_reencodeMediaType(self):
+        """
+        The jobs are sent by the media type, e.g. with the thumbnail job of a
+        video.
+        """
+        video = models.Video.objects.create(title='foo')
+        models.MediaBase.objects.filter(pk=video.pk).update(
+            input_file='foo.mov')
+        dispatched = []
+        dispatch = models.Video.dispatch
+
+        def record_dispatch(media, profiles, transfer=False):
+            dispatched.append(media)
+
+        models.Video.dispatch = record_dispatch
+        try:
+            bulk.reencode(models.MediaBase.objects.all())
+        finally:
+            models.Video.dispatch = dispatch
+
+        self.assertEqual(dispatched, [video])
+        self.assertIsInstance(dispatched[0], models.Video)
+
+    def test_reencodeMissingInput(self):
+        """
+        Media objects without an input file are skipped.
+        """
+        models.Snapshot.objects.create(title='foo')
+
+        result = bulk.reencode(models.Snapshot.objects.all())
+
+        self.assertEqual(result, {'queued': 0, 'skipped': 1})
+
+    def test_cancel(self):
+        """
+        `cancel` disables the encoding flag of media that did not complete
+        encoding.
+        """
+        media = models.Video.objects.create(title='foo')
+        self.assertTrue(media.encoding)
+
+        self.assertEqual(bulk.cancel(models.Video.objects.all()), 1)
+        self.assertFalse(models.Video.objects.get(pk=media.pk).encoding)
+
+    def test_defer(self):
+        """
+        `defer` runs a bulk function on the media objects of a queryset in
+        the :py:class:`~encode.tasks.BulkMedia` task.
+        """
+        media = models.Video.objects.create(title='foo')
+        other = models.Video.objects.create(title='bar')
+
+        bulk.defer('cancel', models.Video.objects.filter(pk=media.pk))
+
+        self.assertFalse(models.Video.objects.get(pk=media.pk).encoding)
+        self.assertTrue(models.Video.objects.get(pk=other.pk).encoding)
+
+    def test_deferQuery(self):
+        """
+        The query of the queryset is sent to the task.
+        """
+        media = models.Video.objects.create(title='foo')
+        query = models.Video.objects.filter(title='foo').query
+
+        tasks.BulkMedia().run('cancel', models.Video,
+            pickle.loads(pickle.dumps(query)))
+
+        self.assertFalse(models.Video.objects.get(pk=media.pk).encoding)
+
+    def test_deferUnknown(self):
+        self.assertRaises(ValueError, bulk.defer, 'delete',
+            models.Video.objects.all())
+
+    def test_canceledStore(self):
+        """
+        The output file of a canceled media object is not stored.
+        """
+        media = models.Video.objects.create(title='foo')
+        models.MediaBase.objects.filter(pk=media.pk).update(encoding=False)
+        output_path = media.output_path(self.profile)
+        if not os.path.exists(os.path.dirname(output_path)):
+            os.makedirs(os.path.dirname(output_path))
+        with open(output_path, 'wb') as output_file:
+            output_file.write(b'foo')
+
+        tasks.StoreMedia().apply_async(args=[{'id': media.pk,
+            'profile': self.profile}])
+
+        self.assertEqual(media.output_files.count(), 0)
+        self.assertFalse(os.path.exists(output_path))
+
+
+class ReencodeCommandTestCase(CopyTestCase):
+    """
+    Tests for the ``encode_reencode`` management command.
+    """
+    def test_profile(self):
+        """
+        All media objects that use a profile are encoded again.
+        """
+        self.createMedia()
+        out = StringIO()
+
+        call_command('encode_reencode', profiles=['Copy'], stdout=out)
+
+        self.assertIn('1 media object(s) are being encoded', out.getvalue())
+
+    def test_dryRun(self):
+        media = self.createMedia()
+        out = StringIO()
+
+        call_command('encode_reencode', str(media.pk), dry_run=True, stdout=out)
+
+        self.assertIn('1 media object(s) selected.', out.getvalue())
+
+    def test_unknownProfile(self):
+        self.assertRaises(CommandError, call_command, 'encode_reencode',
+            profiles=['Unknown'])
+
+    def test_noSelection(self):
+        self.assertRaises(CommandError, call_command, 'encode_reencode')
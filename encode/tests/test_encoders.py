@@ -8,11 +8,14 @@ Tests for the :py:mod:`encode.encoders` module.
 
 from __future__ import unicode_literals
 
+import os
+
+from django.conf import settings
 from django.test import TestCase
 from django.core.exceptions import ImproperlyConfigured
 
-from encode import encoders, models, EncodeError
-from encode.tests.helpers import DummyDataMixin
+from encode import encoders, models, util, EncodeError, HLS, DASH
+from encode.tests.helpers import DummyDataMixin, FileTestCase, PNG_DATA
 
 
 class GetEncoderClassTestCase(TestCase):
@@ -51,6 +54,17 @@ class GetEncoderClassTestCase(TestCase):
             exception = ImproperlyConfigured
         self.assertRaises(exception, encoders.get_encoder_class, module_path)
 
+    def test_cached(self):
+        """
+        The class is only imported once.
+        """
+        klass = encoders.get_encoder_class('encode.encoders.BasicEncoder')
+
+        self.assertIs(encoders._encoder_classes[
+            'encode.encoders.BasicEncoder'], klass)
+        self.assertIs(encoders.get_encoder_class(
+            'encode.encoders.BasicEncoder'), klass)
+
 
 class BasicEncoderTestCase(TestCase, DummyDataMixin):
     """
@@ -110,6 +124,29 @@ class BasicEncoderTestCase(TestCase, DummyDataMixin):
             ['convert', '-loglevel', 'fatal', '-y'])
 
 
+class MultipleOutputsTestCase(FileTestCase):
+    """
+    Tests for encoders of profiles with multiple outputs.
+    """
+    def test_outputs(self):
+        """
+        The encoder writes its files to an output directory and returns their
+        locations.
+        """
+        enc = models.Encoder.objects.create(name="touch", path="touch")
+        profile = models.EncodingProfile.objects.create(name="Thumbnails",
+            container="jpg", encoder=enc, multiple_outputs=True,
+            command='{output}/b.jpg {output}/a.jpg')
+        output_path = os.path.join(settings.MEDIA_ROOT, 'thumbnails')
+
+        encoder = encoders.BasicEncoder(profile, 'in.mov', output_path)
+        encoder.start()
+
+        self.assertEqual(encoder.outputs(), [
+            os.path.join(output_path, 'a.jpg'),
+            os.path.join(output_path, 'b.jpg')])
+
+
 class FFMpegEncoderTestCase(TestCase, DummyDataMixin):
     """
     Tests for :py:class:`encode.encoders.FFMpegEncoder`.
@@ -161,3 +198,210 @@ class FFMpegEncoderTestCase(TestCase, DummyDataMixin):
         encoder = encoders.FFMpegEncoder(self.profile, __file__, 'bar')
 
         self.assertRaises(EncodeError, encoder.start)
+
+
+class LadderEncoderTestCase(TestCase):
+    """
+    Tests for :py:class:`encode.encoders.LadderEncoder`.
+    """
+    def setUp(self):
+        self.enc = models.Encoder.objects.create(name="ffmpeg",
+            path="ffmpeg", command="-loglevel fatal")
+
+        self.profile = models.EncodingProfile.objects.create(
+            name="HLS", container="m3u8", encoder=self.enc,
+            command="-preset veryfast", streaming_format=HLS,
+            segment_duration=4)
+        self.profile.renditions.create(name="360p", width=640, height=360,
+            video_bitrate=800, audio_bitrate=96)
+        self.profile.renditions.create(name="720p", width=1280, height=720,
+            video_bitrate=2800, audio_bitrate=128)
+
+    def test_encoderClass(self):
+        """
+        Streaming profiles are encoded with the ladder encoder.
+        """
+        self.assertEqual(self.profile.encoder_class,
+            'encode.encoders.LadderEncoder')
+        self.assertEqual(self.profile.playlist_name, 'master.m3u8')
+
+    def test_hls(self):
+        """
+        All renditions are encoded in one pass to HLS playlists and segments
+        in the output directory.
+        """
+        encoder = encoders.LadderEncoder(self.profile, 'in.mov', '/out')
+        arguments = encoder.arguments
+
+        self.assertEqual(arguments[:6],
+            ['ffmpeg', '-loglevel', 'fatal', '-y', '-i', 'in.mov'])
+        self.assertEqual(arguments.count('-i'), 1)
+        self.assertEqual(arguments[arguments.index('-filter_complex') + 1],
+            '[0:v]split=2[s0][s1];[s0]scale=1280:720[v0];'
+            '[s1]scale=640:360[v1]')
+        self.assertEqual(arguments[arguments.index('-b:v:0') + 1], '2800k')
+        self.assertEqual(arguments[arguments.index('-b:a:1') + 1], '96k')
+        self.assertEqual(arguments[arguments.index('-hls_time') + 1], '4')
+        self.assertEqual(arguments[arguments.index('-var_stream_map') + 1],
+            'v:0,a:0 v:1,a:1')
+        self.assertIn('-preset', arguments)
+        self.assertEqual(arguments[-1], '/out/v%v/index.m3u8')
+        self.assertIn("'[0:v]split=2", encoder.command)
+
+    def test_dash(self):
+        """
+        The DASH manifest is written to the output directory.
+        """
+        self.profile.streaming_format = DASH
+        self.profile.renditions.update(audio_bitrate=None)
+
+        encoder = encoders.LadderEncoder(self.profile, 'in.mov', '/out')
+        arguments = encoder.arguments
+
+        self.assertNotIn('0:a:0', arguments)
+        self.assertEqual(arguments[arguments.index('-adaptation_sets') + 1],
+            'id=0,streams=v')
+        self.assertEqual(arguments[-1], '/out/manifest.mpd')
+
+    def test_noRenditions(self):
+        """
+        An :py:class:`encode.EncodeError` is raised when the profile has no
+        renditions.
+        """
+        self.profile.renditions.all().delete()
+
+        encoder = encoders.LadderEncoder(self.profile, 'in.mov', '/out')
+
+        self.assertRaises(EncodeError, encoder.start)
+
+
+class PillowEncoderTestCase(FileTestCase):
+    """
+    Tests for :py:class:`encode.encoders.PillowEncoder`.
+    """
+    def setUp(self):
+        super(PillowEncoderTestCase, self).setUp()
+
+        self.enc = models.Encoder.objects.create(name="Pillow",
+            path="pillow", klass="encode.encoders.PillowEncoder")
+        self.small = models.EncodingProfile.objects.create(name="Small",
+            container="jpg", encoder=self.enc,
+            command='"{input}" -resize 12x12 -quality 80 "{output}"')
+        self.large = models.EncodingProfile.objects.create(name="Large",
+            container="png", encoder=self.enc,
+            command='"{input}" -resize 48x48! "{output}"')
+
+        os.makedirs(settings.MEDIA_ROOT)
+        self.input_path = os.path.join(settings.MEDIA_ROOT, 'input.png')
+        with open(self.input_path, 'wb') as image:
+            image.write(util.parseMedia(PNG_DATA))
+
+    def test_parse_options(self):
+        """
+        The ``convert`` resize and quality options are supported.
+        """
+        options = encoders.PillowEncoder.parse_options(self.small)
+
+        self.assertEqual(options, {'format': 'JPEG', 'width': 12,
+            'height': 12, 'mode': 'fit', 'quality': 80})
+
+    def test_unsupported(self):
+        """
+        An :py:class:`encode.EncodeError` is raised for other options.
+        """
+        self.small.command = '"{input}" -blur 2 "{output}"'
+
+        self.assertRaises(EncodeError, encoders.PillowEncoder.parse_options,
+            self.small)
+
+    def test_target_size(self):
+        """
+        The output size follows the ImageMagick geometry flags.
+        """
+        size = encoders.PillowEncoder.target_size
+
+        def options(mode, width, height):
+            return {'mode': mode, 'width': width, 'height': height}
+
+        self.assertEqual(size((24, 16), options('fit', 12, 12)), (12, 8))
+        self.assertEqual(size((24, 16), options('fill', 12, 12)), (18, 12))
+        self.assertEqual(size((24, 16), options('exact', 12, 12)), (12, 12))
+        self.assertEqual(size((24, 16), options('shrink', 48, 48)), (24, 16))
+        self.assertEqual(size((24, 16), options('fit', None, 8)), (12, 8))
+        self.assertEqual(size((24, 16), options(None, None, None)), (24, 16))
+
+    def test_variants(self):
+        """
+        The output of every variant is rendered from the same input.
+        """
+        from PIL import Image
+
+        small_path = os.path.join(settings.MEDIA_ROOT, 'small.jpg')
+        large_path = os.path.join(settings.MEDIA_ROOT, 'large.png')
+
+        encoder = encoders.PillowEncoder(self.small, self.input_path,
+            small_path, variants=[(self.large, large_path)])
+        encoder.start()
+
+        self.assertEqual(Image.open(small_path).size, (12, 8))
+        self.assertEqual(Image.open(small_path).format, 'JPEG')
+        self.assertEqual(Image.open(large_path).size, (48, 48))
+
+    def test_sameSize(self):
+        """
+        Variants of the input size don't share the save parameters of the
+        decoded image, e.g. their quality.
+        """
+        from PIL import Image
+
+        image = Image.new('RGB', (64, 64))
+        image.putdata([(x * 4, (x * y) % 256, y * 4) for y in range(64)
+                       for x in range(64)])
+        input_path = os.path.join(settings.MEDIA_ROOT, 'input.jpg')
+        image.save(input_path, 'JPEG', quality=95)
+
+        low, high = [models.EncodingProfile.objects.create(
+            name='Quality {}'.format(quality), container='jpg',
+            encoder=self.enc,
+            command='"{{input}}" -quality {} "{{output}}"'.format(quality))
+            for quality in (10, 90)]
+        low_path = os.path.join(settings.MEDIA_ROOT, 'low.jpg')
+        high_path = os.path.join(settings.MEDIA_ROOT, 'high.jpg')
+
+        decoded = Image.open(input_path)
+        decoded.load()
+        encoder = encoders.PillowEncoder(low, input_path, low_path,
+            variants=[(high, high_path)])
+        encoder.render(decoded, low, low_path)
+        encoder.render(decoded, high, high_path)
+
+        self.assertFalse(hasattr(decoded, 'encoderinfo'))
+        self.assertLess(os.path.getsize(low_path),
+            os.path.getsize(high_path))
+
+        encoder.start()
+
+        self.assertLess(os.path.getsize(low_path),
+            os.path.getsize(high_path))
+
+    def test_invalidInputfile(self):
+        """
+        An :py:class:`encode.EncodeError` is raised when the input is not an
+        image.
+        """
+        encoder = encoders.PillowEncoder(self.small, __file__, 'out.jpg')
+
+        self.assertRaises(EncodeError, encoder.start)
+
+    def test_oneJob(self):
+        """
+        The image profiles of a snapshot are encoded in one job.
+        """
+        snapshot = util.storeMedia(models.Snapshot, 'input_file', 'test.png',
+            ['Small', 'Large'], self.input_path)
+        snapshot = models.Snapshot.objects.get(pk=snapshot.pk)
+
+        self.assertEqual(snapshot.output_files.count(), 2)
+        self.assertEqual(models.EncodingJob.objects.filter(
+            media=snapshot).count(), 1)
+        self.assertTrue(snapshot.encoded)
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+# Copyright Collab 2016
+# See LICENSE for details.
+
+"""
+Tests for the :py:mod:`encode.health` and :py:mod:`encode.routing` modules.
+"""
+
+from __future__ import unicode_literals
+
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from encode import health, models, routing, HLS
+
+
+class FakeQueues(object):
+    """
+    The queues of a Celery worker.
+    """
+    def __init__(self):
+        self.selected = []
+
+    def select_add(self, queue):
+        self.selected.append(queue)
+
+
+class FakeWorker(object):
+    """
+    A starting Celery worker, as sent by the ``celeryd_after_setup`` signal.
+    """
+    def __init__(self):
+        self.queues = FakeQueues()
+        self.app = type(str('App'), (object,), {
+            'amqp': type(str('AMQP'), (object,), {'queues': self.queues})})
+
+
+class ProbeEncoderTestCase(TestCase):
+    """
+    Tests for :py:func:`encode.health.probe_encoder`.
+    """
+    def test_available(self):
+        encoder = models.Encoder.objects.create(name='Copy', path='cp')
+
+        result = health.probe_encoder(encoder)
+
+        self.assertTrue(result['available'])
+        self.assertTrue(result['executable'].endswith('cp'))
+        self.assertEqual(result['queue'], 'encoder.copy')
+        self.assertIsNone(result['error'])
+
+    def test_missingExecutable(self):
+        encoder = models.Encoder.objects.create(name='Missing',
+            path='/does/not/exist -y')
+
+        result = health.probe_encoder(encoder)
+
+        self.assertFalse(result['available'])
+        self.assertIn('/does/not/exist', result['error'])
+
+    def test_missingClass(self):
+        encoder = models.Encoder.objects.create(name='Broken', path='cp',
+            klass='does.not.Exist')
+
+        result = health.probe_encoder(encoder)
+
+        self.assertFalse(result['available'])
+        self.assertIn('does.not.Exist', result['error'])
+
+    def test_inProcess(self):
+        encoder = models.Encoder.objects.create(name='Pillow', path='pillow',
+            klass='encode.encoders.PillowEncoder')
+
+        result = health.probe_encoder(encoder)
+
+        self.assertTrue(result['available'])
+        self.assertIsNone(result['executable'])
+
+
+class EncoderQueuesTestCase(TestCase):
+    """
+    Tests for :py:func:`encode.health.add_encoder_queues` and
+    :py:mod:`encode.routing`.
+    """
+    def setUp(self):
+        self.available = models.Encoder.objects.create(name='Copy',
+            path='cp')
+        self.missing = models.Encoder.objects.create(name='Missing',
+            path='/does/not/exist')
+
+    @override_settings(ENCODE_QUEUE_PER_ENCODER=True,
+                       ENCODE_FFMPEG_PATH='/does/not/exist')
+    def test_addQueues(self):
+        """
+        The worker consumes the queues of the encoders it can run.
+        """
+        worker = FakeWorker()
+
+        health.add_encoder_queues(sender='worker@example', instance=worker)
+
+        self.assertEqual(worker.queues.selected, ['encoder.copy'])
+
+    @override_settings(ENCODE_QUEUE_PER_ENCODER=True,
+                       ENCODE_FFMPEG_PATH='cp')
+    def test_thumbnailsQueue(self):
+        """
+        A worker that can run the ffmpeg executable consumes the queue of
+        the thumbnail jobs.
+        """
+        worker = FakeWorker()
+
+        health.add_encoder_queues(sender='worker@example', instance=worker)
+
+        self.assertEqual(worker.queues.selected,
+            ['encoder.copy', 'encoder.thumbnails'])
+
+    def test_disabled(self):
+        worker = FakeWorker()
+
+        health.add_encoder_queues(sender='worker@example', instance=worker)
+
+        self.assertEqual(worker.queues.selected, [])
+
+    def test_encodeOptions(self):
+        profile = models.EncodingProfile(name='Copy', encoder=self.available)
+
+        self.assertEqual(routing.encode_options(profile), {
+            'queue': 'encoder', 'routing_key': 'media.encode'})
+
+        with self.settings(ENCODE_QUEUE_PER_ENCODER=True):
+            self.assertEqual(routing.encode_options(profile), {
+                'queue': 'encoder.copy', 'routing_key': 'encoder.copy'})
+
+
+class CapabilityRoutingTestCase(TestCase):
+    """
+    Routing of the encoding jobs to workers that advertise (fake)
+    capabilities.
+    """
+    def setUp(self):
+        self.ffmpeg = models.Encoder.objects.create(name='ffmpeg',
+            path='ffmpeg', klass='encode.encoders.BasicEncoder')
+        self.h264 = models.EncodingProfile.objects.create(name='MP4',
+            encoder=self.ffmpeg, container='mp4',
+            command='-i "{input}" -c:v libx264 -c:a aac "{output}"')
+        self.h265 = models.EncodingProfile.objects.create(name='HEVC',
+            encoder=self.ffmpeg, container='mp4',
+            command='-i "{input}" -c:v libx265 -c:a copy -threads 8 '
+                    '"{output}"')
+
+        # two workers with different ffmpeg builds
+        self.small = {'cores': 4, 'encoders': {
+            'ffmpeg': {'codecs': ['aac', 'libx264']}}}
+        self.large = {'cores': 16, 'thumbnails': True, 'encoders': {
+            'ffmpeg': {'codecs': ['aac', 'libx264', 'libx265']}}}
+
+    def test_requirements(self):
+        self.assertEqual(routing.profile_requirements(self.h265), {
+            'encoder': 'ffmpeg', 'codecs': ['libx265'], 'cores': 8})
+        self.assertEqual(routing.profile_queue(self.h264),
+            'encoder.ffmpeg.aac+libx264')
+        self.assertEqual(routing.profile_queue(self.h265),
+            'encoder.ffmpeg.libx265.t8')
+
+    def test_defaultOptions(self):
+        """
+        The codecs that an encoder class selects by default are required,
+        unless the command of the profile replaces them.
+        """
+        ladder = models.EncodingProfile(name='HLS', encoder=self.ffmpeg,
+            container='m3u8', streaming_format=HLS, command='-preset fast')
+        self.assertEqual(routing.profile_requirements(ladder)['codecs'],
+            ['aac', 'libx264'])
+
+        ladder.command = '-c:v libx265 -c:a copy'
+        self.assertEqual(routing.profile_requirements(ladder)['codecs'],
+            ['libx265'])
+
+    def test_workerQueues(self):
+        """
+        A worker only consumes the queues of the profiles it can run.
+        """
+        self.assertEqual(health.worker_queues(self.small),
+            ['encoder.ffmpeg.aac+libx264'])
+        self.assertEqual(health.worker_queues(self.large),
+            ['encoder.ffmpeg.aac+libx264', 'encoder.ffmpeg.libx265.t8'])
+        self.assertEqual(health.worker_queues({'cores': 2, 'encoders': {}}),
+            [])
+
+    def test_addQueues(self):
+        """
+        Workers consume the queues that match the capabilities they
+        advertise.
+        """
+        queues = {}
+        for name, capabilities in (('small', self.small),
+                                   ('large', self.large)):
+            worker = FakeWorker()
+            with self.settings(ENCODE_ROUTE_BY_CAPABILITIES=True,
+                               ENCODE_WORKER_CAPABILITIES=capabilities):
+                health.add_encoder_queues(sender=name, instance=worker)
+                self.assertEqual(health.encode_capabilities(None),
+                    capabilities)
+            queues[name] = worker.queues.selected
+
+        with self.settings(ENCODE_ROUTE_BY_CAPABILITIES=True):
+            queue = routing.encode_options(self.h265)['queue']
+
+        self.assertNotIn(queue, queues['small'])
+        self.assertIn(queue, queues['large'])
+
+        # only the large worker has ffmpeg for the thumbnails
+        self.assertNotIn('encoder.thumbnails', queues['small'])
+        self.assertIn('encoder.thumbnails', queues['large'])
+
+    def test_capabilities(self):
+        """
+        A worker advertises the encoders it can run and its cores.
+        """
+        models.Encoder.objects.create(name='Copy', path='cp')
+
+        capabilities = health.worker_capabilities()
+
+        self.assertIn('Copy', capabilities['encoders'])
+        self.assertGreaterEqual(capabilities['cores'], 1)
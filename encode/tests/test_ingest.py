@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+# Copyright Collab 2016
+# See LICENSE for details.
+
+"""
+Tests for the :py:mod:`encode.ingest` module and the ``encode_ingest``
+management command.
+"""
+
+from __future__ import unicode_literals
+
+import os
+import json
+import shutil
+import tempfile
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.utils.six import StringIO
+from django.test.utils import override_settings
+
+from encode import models, ingest, SNAPSHOT, VIDEO
+from encode.util import parseMedia
+from encode.tests.test_bulk import CopyTestCase
+from encode.tests.helpers import PNG_DATA
+
+
+class IngestTestCase(CopyTestCase):
+    """
+    Tests for :py:mod:`encode.ingest`.
+    """
+    def setUp(self):
+        CopyTestCase.setUp(self)
+
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+        os.makedirs(os.path.join(self.root, 'sub'))
+        for name in ('a.png', os.path.join('sub', 'b.PNG'), 'notes.txt'):
+            with open(os.path.join(self.root, name), 'wb') as media_file:
+                media_file.write(parseMedia(PNG_DATA))
+
+        self.manifest_path = os.path.join(self.root, 'manifest')
+
+    def test_findMedia(self):
+        """
+        `find_media` walks the tree and skips unknown extensions.
+        """
+        found = list(ingest.find_media(self.root))
+
+        self.assertEqual(found, [
+            (os.path.join(self.root, 'a.png'), SNAPSHOT),
+            (os.path.join(self.root, 'sub', 'b.PNG'), SNAPSHOT),
+        ])
+        self.assertEqual(list(ingest.find_media(self.root, ['mp4'])), [])
+
+    def test_getFileType(self):
+        self.assertEqual(ingest.get_file_type('clip.MP4'), VIDEO)
+        self.assertEqual(ingest.get_file_type('clip.mp4', ['webm']), None)
+        self.assertEqual(ingest.get_file_type('notes.txt'), None)
+
+    def test_ingest(self):
+        """
+        All media files are stored and encoded.
+        """
+        manifest = ingest.Manifest(self.manifest_path)
+
+        result = ingest.ingest(self.root, profiles=['Copy'],
+            manifest=manifest, workers=1)
+
+        self.assertEqual(result, {'ingested': 2, 'skipped': 0, 'failed': 0})
+        self.assertEqual(models.Snapshot.objects.count(), 2)
+        for media in models.Snapshot.objects.all():
+            self.assertTrue(media.encoded)
+            self.assertEqual(list(media.profiles.all()), [self.profile])
+
+        with open(self.manifest_path) as manifest_file:
+            entries = [json.loads(line) for line in manifest_file]
+        self.assertEqual(len(entries), 2)
+        self.assertEqual(entries[0]['status'], 'done')
+        self.assertEqual(entries[0]['path'], 'a.png')
+
+    def test_resume(self):
+        """
+        Files that are recorded in the manifest are skipped.
+        """
+        ingest.ingest(self.root, ['png'], ['Copy'],
+            ingest.Manifest(self.manifest_path), workers=1)
+
+        result = ingest.ingest(self.root, ['png'], ['Copy'],
+            ingest.Manifest(self.manifest_path), workers=1)
+
+        self.assertEqual(result, {'ingested': 0, 'skipped': 2, 'failed': 0})
+        self.assertEqual(models.Snapshot.objects.count(), 2)
+
+    def test_skipDuplicates(self):
+        """
+        Files with the same content are only ingested once.
+        """
+        result = ingest.ingest(self.root, profiles=['Copy'], workers=1,
+            skip_duplicates=True)
+
+        self.assertEqual(result, {'ingested': 1, 'skipped': 1, 'failed': 0})
+
+    def test_missingProfile(self):
+        """
+        Files are recorded as failed when their profiles do not exist.
+        """
+        manifest = ingest.Manifest(self.manifest_path)
+
+        result = ingest.ingest(self.root, profiles=['Unknown'],
+            manifest=manifest, workers=1)
+
+        self.assertEqual(result, {'ingested': 0, 'skipped': 0, 'failed': 2})
+        self.assertEqual(manifest.done, {})
+
+    @override_settings(ENCODE_IMAGE_PROFILES=[])
+    def test_noProfiles(self):
+        """
+        Files are recorded as failed when no profiles are configured for their
+        file type.
+        """
+        result = ingest.ingest(self.root, workers=1)
+
+        self.assertEqual(result, {'ingested': 0, 'skipped': 0, 'failed': 2})
+
+    def test_command(self):
+        out = StringIO()
+
+        call_command('encode_ingest', self.root, profiles=['Copy'],
+            workers=1, stdout=out)
+
+        self.assertIn('2 file(s) ingested, 0 file(s) skipped',
+            out.getvalue())
+        self.assertTrue(os.path.exists(
+            os.path.join(self.root, '.encode_ingest')))
+
+    def test_commandUnknownProfile(self):
+        self.assertRaises(CommandError, call_command, 'encode_ingest',
+            self.root, profiles=['Unknown'])
+
+    def test_commandMissingDirectory(self):
+        self.assertRaises(CommandError, call_command, 'encode_ingest',
+            os.path.join(self.root, 'missing'))
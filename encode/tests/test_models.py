@@ -7,10 +7,70 @@ Tests for the :py:mod:`encode.models` module.
 
 from __future__ import unicode_literals
 
+import os
+import shutil
+import hashlib
+
+from django.core.cache import cache
+from django.test import TransactionTestCase, override_settings
 from django.core.files.base import ContentFile
 
-from encode.models import Audio, Video, EncodingProfile
-from encode.tests.helpers import WEBM_DATA, FileTestCase
+from encode import HLS
+from encode.models import (Audio, Video, Encoder, EncodingProfile,
+    EncodingJob, MediaFile)
+from encode.conf import settings
+from encode.storage import QueuedEncodeSystemStorage
+from encode.util import parseMedia
+from encode.tests.helpers import WEBM_DATA, PNG_DATA, FileTestCase
+
+
+class MediaFileTestCase(FileTestCase):
+    """
+    Tests for the :py:class:`encode.models.MediaFile` model.
+    """
+    def test_describe(self):
+        """
+        The MIME type and dimensions of the file are filled in.
+        """
+        path = os.path.join(settings.MEDIA_ROOT, 'test.png')
+        os.makedirs(settings.MEDIA_ROOT)
+        with open(path, 'wb') as f:
+            f.write(parseMedia(PNG_DATA))
+
+        media_file = MediaFile(file='media/files/abc.png')
+        media_file.describe(path)
+
+        self.assertEqual(media_file.mime_type, 'image/png')
+        self.assertEqual((media_file.width, media_file.height), (24, 16))
+        self.assertIsNone(media_file.duration)
+
+    def test_describeWithoutProbe(self):
+        """
+        Only the MIME type is filled in when the file is not probed.
+        """
+        media_file = MediaFile(file='media/files/abc/index.m3u8')
+        media_file.describe('/fake/index.m3u8', probe=False)
+
+        self.assertEqual(media_file.mime_type,
+            'application/vnd.apple.mpegurl')
+        self.assertIsNone(media_file.width)
+
+    def test_urls(self):
+        """
+        The URLs of many media files are resolved with one query.
+        """
+        cache.clear()
+        first = MediaFile.objects.create(file='media/files/a.mp4')
+        second = MediaFile.objects.create(file='media/files/b.mp4')
+
+        with self.assertNumQueries(1):
+            urls = MediaFile.objects.urls(MediaFile.objects.all())
+
+        self.assertEqual(urls, {
+            first.pk: first.file.url,
+            second.pk: second.file.url,
+        })
+        self.assertEqual(first.url, first.file.url)
 
 
 class MediaBaseTestCase(FileTestCase):
@@ -42,3 +102,356 @@ class MediaBaseTestCase(FileTestCase):
 
         self.assertRaises(EncodingProfile.DoesNotExist, vfile.save,
             profiles=[18])
+
+    def test_encoding_jobs(self):
+        """
+        The encoding jobs ignore the result of the transfer they're linked to
+        and are linked to a job that stores the output.
+        """
+        profile = EncodingProfile.objects.create(name='Foo', container='mp3')
+        audio = Audio.objects.create(title='Foo')
+
+        jobs = audio.encoding_jobs([profile])
+
+        self.assertEqual(len(jobs), 1)
+        self.assertEqual(jobs[0].task, 'encode.tasks.EncodeMedia')
+        self.assertTrue(jobs[0].immutable)
+        self.assertEqual(jobs[0].args[1:], (audio.id, audio.input_path,
+            audio.output_path(profile)))
+        self.assertEqual(jobs[0].options['link'].task,
+            'encode.tasks.StoreMedia')
+
+    @override_settings(ENCODE_THUMBNAIL_POSITIONS=['10%'])
+    def test_thumbnails_job(self):
+        """
+        The thumbnails of videos are extracted after the transfer as well.
+        """
+        video = Video.objects.create(title='Foo')
+
+        jobs = video.encoding_jobs([])
+
+        self.assertEqual([job.task for job in jobs],
+            ['encode.tasks.ExtractThumbnails'])
+        self.assertTrue(jobs[0].immutable)
+
+    def test_transfer(self):
+        """
+        The input file is transferred by the first task of the chain.
+        """
+        title = 'test.webm'
+        vfile = Video.objects.create(title='Foo')
+        vfile.input_file.save(title, ContentFile(WEBM_DATA, title))
+
+        storage = QueuedEncodeSystemStorage()
+        self.assertTrue(storage.remote.exists(vfile.input_file.name))
+        self.assertTrue(storage.using_remote(vfile.input_file.name))
+
+
+class StreamingTestCase(FileTestCase):
+    """
+    Tests for the output of streaming :py:class:`encode.models.EncodingProfile`
+    models.
+    """
+    def setUp(self):
+        super(StreamingTestCase, self).setUp()
+
+        encoder = Encoder.objects.create(name='ffmpeg', path='ffmpeg')
+        self.profile = EncodingProfile.objects.create(name='HLS',
+            container='m3u8', encoder=encoder, streaming_format=HLS)
+        self.video = Video.objects.create(title='Foo')
+        self.video.profiles.add(self.profile)
+
+        # the output of the encoder
+        self.output_path = self.video.output_path(self.profile)
+        self.files = ['master.m3u8', 'v0/index.m3u8', 'v0/segment00000.ts',
+                      'v1/index.m3u8', 'v1/segment00000.ts']
+        for name in self.files:
+            path = os.path.join(self.output_path, *name.split('/'))
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'wb') as output:
+                output.write(b'data')
+
+    def test_output_path(self):
+        """
+        The output of a streaming profile is a directory.
+        """
+        self.assertTrue(self.output_path.endswith(
+            os.path.join('video', '{}-hls'.format(self.video.id))))
+
+    def test_store_file(self):
+        """
+        The playlists and segments are stored with their relative paths below
+        one directory and the media is ready once.
+        """
+        self.video.store_file(self.profile)
+
+        output_files = self.video.output_files.all()
+        prefix = os.path.commonprefix([media_file.file.name
+                                       for media_file in output_files])
+
+        self.assertEqual(output_files.count(), len(self.files))
+        self.assertEqual(sorted(media_file.file.name[len(prefix):]
+                                for media_file in output_files),
+            sorted(self.files))
+        self.assertTrue(all(media_file.profile == self.profile
+                            for media_file in output_files))
+        self.assertTrue(self.video.playlist(self.profile).file.name.endswith(
+            '/master.m3u8'))
+        self.assertTrue(self.video.ready)
+        self.assertTrue(self.video.encoded)
+
+    def test_remove_file(self):
+        """
+        The output directory is removed.
+        """
+        self.video.remove_file(self.profile)
+
+        self.assertFalse(os.path.exists(self.output_path))
+
+
+class MultipleOutputsTestCase(FileTestCase):
+    """
+    Tests for the output of :py:class:`encode.models.EncodingProfile` models
+    with multiple outputs.
+    """
+    def test_store_file(self):
+        """
+        All files in the manifest of the encoder are stored and linked to the
+        media.
+        """
+        profile = EncodingProfile.objects.create(name='Thumbnails',
+            container='jpg', multiple_outputs=True)
+        audio = Audio.objects.create(title='Foo')
+        audio.profiles.add(profile)
+
+        output_path = audio.output_path(profile)
+        os.makedirs(output_path)
+        outputs = []
+        for name in ['thumb001.jpg', 'thumb002.jpg', 'thumb003.jpg']:
+            outputs.append(os.path.join(output_path, name))
+            with open(outputs[-1], 'wb') as output:
+                output.write(b'data')
+
+        with self.assertNumQueries(8):
+            audio.store_file(profile, outputs[:2])
+
+        names = sorted(media_file.file.name.rsplit('/', 1)[-1]
+                       for media_file in audio.output_files.all())
+
+        self.assertTrue(output_path.endswith('{}-jpg'.format(audio.id)))
+        self.assertEqual(names, ['thumb001.jpg', 'thumb002.jpg'])
+        self.assertTrue(audio.encoded)
+
+
+class StoreFileRetryTestCase(FileTestCase):
+    """
+    Tests for storing the output of a job again with
+    :py:meth:`encode.models.MediaBase.store_file`.
+    """
+    def setUp(self):
+        super(StoreFileRetryTestCase, self).setUp()
+
+        self.profile = EncodingProfile.objects.create(name='MP3',
+            container='mp3')
+        self.audio = Audio.objects.create(title='Foo', keep_input_file=True)
+        self.audio.profiles.add(self.profile)
+
+        self.output = self.audio.output_path(self.profile)
+        os.makedirs(os.path.dirname(self.output))
+        with open(self.output, 'wb') as output:
+            output.write(b'data')
+
+    def storedFiles(self):
+        media_file = self.audio.output_files.get()
+        return os.listdir(os.path.dirname(media_file.file.path))
+
+    def test_stored(self):
+        """
+        The files that were stored before are reused.
+        """
+        self.audio.store_file(self.profile, [self.output], job='abc')
+        media_file = self.audio.output_files.get()
+
+        self.audio.store_file(self.profile, [self.output], job='abc')
+
+        self.assertEqual(list(self.audio.output_files.all()), [media_file])
+        self.assertEqual(MediaFile.objects.count(), 1)
+
+    def test_uploaded(self):
+        """
+        Files that were uploaded by an attempt that failed before their
+        :py:class:`~encode.models.MediaFile` was saved, are not uploaded
+        again.
+        """
+        self.audio.store_file(self.profile, [self.output], job='abc')
+        name = self.audio.output_files.get().file.name
+        MediaFile.objects.all().delete()
+
+        self.audio.store_file(self.profile, [self.output], job='abc')
+
+        media_file = self.audio.output_files.get()
+        self.assertEqual(media_file.file.name, name)
+        self.assertEqual(self.storedFiles(), [os.path.basename(name)])
+        self.assertEqual(media_file.sha256, hashlib.sha256(
+            b'data').hexdigest())
+        self.assertEqual(media_file.size, 4)
+
+    def test_variants(self):
+        """
+        The files of several profiles are stored, and reused, at once.
+        """
+        ogg = EncodingProfile.objects.create(name='Ogg', container='oga')
+        self.audio.profiles.add(ogg)
+        output = self.audio.output_path(ogg)
+        with open(output, 'wb') as f:
+            f.write(b'other data')
+        outputs = [(self.profile, [self.output]), (ogg, [output])]
+
+        media_files = self.audio.store_files(outputs, job='abc')
+        stored = self.audio.store_files(outputs, job='abc')
+
+        self.assertEqual(sorted(media_file.pk for media_file in stored),
+            sorted(media_file.pk for media_file in media_files))
+        self.assertEqual(MediaFile.objects.count(), 2)
+        self.assertTrue(Audio.objects.get(pk=self.audio.pk).encoded)
+
+    def test_otherJob(self):
+        """
+        The output of another job is stored with other names.
+        """
+        self.audio.store_file(self.profile, [self.output], job='abc')
+        self.audio.store_file(self.profile, [self.output], job='def')
+
+        self.assertEqual(MediaFile.objects.count(), 2)
+
+
+@override_settings(ENCODE_CONTENT_ADDRESSED_STORAGE=True)
+class ContentAddressedTestCase(TransactionTestCase):
+    """
+    Tests for storing output files under the hash of their content.
+    """
+    def setUp(self):
+        self.profile = EncodingProfile.objects.create(name='MP3',
+            container='mp3')
+
+    def tearDown(self):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+
+    def storeAudio(self, title, data=b'data'):
+        audio = Audio.objects.create(title=title, keep_input_file=True)
+        audio.profiles.add(self.profile)
+
+        output = audio.output_path(self.profile)
+        if not os.path.isdir(os.path.dirname(output)):
+            os.makedirs(os.path.dirname(output))
+        with open(output, 'wb') as f:
+            f.write(data)
+        audio.store_file(self.profile, [output])
+
+        return audio
+
+    def test_name(self):
+        """
+        The file is named after the hash of its content, in sharded
+        directories.
+        """
+        audio = self.storeAudio('Foo')
+        digest = hashlib.sha256(b'data').hexdigest()
+        media_file = audio.output_files.get()
+
+        self.assertTrue(media_file.file.name.endswith(
+            '/{}/{}/{}.mp3'.format(digest[:2], digest[2:4], digest)))
+        self.assertEqual(media_file.sha256, digest)
+        self.assertEqual(media_file.md5, hashlib.md5(b'data').hexdigest())
+        self.assertEqual(media_file.size, 4)
+
+    def test_shared(self):
+        """
+        Identical outputs are stored once, and shared by the media objects.
+        """
+        first = self.storeAudio('Foo')
+        second = self.storeAudio('Bar')
+        other = self.storeAudio('Baz', b'other data')
+
+        media_file = first.output_files.get()
+        self.assertEqual(list(second.output_files.all()), [media_file])
+        self.assertNotEqual(other.output_files.get(), media_file)
+        self.assertEqual(MediaFile.objects.count(), 2)
+        self.assertEqual(len(os.listdir(os.path.dirname(
+            media_file.file.path))), 1)
+
+    def test_profiles(self):
+        """
+        Profiles that produce the same content have a media file of their
+        own for the shared file.
+        """
+        other = EncodingProfile.objects.create(name='Other MP3',
+            container='mp3')
+        audio = Audio.objects.create(title='Foo', keep_input_file=True)
+        audio.profiles.add(self.profile, other)
+        for profile in (self.profile, other):
+            output = audio.output_path(profile)
+            if not os.path.isdir(os.path.dirname(output)):
+                os.makedirs(os.path.dirname(output))
+            with open(output, 'wb') as f:
+                f.write(b'data')
+            audio.store_file(profile, [output])
+
+        media_files = list(audio.output_files.order_by('pk'))
+        self.assertEqual([media_file.profile for media_file in media_files],
+            [self.profile, other])
+        self.assertEqual(media_files[0].file.name, media_files[1].file.name)
+        self.assertEqual(media_files[1].sha256,
+            hashlib.sha256(b'data').hexdigest())
+        self.assertTrue(Audio.objects.get(pk=audio.pk).encoded)
+
+    def test_delete(self):
+        """
+        A stored file is deleted with the last media object that refers to
+        it.
+        """
+        first = self.storeAudio('Foo')
+        second = self.storeAudio('Bar')
+        path = first.output_files.get().file.path
+
+        first.delete()
+
+        self.assertEqual(MediaFile.objects.count(), 1)
+        self.assertTrue(os.path.exists(path))
+
+        second.delete()
+
+        self.assertFalse(MediaFile.objects.exists())
+        self.assertFalse(os.path.exists(path))
+
+
+class EncodingJobTestCase(FileTestCase):
+    """
+    Tests for the :py:class:`encode.models.EncodingJob` model.
+    """
+    def test_summary(self):
+        """
+        `summary` aggregates the resource usage per encoding profile.
+        """
+        mp3 = EncodingProfile.objects.create(name='MP3', container='mp3')
+        ogg = EncodingProfile.objects.create(name='Ogg', container='oga')
+        afile = Audio.objects.create(title='Foo')
+
+        EncodingJob.objects.create(media=afile, profile=mp3, wall_time=2,
+            user_time=1, max_rss=100)
+        EncodingJob.objects.create(media=afile, profile=mp3, wall_time=4,
+            user_time=3, max_rss=300)
+        EncodingJob.objects.create(media=afile, profile=ogg, wall_time=1,
+            user_time=1, max_rss=50)
+
+        summary = list(EncodingJob.objects.summary())
+
+        self.assertEqual(len(summary), 2)
+        self.assertEqual(summary[0]['profile__name'], 'MP3')
+        self.assertEqual(summary[0]['jobs'], 2)
+        self.assertEqual(summary[0]['total_wall_time'], 6)
+        self.assertEqual(summary[0]['avg_user_time'], 2)
+        self.assertEqual(summary[0]['peak_rss'], 300)
+        self.assertEqual(summary[1]['profile__name'], 'Ogg')
+        self.assertEqual(summary[1]['jobs'], 1)
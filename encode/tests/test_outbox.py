@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+# Copyright Collab 2016
+# See LICENSE for details.
+
+"""
+Tests for the :py:mod:`encode.outbox` module and the ``encode_dispatch``
+management command.
+"""
+
+from __future__ import unicode_literals
+
+import shutil
+from datetime import timedelta
+
+from django.utils import timezone
+from django.utils.six import StringIO
+from django.core.management import call_command
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.test import TransactionTestCase, override_settings
+
+from encode import models
+from encode.conf import settings
+from encode.util import parseMedia
+from encode import EncodeError
+from encode.outbox import OutboxBatch, current_batch, dispatch_outbox
+from encode.tests.helpers import PNG_DATA
+
+
+@override_settings(ENCODE_DISPATCH_ON_COMMIT=True)
+class OutboxTestCase(TransactionTestCase):
+    """
+    Tests for :py:mod:`encode.outbox`.
+    """
+    def setUp(self):
+        encoder = models.Encoder.objects.create(name='cp', path='cp')
+        self.profile = models.EncodingProfile.objects.create(name='Copy',
+            encoder=encoder, container='png', command='"{input}" "{output}"')
+
+    def tearDown(self):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+
+    def createMedia(self, title='test.png'):
+        """
+        Create a snapshot and enqueue its encoding job.
+        """
+        media = models.Snapshot.objects.create(title=title)
+        media.profiles.add(self.profile)
+        media.input_file.save(title, ContentFile(parseMedia(PNG_DATA)),
+            save=False)
+        media.save(profiles=[self.profile.pk])
+
+        return media
+
+    def countBatches(self):
+        """
+        Count the batches that are sent to the broker.
+        """
+        sent = []
+        send = OutboxBatch.__call__
+
+        def count(batch):
+            if not batch.sent:
+                sent.append(batch)
+            send(batch)
+
+        OutboxBatch.__call__ = count
+        self.addCleanup(setattr, OutboxBatch, '__call__', send)
+
+        return sent
+
+    def test_dispatchOnCommit(self):
+        """
+        The jobs are recorded in the outbox and sent after the commit.
+        """
+        with transaction.atomic():
+            media = self.createMedia()
+
+            job = models.OutboxJob.objects.get()
+            self.assertEqual(job.media_id, media.pk)
+            self.assertEqual(job.get_profiles(), [self.profile.pk])
+            self.assertTrue(job.transfer)
+            self.assertEqual(media.output_files.count(), 0)
+
+        self.assertFalse(models.OutboxJob.objects.exists())
+        media = models.Snapshot.objects.get(pk=media.pk)
+        self.assertTrue(media.encoded)
+        self.assertEqual(media.output_files.count(), 1)
+
+    def test_batch(self):
+        """
+        The jobs of a transaction are sent in one batch.
+        """
+        sent = self.countBatches()
+        with transaction.atomic():
+            first = self.createMedia('first.png')
+            with transaction.atomic():
+                second = self.createMedia('second.png')
+
+            self.assertEqual(len(current_batch().ids), 2)
+
+        self.assertEqual(len(sent), 1)
+        self.assertIsNone(current_batch())
+        for media in (first, second):
+            self.assertTrue(models.Snapshot.objects.get(pk=media.pk).encoded)
+
+    def test_savepointBatch(self):
+        """
+        The rows of the outer transaction are sent when the savepoint that
+        started the batch rolls back.
+        """
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    self.createMedia('first.png')
+                    raise ValueError
+            except ValueError:
+                pass
+
+            media = self.createMedia('second.png')
+
+        self.assertTrue(models.Snapshot.objects.get(pk=media.pk).encoded)
+
+    def test_rollback(self):
+        """
+        Nothing is sent when the transaction is rolled back, the jobs of the
+        next transaction are sent.
+        """
+        try:
+            with transaction.atomic():
+                self.createMedia()
+                raise ValueError
+        except ValueError:
+            pass
+
+        self.assertFalse(models.OutboxJob.objects.exists())
+        self.assertFalse(models.MediaFile.objects.exists())
+
+        with transaction.atomic():
+            media = self.createMedia()
+
+        self.assertTrue(models.Snapshot.objects.get(pk=media.pk).encoded)
+
+    def test_command(self):
+        """
+        The ``encode_dispatch`` command sends the jobs that were left in the
+        outbox.
+        """
+        media = models.Snapshot.objects.create(title='test.png')
+        media.input_file.save('test.png', ContentFile(parseMedia(PNG_DATA)),
+            save=False)
+        models.Snapshot.objects.filter(pk=media.pk).update(
+            input_file=media.input_file.name)
+        models.OutboxJob.objects.create(media=media,
+            profiles='[{}]'.format(self.profile.pk))
+        models.OutboxJob.objects.update(
+            created_at=timezone.now() - timedelta(minutes=5))
+
+        out = StringIO()
+        call_command('encode_dispatch', stdout=out)
+
+        self.assertIn('1 media object(s)', out.getvalue())
+        self.assertFalse(models.OutboxJob.objects.exists())
+        self.assertEqual(models.Snapshot.objects.get(
+            pk=media.pk).output_files.count(), 1)
+
+    def test_dispatchError(self):
+        """
+        The row of a job that cannot be started stays in the outbox, the
+        jobs of the other rows are started.
+        """
+        broken = models.EncodingProfile.objects.create(name='Broken',
+            encoder=models.Encoder.objects.create(name='broken',
+                path='/fake/path/broken'),
+            container='png', command='"{input}" "{output}"')
+
+        rows = []
+        for title, profile in (('broken.png', broken),
+                               ('test.png', self.profile)):
+            media = models.Snapshot.objects.create(title=title)
+            media.input_file.save(title, ContentFile(parseMedia(PNG_DATA)),
+                save=False)
+            models.Snapshot.objects.filter(pk=media.pk).update(
+                input_file=media.input_file.name)
+            rows.append(models.OutboxJob.objects.create(media=media,
+                profiles='[{}]'.format(profile.pk)))
+
+        self.assertRaises(EncodeError, dispatch_outbox)
+
+        self.assertEqual(list(models.OutboxJob.objects.all()), rows[:1])
+        self.assertEqual(models.Snapshot.objects.get(
+            pk=rows[1].media_id).output_files.count(), 1)
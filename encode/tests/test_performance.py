@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+# Copyright Collab 2016
+# See LICENSE for details.
+
+"""
+Query-count and memory allocation regression tests for the hot paths of the
+:py:mod:`encode` application.
+
+Every path is measured with 1, 10 and 100 encoding profiles or output files.
+The budgets are linear in the number of profiles or output files, so a change
+that adds a query or a large allocation per item makes these tests fail.
+"""
+
+from __future__ import unicode_literals
+
+import os
+import tempfile
+
+from django.db import connection
+from django.core.files.base import ContentFile
+from django.test.utils import CaptureQueriesContext
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+from encode import models
+from encode.util import parseMedia, storeMedia
+from encode.widgets import MediaDisplayWidget
+from encode.tests.helpers import PNG_DATA, FileTestCase
+
+
+#: Number of encoding profiles or output files for each measurement.
+SIZES = (1, 10, 100)
+
+#: Maximum number of queries for each path: ``(base, per item)``. The per
+#: item costs are the measured costs, headroom is only kept in the base, so
+#: one more query per item exceeds the budget.
+QUERY_BUDGETS = {
+    'storeMedia': (15, 23),
+    'save': (10, 20),
+    'store_file': (16, 0),
+    'remove_file': (12, 0),
+    'render': (2, 0),
+}
+
+#: Maximum traced memory peak in bytes for each path: ``(base, per item)``.
+ALLOCATION_BUDGETS = {
+    'storeMedia': (1024 * 1024, 16 * 1024),
+    'save': (1024 * 1024, 16 * 1024),
+    'store_file': (512 * 1024, 0),
+    'remove_file': (512 * 1024, 0),
+    'render': (64 * 1024, 2 * 1024),
+}
+
+
+def budget(budgets, path, size):
+    base, per_item = budgets[path]
+    return base + per_item * size
+
+
+class PerformanceTestCase(FileTestCase):
+    """
+    Measures the number of queries and the memory peak of a function call.
+    """
+    def setUp(self):
+        FileTestCase.setUp(self)
+
+        # copying the input is the cheapest possible encoder
+        self.encoder = models.Encoder.objects.create(name='cp', path='cp',
+            klass='encode.encoders.BasicEncoder')
+
+    def createProfiles(self, count):
+        """
+        Create ``count`` profiles that each produce a distinct output file.
+        """
+        return [models.EncodingProfile.objects.create(
+            name='Profile {}'.format(index),
+            encoder=self.encoder,
+            container='c{}'.format(index),
+            command='"{input}" "{output}"'
+        ) for index in range(count)]
+
+    def createOutputFiles(self, count):
+        """
+        Create ``count`` output files.
+        """
+        return [models.MediaFile.objects.create(
+            title='output{}.png'.format(index),
+            file='output{}.png'.format(index)
+        ) for index in range(count)]
+
+    def assertBudget(self, path, size, func, setup):
+        """
+        Call ``func`` once while counting queries and once while tracing
+        memory allocations, and compare the results to the budgets of
+        ``path``. ``setup`` is called before each call and returns fresh
+        arguments for ``func``.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            func(*setup())
+
+        max_queries = budget(QUERY_BUDGETS, path, size)
+        self.assertLessEqual(len(queries), max_queries,
+            "{} with {} items executed {} queries (budget: {}):\n{}".format(
+                path, size, len(queries), max_queries,
+                "\n".join(query['sql'] for query in queries.captured_queries)))
+
+        if size == max(SIZES):
+            # the budget catches a regression of one query per item
+            self.assertGreater(len(queries) + size, max_queries,
+                "The query budget of {} is too loose: {} queries with {} "
+                "items, budget: {}".format(path, len(queries), size,
+                    max_queries))
+
+        if tracemalloc is None:
+            return
+
+        func_args = setup()
+        tracemalloc.start()
+        try:
+            func(*func_args)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        max_peak = budget(ALLOCATION_BUDGETS, path, size)
+        self.assertLessEqual(peak, max_peak,
+            "{} with {} items allocated {} bytes (budget: {})".format(
+                path, size, peak, max_peak))
+
+
+class StoreMediaTestCase(PerformanceTestCase):
+    """
+    Budgets for :py:func:`encode.util.storeMedia`.
+    """
+    def test_profiles(self):
+        fd, fpath = tempfile.mkstemp(suffix='.png')
+        with os.fdopen(fd, 'wb') as input_file:
+            input_file.write(parseMedia(PNG_DATA))
+
+        try:
+            for size in SIZES:
+                names = [profile.name for profile in self.createProfiles(size)]
+                self.assertBudget('storeMedia', size, storeMedia,
+                    setup=lambda: (models.Snapshot, self.inputFileField,
+                        'test.png', names, fpath))
+                models.EncodingProfile.objects.all().delete()
+        finally:
+            os.remove(fpath)
+
+
+class SaveTestCase(PerformanceTestCase):
+    """
+    Budgets for :py:meth:`encode.models.MediaBase.save`.
+    """
+    def setupMedia(self, profiles):
+        media = models.Snapshot.objects.create(title='test.png')
+        media.profiles.add(*profiles)
+        media.input_file.save('test.png', ContentFile(parseMedia(PNG_DATA)),
+            save=False)
+        return media
+
+    def test_profiles(self):
+        for size in SIZES:
+            profiles = self.createProfiles(size)
+            pks = [profile.pk for profile in profiles]
+
+            self.assertBudget('save', size,
+                lambda media: media.save(profiles=pks),
+                setup=lambda: (self.setupMedia(profiles),))
+            models.EncodingProfile.objects.all().delete()
+
+
+class StoreFileTestCase(PerformanceTestCase):
+    """
+    Budgets for :py:meth:`encode.models.MediaBase.store_file` and
+    :py:meth:`encode.models.MediaBase.remove_file`.
+    """
+    def setupMedia(self, profiles, outputs):
+        """
+        Create a media object that has been encoded with all ``profiles``
+        except the last one, and the local output file of the last profile.
+        """
+        media = models.Snapshot.objects.create(title='test.png',
+            keep_input_file=True)
+        media.profiles.add(*profiles)
+        media.output_files.add(*outputs)
+
+        output_path = media.output_path(profiles[-1])
+        if not os.path.exists(os.path.dirname(output_path)):
+            os.makedirs(os.path.dirname(output_path))
+        with open(output_path, 'wb') as output_file:
+            output_file.write(parseMedia(PNG_DATA))
+
+        return media, profiles[-1]
+
+    def test_store_file(self):
+        for size in SIZES:
+            profiles = self.createProfiles(size + 1)
+            outputs = self.createOutputFiles(size)
+
+            self.assertBudget('store_file', size,
+                lambda media, profile: media.store_file(profile),
+                setup=lambda: self.setupMedia(profiles, outputs))
+            models.EncodingProfile.objects.all().delete()
+
+    def test_remove_file(self):
+        for size in SIZES:
+            profiles = self.createProfiles(size)
+            outputs = self.createOutputFiles(size)
+
+            self.assertBudget('remove_file', size,
+                lambda media, profile: media.remove_file(profile),
+                setup=lambda: self.setupMedia(profiles, outputs))
+            models.EncodingProfile.objects.all().delete()
+
+
+class RenderTestCase(PerformanceTestCase):
+    """
+    Budgets for :py:meth:`encode.widgets.MediaDisplayWidget.render`.
+    """
+    def test_outputs(self):
+        for size in SIZES:
+            outputs = self.createOutputFiles(size)
+            widget = MediaDisplayWidget(
+                choices=[(output.pk, output.title) for output in outputs])
+            value = [output.pk for output in outputs]
+
+            self.assertBudget('render', size,
+                lambda: widget.render('output_files', value),
+                setup=lambda: ())
+            models.MediaFile.objects.all().delete()
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+# Copyright Collab 2016
+# See LICENSE for details.
+
+"""
+Tests for the :py:mod:`encode.pool` module.
+"""
+
+from __future__ import unicode_literals
+
+import threading
+
+from django.test import TestCase
+from django.core.files.base import ContentFile
+from django.core.files.storage import Storage
+from django.utils.six.moves import http_client, socketserver
+from django.utils.six.moves.BaseHTTPServer import BaseHTTPRequestHandler
+
+from encode import pool
+from encode.util import run_threads
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Stores the files of :py:class:`HTTPStorage` in memory, and keeps the
+    connections alive.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def respond(self, status, body=b''):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_PUT(self):
+        size = int(self.headers['Content-Length'])
+        self.server.files[self.path] = self.rfile.read(size)
+        self.respond(201)
+
+    def do_HEAD(self):
+        self.send_response(200 if self.path in self.server.files else 404)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """
+    A local stand-in for the HTTP API of a remote storage service.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        socketserver.TCPServer.__init__(self, ('127.0.0.1', 0),
+            StandInHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.files = {}
+
+
+class HTTPStorage(Storage):
+    """
+    Storage that keeps one connection to an HTTP server alive.
+    """
+    def __init__(self, port):
+        self.connection = http_client.HTTPConnection('127.0.0.1', port)
+
+    def request(self, method, name, body=None):
+        self.connection.request(method, '/' + name, body)
+        response = self.connection.getresponse()
+        response.read()
+        return response.status
+
+    def _save(self, name, content):
+        self.request('PUT', name, content.read())
+        return name
+
+    def exists(self, name):
+        return self.request('HEAD', name) == 200
+
+    def close(self):
+        self.connection.close()
+
+
+class StoragePoolTestCase(TestCase):
+    """
+    Tests for :py:class:`encode.pool.StoragePool`.
+    """
+    def setUp(self):
+        self.server = StandInServer()
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        self.pool = pool.storage_pool('encode.tests.test_pool.HTTPStorage',
+            {'port': self.server.server_address[1]})
+
+    def tearDown(self):
+        pool.close_pools()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def save(self, name):
+        with self.pool.acquire() as storage:
+            return storage.save(name, ContentFile(b'data'))
+
+    def test_keepAlive(self):
+        """
+        The client and its connection are reused.
+        """
+        for index in range(5):
+            self.save('file{}.txt'.format(index))
+
+        self.assertEqual(self.pool.created, 1)
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(len(self.server.files), 5)
+
+    def test_bounded(self):
+        """
+        No more clients than the size of the pool are used at the same time.
+        """
+        names = ['file{}.txt'.format(index) for index in range(20)]
+
+        run_threads(self.save, names, 8)
+
+        self.assertLessEqual(self.pool.created, self.pool.size)
+        self.assertLessEqual(self.server.connections, self.pool.size)
+        self.assertEqual(len(self.server.files), 20)
+
+    def test_discardOnError(self):
+        """
+        A client that raised an error is closed and replaced.
+        """
+        with self.assertRaises(ValueError):
+            with self.pool.acquire() as storage:
+                raise ValueError
+
+        self.save('foo.txt')
+
+        self.assertEqual(self.pool.created, 2)
+
+    def test_healthCheck(self):
+        """
+        A client that was idle too long is checked, and replaced when the
+        check fails.
+        """
+        self.pool.check_interval = 0
+        self.save('foo.txt')
+        with self.pool.acquire() as storage:
+            self.assertTrue(storage.exists('foo.txt'))
+        self.assertEqual(self.pool.created, 1)
+
+        def broken(name):
+            raise http_client.HTTPException('The read operation timed out')
+        storage.exists = broken
+
+        self.save('bar.txt')
+
+        self.assertEqual(self.pool.created, 2)
+
+    def test_reset_pools(self):
+        """
+        A forked worker process does not share the pools of its parent.
+        """
+        self.assertIs(pool.storage_pool('encode.tests.test_pool.HTTPStorage',
+            {'port': self.server.server_address[1]}), self.pool)
+
+        pool.reset_pools()
+
+        self.assertIsNot(pool.storage_pool(
+            'encode.tests.test_pool.HTTPStorage',
+            {'port': self.server.server_address[1]}), self.pool)
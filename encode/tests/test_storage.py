@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+# Copyright Collab 2016
+# See LICENSE for details.
+
+"""
+Tests for the :py:mod:`encode.storage` module.
+"""
+
+from __future__ import unicode_literals
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils.functional import empty
+from django.core.files.storage import FileSystemStorage
+
+from encode.conf import settings
+from encode.storage import (CDNStorage, InputStorage,
+    QueuedEncodeSystemStorage, url_cache_timeout, cached_urls,
+    invalidate_urls)
+
+
+class LazyStorageTestCase(TestCase):
+    """
+    Tests for :py:class:`encode.storage.LazyStorage`.
+    """
+    def test_cdnStorage(self):
+        """
+        The storage is created when it's first used.
+        """
+        storage = CDNStorage()
+
+        self.assertTrue(storage)
+        self.assertIs(storage._wrapped, empty)
+
+        self.assertFalse(storage.exists('missing.png'))
+        self.assertIsInstance(storage._wrapped, FileSystemStorage)
+
+    def test_inputStorage(self):
+        storage = InputStorage()
+
+        self.assertIsInstance(storage, QueuedEncodeSystemStorage)
+        self.assertIsNot(storage._wrapped, empty)
+
+
+class QueuedEncodeSystemStorageTestCase(TestCase):
+    """
+    Tests for :py:class:`encode.storage.QueuedEncodeSystemStorage`.
+    """
+    def test_shared(self):
+        """
+        The storages are shared when they have the same backend and options.
+        """
+        storage = QueuedEncodeSystemStorage()
+        self.assertFalse(storage.shared)
+        self.assertEqual(storage.task.name, 'encode.transfer.TransferInput')
+
+        storage = QueuedEncodeSystemStorage(
+            remote_options=settings.ENCODE_LOCAL_STORAGE_OPTIONS)
+        self.assertTrue(storage.shared)
+
+    def test_transfer_task(self):
+        """
+        The transfer task is returned instead of started.
+        """
+        storage = QueuedEncodeSystemStorage()
+
+        task = storage.transfer_task('foo.mov')
+
+        self.assertEqual(task.task, 'encode.transfer.TransferInput')
+        self.assertEqual(task.args[:2], ('foo.mov',
+            storage.get_cache_key('foo.mov')))
+        self.assertEqual(task.options['queue'], settings.ENCODE_JOB_QUEUE)
+
+
+class SigningStorage(FileSystemStorage):
+    """
+    Storage with signed URLs that counts the URLs it signed.
+    """
+    querystring_auth = True
+    querystring_expire = 600
+
+    def __init__(self, *args, **kwargs):
+        super(SigningStorage, self).__init__(*args, **kwargs)
+        self.signed = 0
+
+    def url(self, name):
+        self.signed += 1
+        return '/{}?signature={}'.format(name, self.signed)
+
+
+class CachedURLsTestCase(TestCase):
+    """
+    Tests for :py:func:`encode.storage.cached_urls`.
+    """
+    def setUp(self):
+        self.storage = SigningStorage()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_cached(self):
+        """
+        Only the URLs that are not cached are asked from the storage.
+        """
+        urls = cached_urls(self.storage, ['a.mp4', 'b.mp4'])
+        self.assertEqual(self.storage.signed, 2)
+
+        self.assertEqual(cached_urls(self.storage, ['a.mp4', 'b.mp4',
+            'c.mp4']), dict(urls, **{'c.mp4': '/c.mp4?signature=3'}))
+        self.assertEqual(self.storage.signed, 3)
+
+    def test_invalidate(self):
+        """
+        An invalidated URL is asked from the storage again.
+        """
+        cached_urls(self.storage, ['a.mp4'])
+        invalidate_urls(['a.mp4'])
+        cached_urls(self.storage, ['a.mp4'])
+
+        self.assertEqual(self.storage.signed, 2)
+
+    def test_signedTimeout(self):
+        """
+        Signed URLs are cached for at most half of their lifetime.
+        """
+        self.assertEqual(url_cache_timeout(self.storage), 300)
+        self.assertEqual(url_cache_timeout(FileSystemStorage()),
+            settings.ENCODE_URL_CACHE_TIMEOUT)
+
+    @override_settings(ENCODE_URL_CACHE_TIMEOUT=0)
+    def test_disabled(self):
+        """
+        No URL is cached when the timeout is zero.
+        """
+        cached_urls(self.storage, ['a.mp4'])
+        cached_urls(self.storage, ['a.mp4'])
+
+        self.assertEqual(self.storage.signed, 2)
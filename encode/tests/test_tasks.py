@@ -8,9 +8,30 @@ Tests for the :py:mod:`encode.tasks` module.
 
 from __future__ import unicode_literals
 
-from django.test import TestCase
+import os
+
+from django.test import TestCase, override_settings
 
 from encode import models, tasks, EncodeError, UploadError
+from encode.accounting import USAGE_FIELDS
+from encode.tests.helpers import FileTestCase
+
+
+class FlakyTask(tasks.AutoRetryTask):
+    """
+    Fails with an I/O error until its third attempt.
+    """
+    autoretry_for = (IOError,)
+    attempts = 0
+    requests = []
+
+    def run(self):
+        FlakyTask.attempts += 1
+        FlakyTask.requests.append(self.request.id)
+        if FlakyTask.attempts < 3:
+            raise IOError('The read operation timed out')
+
+        return self.request.retries
 
 
 class MediaBaseTestCase(TestCase):
@@ -25,6 +46,36 @@ class MediaBaseTestCase(TestCase):
         self.assertRaises(models.MediaBase.DoesNotExist, tasks.media_base, 20)
 
 
+class AutoRetryTaskTestCase(TestCase):
+    """
+    Tests for :py:class:`encode.tasks.AutoRetryTask`.
+    """
+    def setUp(self):
+        FlakyTask.attempts = 0
+        FlakyTask.requests = []
+
+    def test_retry(self):
+        """
+        The task is retried after a transient error, with the request of the
+        job.
+        """
+        result = FlakyTask().apply_async(task_id='flaky')
+
+        self.assertEqual(FlakyTask.attempts, 3)
+        self.assertEqual(result.get(), 2)
+        self.assertEqual(FlakyTask.requests, ['flaky'] * 3)
+        self.assertIsNone(FlakyTask().request.id)
+
+    @override_settings(ENCODE_TASK_MAX_RETRIES=1)
+    def test_maxRetries(self):
+        """
+        The error is raised when the task was retried too often.
+        """
+        self.assertRaises(IOError, FlakyTask().apply_async)
+
+        self.assertEqual(FlakyTask.attempts, 2)
+
+
 class EncodeMediaTestCase(TestCase):
     """
     Tests for :py:class:`encode.tasks.EncodeMedia` task.
@@ -47,6 +98,23 @@ class EncodeMediaTestCase(TestCase):
         self.assertRaises(EncodeError, encode_media.apply_async,
             args=[profile, modelObj.id, '/fake/inputPath', output_path])
 
+    def test_usage(self):
+        """
+        The result of `EncodeMedia` contains the resources used by the
+        encoder.
+        """
+        encoder = models.Encoder.objects.create(name='true', path='true')
+        profile = models.EncodingProfile.objects.create(name='testProfile',
+            encoder=encoder, container='webm', command='')
+        modelObj = models.Video.objects.create(title='testVideo')
+
+        result = tasks.EncodeMedia().apply_async(args=[profile, modelObj.id,
+            '/fake/inputPath', modelObj.output_path(profile)]).get()
+
+        self.assertEqual(result['id'], modelObj.id)
+        self.assertEqual(sorted(result['usage'].keys()), sorted(USAGE_FIELDS))
+        self.assertGreater(result['usage']['wall_time'], 0)
+
 
 class StoreMediaTestCase(TestCase):
     """
@@ -67,3 +135,104 @@ class StoreMediaTestCase(TestCase):
             '{} does not exist'.format(modelObj.output_path(profile)),
             store_media.apply_async,
             args=[data])
+
+
+class StoreMediaJobTestCase(FileTestCase):
+    """
+    Tests for the :py:class:`encode.models.EncodingJob` records created by the
+    :py:class:`encode.tasks.StoreMedia` task.
+    """
+    def test_recordUsage(self):
+        """
+        `StoreMedia` records the resource usage of the encoder.
+        """
+        profile = models.EncodingProfile.objects.create(name='testProfile',
+            container='webm')
+        modelObj = models.Video.objects.create(title='testVideo',
+            keep_input_file=True)
+        output_path = modelObj.output_path(profile)
+        if not os.path.exists(os.path.dirname(output_path)):
+            os.makedirs(os.path.dirname(output_path))
+        with open(output_path, 'wb') as output_file:
+            output_file.write(b'webm')
+
+        usage = dict(wall_time=2.5, user_time=1.5, system_time=0.5,
+            max_rss=2048, input_blocks=8, output_blocks=16)
+        data = {'id': modelObj.id, 'profile': profile, 'usage': usage}
+        tasks.StoreMedia().apply_async(args=[data])
+
+        job = models.EncodingJob.objects.get()
+        self.assertEqual(job.media.pk, modelObj.pk)
+        self.assertEqual(job.profile, profile)
+        self.assertEqual(job.wall_time, 2.5)
+        self.assertEqual(job.max_rss, 2048)
+
+    def test_redelivered(self):
+        """
+        A redelivery of the task, e.g. after its worker was lost, does not
+        upload the files that the first delivery stored again.
+        """
+        profile = models.EncodingProfile.objects.create(name='testProfile',
+            container='webm')
+        modelObj = models.Video.objects.create(title='testVideo',
+            keep_input_file=True, encoding=True)
+        output_path = modelObj.output_path(profile)
+        if not os.path.exists(os.path.dirname(output_path)):
+            os.makedirs(os.path.dirname(output_path))
+        with open(output_path, 'wb') as output_file:
+            output_file.write(b'webm')
+
+        data = {'id': modelObj.id, 'profile': profile}
+        tasks.StoreMedia().apply_async(args=[data], task_id='abc')
+        name = models.MediaFile.objects.get().file.name
+
+        # the worker was lost after the upload, before the file was saved
+        models.MediaFile.objects.all().delete()
+        models.Video.objects.filter(pk=modelObj.pk).update(encoding=True)
+        tasks.StoreMedia().apply_async(args=[data], task_id='abc')
+
+        media_file = models.MediaFile.objects.get()
+        self.assertEqual(media_file.file.name, name)
+        self.assertEqual(os.listdir(os.path.dirname(media_file.file.path)),
+            [os.path.basename(name)])
+
+    def test_retryAfterStore(self):
+        """
+        A retry of the task after the files were stored, e.g. for an error
+        while removing the input file, completes the job instead of
+        discarding the output as if encoding was canceled.
+        """
+        profile = models.EncodingProfile.objects.create(name='testProfile',
+            container='webm')
+        modelObj = models.Video.objects.create(title='testVideo',
+            encoding=True)
+        modelObj.profiles.add(profile)
+        output_path = modelObj.output_path(profile)
+        if not os.path.exists(os.path.dirname(output_path)):
+            os.makedirs(os.path.dirname(output_path))
+        with open(output_path, 'wb') as output_file:
+            output_file.write(b'webm')
+
+        calls = []
+        remove_file = models.MediaBase.remove_file
+
+        def flaky_remove_file(media, profile):
+            calls.append(profile)
+            if len(calls) == 1:
+                raise OSError('Connection reset')
+            remove_file(media, profile)
+
+        usage = dict(wall_time=2.5, user_time=1.5, system_time=0.5,
+            max_rss=2048, input_blocks=8, output_blocks=16)
+        data = {'id': modelObj.id, 'profile': profile, 'usage': usage}
+        models.MediaBase.remove_file = flaky_remove_file
+        try:
+            tasks.StoreMedia().apply_async(args=[data])
+        finally:
+            models.MediaBase.remove_file = remove_file
+
+        modelObj = models.Video.objects.get(pk=modelObj.pk)
+        self.assertTrue(modelObj.encoded)
+        self.assertEqual(modelObj.output_files.count(), 1)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(models.EncodingJob.objects.count(), 1)
@@ -0,0 +1,130 @@
+# Copyright Collab 2016
+# See LICENSE for details.
+
+"""
+Tests for the :py:mod:`encode.thumbnails` module.
+"""
+
+from __future__ import unicode_literals
+
+import os
+
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from encode import EncodeError, thumbnails
+from encode.models import MediaFile, Video
+from encode.tasks import ExtractThumbnails
+from encode.tests.helpers import FileTestCase
+
+
+class PositionsTestCase(TestCase):
+    """
+    Tests for :py:func:`encode.thumbnails.parse_position` and
+    :py:func:`encode.thumbnails.resolve_positions`.
+    """
+    def test_parse(self):
+        """
+        Timestamps and percentages are parsed.
+        """
+        self.assertEqual(thumbnails.parse_position('10%'),
+            ('percentage', 10))
+        self.assertEqual(thumbnails.parse_position('90'), ('seconds', 90))
+        self.assertEqual(thumbnails.parse_position(2.5), ('seconds', 2.5))
+        self.assertEqual(thumbnails.parse_position('1:30'), ('seconds', 90))
+        self.assertEqual(thumbnails.parse_position('01:00:01.5'),
+            ('seconds', 3601.5))
+
+    def test_invalid(self):
+        """
+        An :py:class:`encode.EncodeError` is raised for invalid positions.
+        """
+        for position in ['', 'start', '-1', '150%', '1:2:3:4']:
+            self.assertRaises(EncodeError, thumbnails.parse_position,
+                position)
+
+    def test_resolve(self):
+        """
+        Percentages are converted to timestamps and timestamps past the end
+        are moved to the last second.
+        """
+        self.assertEqual(thumbnails.resolve_positions(['10%', '50%', 30,
+            '100%'], duration=20), [2, 10, 19, 19])
+
+    def test_unknownDuration(self):
+        """
+        Percentages cannot be resolved without the duration.
+        """
+        self.assertEqual(thumbnails.resolve_positions(['1:00']), [60])
+        self.assertRaises(EncodeError, thumbnails.resolve_positions, ['10%'])
+
+
+class FrameCommandTestCase(TestCase):
+    """
+    Tests for :py:func:`encode.thumbnails.frame_command`.
+    """
+    def test_seek(self):
+        """
+        The input is seeked before it is opened and only keyframes are
+        decoded.
+        """
+        command = thumbnails.frame_command('in.mov', 12.5, 'out.jpg',
+            width=320)
+
+        self.assertLess(command.index('-skip_frame'), command.index('-i'))
+        self.assertLess(command.index('-ss'), command.index('-i'))
+        self.assertEqual(command[command.index('-skip_frame') + 1], 'nokey')
+        self.assertEqual(command[command.index('-ss') + 1], '12.500')
+        self.assertEqual(command[command.index('-frames:v') + 1], '1')
+        self.assertEqual(command[command.index('-vf') + 1], 'scale=320:-2')
+        self.assertEqual(command[-1], 'out.jpg')
+
+    def test_missingProgram(self):
+        """
+        An :py:class:`encode.EncodeError` is raised when ``ffmpeg`` cannot
+        be found.
+        """
+        self.assertRaises(EncodeError, thumbnails.extract_frame, 'in.mov', 1,
+            'out.jpg', ffmpeg='/fake/path/to/ffmpeg')
+
+
+class VideoThumbnailsTestCase(FileTestCase):
+    """
+    Tests for the thumbnails of :py:class:`encode.models.Video`.
+    """
+    def setUp(self):
+        super(VideoThumbnailsTestCase, self).setUp()
+
+        self.video = Video.objects.create(title='Foo')
+
+        os.makedirs(self.video.thumbnails_path)
+        self.paths = []
+        for index in range(1, 4):
+            self.paths.append(os.path.join(self.video.thumbnails_path,
+                'thumb{:03d}.jpg'.format(index)))
+            with open(self.paths[-1], 'wb') as thumbnail:
+                thumbnail.write(b'data')
+
+    def test_store_thumbnails(self):
+        """
+        The thumbnails are stored and replace the current thumbnails, the
+        first thumbnail is the poster.
+        """
+        self.video.store_thumbnails(self.paths[1:])
+        self.video.store_thumbnails(self.paths)
+
+        self.assertEqual(self.video.thumbnails.count(), 3)
+        self.assertTrue(self.video.poster.file.name.endswith(
+            '/thumb001.jpg'))
+        self.assertEqual(self.video.output_files.count(), 0)
+        # the previous thumbnails are deleted
+        self.assertEqual(MediaFile.objects.count(), 3)
+
+    @override_settings(ENCODE_FFMPEG_PATH='/fake/path/to/ffmpeg')
+    def test_task(self):
+        """
+        The task fails when the thumbnails cannot be extracted.
+        """
+        self.assertRaises(EncodeError, ExtractThumbnails().run,
+            self.video.id, 'in.mov', self.video.thumbnails_path, ['1'])
+        self.assertEqual(self.video.thumbnails.count(), 0)
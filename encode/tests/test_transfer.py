@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# Copyright Collab 2016
+# See LICENSE for details.
+
+"""
+Tests for the :py:mod:`encode.transfer` module.
+"""
+
+from __future__ import unicode_literals
+
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, Storage
+
+from encode.conf import settings
+from encode.transfer import TransferInput, link_file, storage_path
+from encode.tests.helpers import FileTestCase
+
+
+class RemoteStorage(Storage):
+    """
+    Storage that is not on the local filesystem.
+    """
+    def __init__(self):
+        self.files = {}
+
+    def _save(self, name, content):
+        self.files[name] = content.read()
+        return name
+
+    def exists(self, name):
+        return name in self.files
+
+
+class TransferInputTestCase(FileTestCase):
+    """
+    Tests for :py:class:`encode.transfer.TransferInput`.
+    """
+    def setUp(self):
+        super(TransferInputTestCase, self).setUp()
+
+        self.local = FileSystemStorage(location=settings.MEDIA_ROOT)
+        self.remote = FileSystemStorage(
+            location=os.path.join(settings.MEDIA_ROOT, 'remote'))
+        self.name = self.local.save('input/foo.mov', ContentFile(b'data'))
+        self.task = TransferInput()
+
+    def test_link(self):
+        """
+        Files on the same filesystem are linked instead of copied.
+        """
+        self.assertTrue(self.task.transfer(self.name, self.local,
+            self.remote))
+
+        self.assertTrue(os.path.samefile(self.local.path(self.name),
+            self.remote.path(self.name)))
+
+        # a transfer of a linked file doesn't do anything
+        self.assertTrue(self.task.transfer(self.name, self.local,
+            self.remote))
+        self.assertEqual(os.listdir(self.remote.path('input')), ['foo.mov'])
+
+    def test_sameLocation(self):
+        """
+        Nothing is transferred when both storages are the same directory.
+        """
+        remote = FileSystemStorage(location=settings.MEDIA_ROOT)
+
+        self.assertTrue(self.task.transfer(self.name, self.local, remote))
+        self.assertFalse(os.path.exists(self.remote.path(self.name)))
+
+    def test_copy(self):
+        """
+        Files are copied to storages that are not on the local filesystem.
+        """
+        remote = RemoteStorage()
+
+        self.assertTrue(self.task.transfer(self.name, self.local, remote))
+        self.assertEqual(remote.files, {self.name: b'data'})
+
+    def test_storage_path(self):
+        self.assertEqual(storage_path(self.local, self.name),
+            os.path.join(settings.MEDIA_ROOT, self.name))
+        self.assertIsNone(storage_path(RemoteStorage(), self.name))
+
+    def test_link_file(self):
+        """
+        :py:func:`~encode.transfer.link_file` returns ``False`` when the link
+        cannot be created.
+        """
+        source = self.local.path(self.name)
+
+        self.assertFalse(link_file(source, source))
+        self.assertFalse(link_file(source + '.missing', source + '.link'))
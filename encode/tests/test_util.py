@@ -9,6 +9,8 @@ Tests for the :py:mod:`encode.util` module.
 from __future__ import unicode_literals
 
 import os
+import hashlib
+from io import BytesIO
 
 from django.test import TestCase
 
@@ -55,6 +57,172 @@ class FqnTestCase(TestCase):
         self.assertEqual(result, 'encode.tests.test_util.FqnTestCase')
 
 
+class RunThreadsTestCase(TestCase):
+    """
+    Tests for :py:func:`encode.util.run_threads`.
+    """
+    def test_order(self):
+        """
+        The results are returned in the order of the items.
+        """
+        result = util.run_threads(lambda item: item * 2, range(10), 4)
+
+        self.assertEqual(result, [item * 2 for item in range(10)])
+
+    def test_error(self):
+        """
+        An exception raised in a thread is raised again.
+        """
+        def fail(item):
+            if item == 3:
+                raise EncodeError('bad item')
+            return item
+
+        self.assertRaises(EncodeError, util.run_threads, fail, range(5), 2)
+
+
+class BackoffTestCase(TestCase):
+    """
+    Tests for :py:func:`encode.util.backoff`.
+    """
+    def test_exponential(self):
+        """
+        The delay doubles with every retry, up to the maximum.
+        """
+        delays = [util.backoff(retries, 2, 60, jitter=False)
+                  for retries in range(7)]
+
+        self.assertEqual(delays, [2, 4, 8, 16, 32, 60, 60])
+
+    def test_jitter(self):
+        """
+        The delay is picked between zero and the backoff.
+        """
+        for index in range(20):
+            delay = util.backoff(3, 2, 60)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, 16)
+
+
+class ShardedNameTestCase(TestCase):
+    """
+    Tests for :py:func:`encode.util.sharded_name`.
+    """
+    def test_sharded(self):
+        """
+        The name is spread over nested directories.
+        """
+        self.assertEqual(util.sharded_name('abcdef01'), 'ab/cd/abcdef01')
+        self.assertEqual(util.sharded_name('abcdef01', levels=1, width=3),
+            'abc/abcdef01')
+
+
+class GuessMimeTypeTestCase(TestCase):
+    """
+    Tests for :py:func:`encode.util.guess_mime_type`.
+    """
+    def test_guess(self):
+        """
+        The MIME type is guessed from the extension, including those of the
+        streaming formats.
+        """
+        self.assertEqual(util.guess_mime_type('foo/bar.png'), 'image/png')
+        self.assertEqual(util.guess_mime_type('foo/manifest.MPD'),
+            'application/dash+xml')
+        self.assertEqual(util.guess_mime_type('foo/segment.ts'),
+            'video/mp2t')
+        self.assertEqual(util.guess_mime_type('foo/bar'), '')
+
+
+class HashingFileTestCase(TestCase):
+    """
+    Tests for :py:class:`encode.util.HashingFile`.
+    """
+    def setUp(self):
+        self.data = b'0123456789' * 1000
+        self.expected = {
+            'md5': hashlib.md5(self.data).hexdigest(),
+            'sha256': hashlib.sha256(self.data).hexdigest(),
+        }
+
+    def test_read(self):
+        """
+        The content is hashed while it's read.
+        """
+        content = util.HashingFile(BytesIO(self.data))
+
+        self.assertEqual(b''.join(content.chunks(chunk_size=999)),
+            self.data)
+        self.assertEqual(content.hashed, len(self.data))
+        self.assertEqual(content.hexdigests(), self.expected)
+
+    def test_readAgain(self):
+        """
+        Content that is read again is hashed once.
+        """
+        content = util.HashingFile(BytesIO(self.data))
+        content.read(5000)
+        content.seek(0)
+        content.read()
+
+        self.assertEqual(content.hexdigests(), self.expected)
+
+    def test_notRead(self):
+        """
+        The content that was not read is hashed at last.
+        """
+        content = util.HashingFile(BytesIO(self.data))
+        content.read(10)
+
+        self.assertEqual(content.hexdigests(), self.expected)
+        self.assertEqual(content.hashed, len(self.data))
+
+
+class FileDigestTestCase(helpers.FileTestCase):
+    """
+    Tests for :py:func:`encode.util.file_digest`.
+    """
+    def test_digest(self):
+        """
+        The file is hashed in chunks with the chosen algorithm.
+        """
+        data = b'0123456789' * 1000
+        if not os.path.isdir(settings.MEDIA_ROOT):
+            os.makedirs(settings.MEDIA_ROOT)
+        path = os.path.join(settings.MEDIA_ROOT, 'digest.bin')
+        with open(path, 'wb') as f:
+            f.write(data)
+
+        self.assertEqual(util.file_digest(path, chunk_size=999),
+            hashlib.sha256(data).hexdigest())
+        self.assertEqual(util.file_digest(path, 'md5'),
+            hashlib.md5(data).hexdigest())
+
+
+class FindOutputsTestCase(helpers.FileTestCase):
+    """
+    Tests for :py:func:`encode.util.find_outputs`.
+    """
+    def test_directory(self):
+        """
+        The files below a directory are found in a stable order.
+        """
+        root = os.path.join(settings.MEDIA_ROOT, 'outputs')
+        for name in ['b.jpg', 'a.jpg', os.path.join('sub', 'c.jpg')]:
+            path = os.path.join(root, name)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            open(path, 'wb').close()
+
+        self.assertEqual(util.find_outputs(root), [
+            os.path.join(root, 'a.jpg'), os.path.join(root, 'b.jpg'),
+            os.path.join(root, 'sub', 'c.jpg')])
+        self.assertEqual(util.find_outputs(os.path.join(root, 'a.jpg')),
+            [os.path.join(root, 'a.jpg')])
+        self.assertEqual(util.find_outputs(os.path.join(root, 'missing')),
+            [])
+
+
 class GetMediaUploadToTestCase(TestCase):
     """
     Tests for :py:func:`encode.util.get_media_upload_to`.
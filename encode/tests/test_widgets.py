@@ -74,3 +74,20 @@ class WidgetTestCase(FileTestCase, DummyDataMixin):
                 choices=choices
             )
         )
+
+    def test_render_file_urls(self):
+        """
+        The urls of the selected files are resolved in a single query.
+        """
+        result = self.createTempFile('video_', Video,
+            settings.ENCODE_VIDEO_PROFILES,
+            WEBM_DATA)
+
+        files = list(result.output_files.all())
+        widget = MediaDisplayWidget(choices=[(x.id, x.title) for x in files])
+
+        with self.assertNumQueries(1):
+            output = widget.render(name='test', value=[x.id for x in files])
+
+        for media_file in files:
+            self.assertIn(media_file.file.url, output)
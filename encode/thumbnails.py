@@ -0,0 +1,203 @@
+# Copyright Collab 2016
+# See LICENSE for details.
+
+"""
+Thumbnails and posters of videos.
+
+Every frame is extracted with a separate ``ffmpeg`` command that seeks in
+the input (``-ss`` before ``-i``) and only decodes keyframes
+(``-skip_frame nokey``), so a frame costs a seek and the decoding of one
+keyframe instead of decoding the video from the start.
+"""
+
+from __future__ import division, unicode_literals
+
+import os
+import re
+import logging
+import subprocess
+
+from encode import EncodeError
+from encode.conf import settings
+from encode.util import probe_duration
+
+
+__all__ = ['parse_position', 'resolve_positions', 'frame_command',
+           'extract_frame', 'extract_thumbnails']
+
+logger = logging.getLogger(__name__)
+
+#: A timestamp in seconds or ``[HH:]MM:SS[.mmm]``, or a percentage of the
+#: duration, e.g. ``90``, ``1:30``, ``00:01:30.5`` or ``10%``.
+POSITION = re.compile(r'^(?:(?P<percentage>\d+(?:\.\d+)?)%|'
+                      r'(?:(?:(?P<hours>\d+):)?(?P<minutes>\d+):)?'
+                      r'(?P<seconds>\d+(?:\.\d+)?))$')
+
+
+def parse_position(position):
+    """
+    Parse a thumbnail position.
+
+    :param position: A timestamp or percentage, see :py:data:`POSITION`.
+    :type position: str or float
+    :rtype: tuple
+    :returns: ``('percentage', value)`` or ``('seconds', value)``.
+    :raises: :py:exc:`~encode.EncodeError` if the position is invalid.
+    """
+    match = POSITION.match(str(position).strip())
+    if match is None:
+        raise EncodeError("Invalid thumbnail position: {}".format(position))
+
+    if match.group('percentage') is not None:
+        percentage = float(match.group('percentage'))
+        if percentage > 100:
+            raise EncodeError("Invalid thumbnail position: {}".format(
+                position))
+        return 'percentage', percentage
+
+    seconds = float(match.group('seconds'))
+    seconds += int(match.group('minutes') or 0) * 60
+    seconds += int(match.group('hours') or 0) * 3600
+
+    return 'seconds', seconds
+
+
+def resolve_positions(positions, duration=None):
+    """
+    Convert the thumbnail ``positions`` to timestamps.
+
+    :param positions: Timestamps or percentages, see :py:data:`POSITION`.
+    :type positions: list
+    :param duration: Duration of the video in seconds. Required for
+        percentages; timestamps past the duration are moved to the last
+        second of the video.
+    :type duration: float
+    :rtype: list
+    :returns: Seconds from the start of the video.
+    :raises: :py:exc:`~encode.EncodeError` if a position is invalid or the
+        duration of the video is unknown.
+    """
+    seconds = []
+    for position in positions:
+        kind, value = parse_position(position)
+        if kind == 'percentage':
+            if not duration:
+                raise EncodeError("Cannot place a thumbnail at {}: the "
+                                  "duration of the video is unknown".format(
+                                      position))
+            value = duration * value / 100
+        if duration:
+            value = min(value, max(duration - 1, 0))
+        seconds.append(round(value, 3))
+
+    return seconds
+
+
+def frame_command(input_path, seconds, output_path, width=None,
+                  ffmpeg='ffmpeg'):
+    """
+    The ``ffmpeg`` command that extracts the keyframe at or before
+    ``seconds``.
+
+    :param input_path: Location of the video.
+    :type input_path: str
+    :param seconds: Timestamp of the frame.
+    :type seconds: float
+    :param output_path: Location of the image, its extension selects the
+        format.
+    :type output_path: str
+    :param width: Width of the image in pixels, defaults to the width of the
+        video.
+    :type width: int
+    :param ffmpeg: Name or path of the ``ffmpeg`` executable.
+    :type ffmpeg: str
+    :rtype: list
+    """
+    command = [ffmpeg, '-v', 'error', '-y',
+               '-skip_frame', 'nokey',
+               '-ss', '{:.3f}'.format(seconds), '-noaccurate_seek',
+               '-i', input_path,
+               '-an', '-sn', '-frames:v', '1']
+    if width:
+        command += ['-vf', 'scale={}:-2'.format(width)]
+
+    return command + [output_path]
+
+
+def extract_frame(input_path, seconds, output_path, width=None,
+                  ffmpeg='ffmpeg'):
+    """
+    Extract the keyframe at or before ``seconds`` to ``output_path``.
+
+    :param input_path: Location of the video.
+    :type input_path: str
+    :param seconds: Timestamp of the frame.
+    :type seconds: float
+    :param output_path: Location of the image.
+    :type output_path: str
+    :param width: Width of the image in pixels.
+    :type width: int
+    :param ffmpeg: Name or path of the ``ffmpeg`` executable.
+    :type ffmpeg: str
+    :raises: :py:exc:`~encode.EncodeError` if the frame cannot be extracted.
+    """
+    command = frame_command(input_path, seconds, output_path, width, ffmpeg)
+    try:
+        subprocess.check_output(command, stderr=subprocess.STDOUT)
+    except (OSError, subprocess.CalledProcessError) as error:
+        exc = EncodeError("Cannot extract frame at {}s: {}".format(seconds,
+            error))
+        exc.output = getattr(error, 'output', None)
+        exc.command = " ".join(command)
+        raise exc
+
+    if not os.path.exists(output_path):
+        raise EncodeError("No frame at {}s".format(seconds))
+
+
+def extract_thumbnails(input_path, output_dir, positions=None, width=None,
+                       extension=None):
+    """
+    Extract a thumbnail from the video at ``input_path`` for each of
+    ``positions``.
+
+    :param input_path: Location of the video.
+    :type input_path: str
+    :param output_dir: Directory for the thumbnails.
+    :type output_dir: str
+    :param positions: Timestamps or percentages, see :py:data:`POSITION`.
+        Defaults to :py:data:`~encode.conf.EncodeConf.THUMBNAIL_POSITIONS`.
+    :type positions: list
+    :param width: Width of the thumbnails in pixels. Defaults to
+        :py:data:`~encode.conf.EncodeConf.THUMBNAIL_WIDTH`.
+    :type width: int
+    :param extension: Image format. Defaults to
+        :py:data:`~encode.conf.EncodeConf.THUMBNAIL_FORMAT`.
+    :type extension: str
+    :rtype: list
+    :returns: Locations of the thumbnails, in the order of ``positions``.
+    """
+    if positions is None:
+        positions = settings.ENCODE_THUMBNAIL_POSITIONS
+    if width is None:
+        width = settings.ENCODE_THUMBNAIL_WIDTH
+    extension = extension or settings.ENCODE_THUMBNAIL_FORMAT
+
+    duration = None
+    if any(parse_position(position)[0] == 'percentage'
+           for position in positions):
+        duration = probe_duration(input_path, settings.ENCODE_FFPROBE_PATH)
+
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+
+    paths = []
+    for index, seconds in enumerate(resolve_positions(positions, duration)):
+        path = os.path.join(output_dir, 'thumb{:03d}.{}'.format(index + 1,
+            extension))
+        extract_frame(input_path, seconds, path, width,
+            settings.ENCODE_FFMPEG_PATH)
+        logger.debug("Extracted thumbnail at {}s: {}".format(seconds, path))
+        paths.append(path)
+
+    return paths
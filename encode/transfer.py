@@ -0,0 +1,187 @@
+# Copyright Collab 2016
+# See LICENSE for details.
+
+"""
+Transfer of the input files from the local to the remote storage.
+
+The local and remote storage are often the same filesystem, e.g. when the
+web server and the encoders share a disk. Copying every upload is redundant
+then: the input file is hard linked, or reflinked on copy-on-write
+filesystems, and nothing is transferred when both storages are the same
+directory. Other storages are copied by
+:py:class:`queued_storage.tasks.Transfer`.
+"""
+
+from __future__ import unicode_literals
+
+import os
+import errno
+import logging
+
+from django.core.cache import cache
+
+from queued_storage.tasks import Transfer
+from queued_storage.signals import file_transferred
+
+from encode.pool import storage_pool
+
+
+__all__ = ['storage_path', 'link_file', 'reflink_file', 'TransferInput']
+
+logger = logging.getLogger(__name__)
+
+#: The ``FICLONE`` ioctl of Linux that shares the data blocks of two files on
+#: copy-on-write filesystems like Btrfs and XFS.
+FICLONE = 0x40049409
+
+
+def storage_path(storage, name):
+    """
+    :param storage: A Django file storage.
+    :type storage: :py:class:`django.core.files.storage.Storage`
+    :param name: Name of the file in ``storage``.
+    :type name: str
+    :rtype: str
+    :returns: Absolute path of the file, ``None`` for storages that are not
+        on the local filesystem.
+    """
+    try:
+        return os.path.abspath(storage.path(name))
+    except NotImplementedError:
+        return None
+
+
+def link_file(source, target):
+    """
+    Create a hard link at ``target`` to ``source``.
+
+    :param source: Path of an existing file.
+    :type source: str
+    :param target: Path of the link.
+    :type target: str
+    :rtype: bool
+    :returns: ``False`` if the link cannot be created, e.g. because the
+        paths are on different filesystems.
+    """
+    try:
+        os.link(source, target)
+    except (AttributeError, OSError) as error:
+        logger.debug("Cannot link {} to {}: {}".format(source, target, error))
+        return False
+
+    return True
+
+
+def reflink_file(source, target):
+    """
+    Create a copy-on-write clone of ``source`` at ``target``.
+
+    :param source: Path of an existing file.
+    :type source: str
+    :param target: Path of the clone.
+    :type target: str
+    :rtype: bool
+    :returns: ``False`` if the filesystem does not support reflinks.
+    """
+    try:
+        import fcntl
+    except ImportError:  # pragma: no cover
+        return False
+
+    try:
+        with open(source, 'rb') as src, open(target, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    except (IOError, OSError) as error:
+        logger.debug("Cannot reflink {} to {}: {}".format(source, target,
+            error))
+        if os.path.exists(target):
+            os.remove(target)
+        return False
+
+    return True
+
+
+class TransferInput(Transfer):
+    """
+    Transfers an input file without copying it when the local and remote
+    storage are on the same filesystem.
+
+    The storage clients are taken from the pools of the worker, see
+    :py:mod:`encode.pool`, instead of created for every transfer.
+    """
+    def run(self, name, cache_key, local_path, remote_path, local_options,
+            remote_options, **kwargs):
+        """
+        Execute the task.
+
+        :param name: Name of the file to transfer.
+        :type name: str
+        :param cache_key: The cache key to set after a successful transfer.
+        :type cache_key: str
+        :param local_path: Import path of the local storage class.
+        :type local_path: str
+        :param remote_path: Import path of the remote storage class.
+        :type remote_path: str
+        :param local_options: Options of the local storage class.
+        :type local_options: dict
+        :param remote_options: Options of the remote storage class.
+        :type remote_options: dict
+        :rtype: bool
+        """
+        local_pool = storage_pool(local_path, local_options)
+        remote_pool = storage_pool(remote_path, remote_options)
+
+        with local_pool.acquire() as local, remote_pool.acquire() as remote:
+            result = self.transfer(name, local, remote, **kwargs)
+
+        if result is True:
+            cache.set(cache_key, True)
+            file_transferred.send(sender=self.__class__, name=name,
+                local=local, remote=remote)
+        elif result is False:
+            self.retry(args=[name, cache_key, local_path, remote_path,
+                             local_options, remote_options], kwargs=kwargs)
+        else:
+            raise ValueError("Task '{}' did not return True/False but "
+                             "{}".format(self.__class__, result))
+
+        return result
+
+    def transfer(self, name, local, remote, **kwargs):
+        """
+        :param name: Name of the file to transfer.
+        :type name: str
+        :param local: The local storage.
+        :type local: :py:class:`django.core.files.storage.Storage`
+        :param remote: The remote storage.
+        :type remote: :py:class:`django.core.files.storage.Storage`
+        :rtype: bool
+        :returns: ``True`` when the transfer succeeded, ``False`` if not.
+        """
+        source = storage_path(local, name)
+        target = storage_path(remote, name)
+
+        if source and target and os.path.exists(source):
+            if source == target:
+                # both storages are the same directory
+                return True
+
+            if os.path.exists(target):
+                if os.path.samefile(source, target):
+                    # linked before
+                    return True
+            else:
+                try:
+                    os.makedirs(os.path.dirname(target))
+                except OSError as error:
+                    if error.errno != errno.EEXIST:
+                        raise
+
+                if link_file(source, target) or reflink_file(source,
+                                                             target):
+                    logger.debug("Linked {} to the remote storage".format(
+                        name))
+                    return True
+
+        return super(TransferInput, self).transfer(name, local, remote,
+                                                   **kwargs)
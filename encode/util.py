@@ -8,12 +8,20 @@ Utilities.
 from __future__ import unicode_literals
 
 import os
+import json
+import random
+import shutil
+import hashlib
 import logging
+import threading
+import subprocess
 import binascii
+import mimetypes
+from collections import OrderedDict
 from base64 import b64decode
 from tempfile import NamedTemporaryFile
 
-from django.core.files.base import ContentFile
+from django.core.files.base import File, ContentFile
 from django.utils.text import get_valid_filename
 from django.utils.crypto import get_random_string
 
@@ -22,10 +30,25 @@ from encode import DecodeError, EncodeError
 
 
 __all__ = ["fqn", "get_random_filename", "get_media_upload_to", "parseMedia",
-           "storeMedia", "TemporaryMediaFile"]
+           "storeMedia", "probe_duration", "guess_mime_type", "probe_media",
+           "find_outputs", "remove_path",
+           "run_threads", "backoff", "file_digest", "sharded_name",
+           "HashingFile", "TemporaryMediaFile"]
 
 logger = logging.getLogger(__name__)
 
+#: MIME types of the outputs of encoders that are missing from the
+#: :py:mod:`mimetypes` module on many systems.
+MIME_TYPES = {
+    '.m3u8': 'application/vnd.apple.mpegurl',
+    '.mpd': 'application/dash+xml',
+    '.ts': 'video/mp2t',
+    '.m4s': 'video/iso.segment',
+    '.webm': 'video/webm',
+    '.oga': 'audio/ogg',
+    '.webp': 'image/webp',
+}
+
 
 def fqn(obj):
     """
@@ -56,6 +79,307 @@ def get_random_filename(file_extension='png', length=12):
     ))
 
 
+def probe_duration(path, ffprobe='ffprobe'):
+    """
+    Duration of the media file at ``path``.
+
+    :param path: Location of the media file.
+    :type path: str
+    :param ffprobe: Name or path of the ``ffprobe`` executable.
+    :type ffprobe: str
+    :rtype: float or ``None``
+    :returns: Duration in seconds, or ``None`` for still images or when the
+        file cannot be probed.
+    """
+    command = [ffprobe, '-v', 'error', '-show_entries', 'format=duration',
+               '-of', 'default=noprint_wrappers=1:nokey=1', path]
+    try:
+        output = subprocess.check_output(command, stderr=subprocess.STDOUT)
+        duration = float(output.strip())
+    except (OSError, ValueError, subprocess.CalledProcessError) as error:
+        logger.debug("Cannot probe duration of {}: {}".format(path, error))
+        return None
+
+    return duration if duration > 0 else None
+
+
+def guess_mime_type(name):
+    """
+    MIME type of a file, guessed from its extension.
+
+    :param name: Name or location of the file.
+    :type name: str
+    :rtype: str
+    :returns: The MIME type, or an empty string when it's unknown.
+    """
+    extension = os.path.splitext(name)[1].lower()
+    if extension in MIME_TYPES:
+        return MIME_TYPES[extension]
+
+    return mimetypes.guess_type(name)[0] or ''
+
+
+def probe_media(path, ffprobe='ffprobe'):
+    """
+    Dimensions and duration of the media file at ``path``.
+
+    Images are measured with Pillow, when it's installed, which only reads
+    their header. Other media are probed with ``ffprobe``.
+
+    :param path: Location of the media file.
+    :type path: str
+    :param ffprobe: Name or path of the ``ffprobe`` executable.
+    :type ffprobe: str
+    :rtype: dict
+    :returns: The ``width`` and ``height`` in pixels and the ``duration`` in
+        seconds, ``None`` when they are unknown, e.g. the dimensions of
+        audio or the duration of still images.
+    """
+    info = dict(width=None, height=None, duration=None)
+
+    if guess_mime_type(path).startswith('image/'):
+        try:
+            from PIL import Image
+
+            with open(path, 'rb') as f:
+                info['width'], info['height'] = Image.open(f).size
+            return info
+        except ImportError:  # pragma: no cover
+            pass
+        except (IOError, OSError) as error:
+            logger.debug("Cannot measure image {}: {}".format(path, error))
+            return info
+
+    command = [ffprobe, '-v', 'error', '-show_entries',
+               'stream=width,height:format=duration', '-of', 'json', path]
+    try:
+        output = subprocess.check_output(command, stderr=subprocess.STDOUT)
+        data = json.loads(output.decode('utf-8'))
+    except (OSError, ValueError, subprocess.CalledProcessError) as error:
+        logger.debug("Cannot probe {}: {}".format(path, error))
+        return info
+
+    for stream in data.get('streams', []):
+        if stream.get('width') and stream.get('height'):
+            info['width'] = int(stream['width'])
+            info['height'] = int(stream['height'])
+            break
+
+    try:
+        duration = float(data.get('format', {})['duration'])
+    except (KeyError, TypeError, ValueError):
+        duration = 0
+    if duration > 0:
+        info['duration'] = duration
+
+    return info
+
+
+def find_outputs(path):
+    """
+    Find the files that an encoder wrote to ``path``.
+
+    :param path: Location of the output file or directory.
+    :type path: str
+    :rtype: list
+    :returns: ``[path]`` for a file, the files below a directory in a stable
+        order, or an empty list when nothing exists at ``path``.
+    """
+    if not os.path.isdir(path):
+        return [path] if os.path.exists(path) else []
+
+    outputs = []
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        outputs.extend(os.path.join(root, name) for name in sorted(files))
+
+    return outputs
+
+
+def run_threads(func, items, workers):
+    """
+    Call ``func`` for each of ``items`` in at most ``workers`` threads.
+
+    :param func: Function that is called with an item.
+    :type func: callable
+    :param items: The arguments for ``func``.
+    :type items: list
+    :param workers: Maximum number of threads.
+    :type workers: int
+    :rtype: list
+    :returns: The results of ``func``, in the order of ``items``.
+    :raises: The first exception raised by ``func``, after all threads
+        completed.
+    """
+    items = list(items)
+    if workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+
+    results = [None] * len(items)
+    errors = []
+    pending = iter(enumerate(items))
+    lock = threading.Lock()
+
+    def work():
+        while True:
+            with lock:
+                index, item = next(pending, (None, None))
+                if index is None or errors:
+                    return
+            try:
+                results[index] = func(item)
+            except Exception as error:
+                with lock:
+                    errors.append(error)
+
+    threads = [threading.Thread(target=work)
+               for index in range(min(workers, len(items)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+
+    return results
+
+
+def backoff(retries, base, maximum, jitter=True):
+    """
+    Number of seconds to wait before a retry: exponential backoff, with
+    "full jitter" so retries of many jobs that failed at the same time are
+    spread out instead of hitting the service at once again.
+
+    :param retries: Number of retries so far.
+    :type retries: int
+    :param base: Delay of the first retry in seconds.
+    :type base: float
+    :param maximum: Maximum delay in seconds.
+    :type maximum: float
+    :param jitter: Pick a random delay between zero and the backoff.
+    :type jitter: bool
+    :rtype: float
+    """
+    countdown = min(base * 2 ** retries, maximum)
+    if jitter:
+        countdown = random.uniform(0, countdown)
+
+    return countdown
+
+
+def file_digest(path, algorithm='sha256', chunk_size=64 * 1024):
+    """
+    Hash the content of the file at ``path``.
+
+    :param path: Location of the file.
+    :type path: str
+    :param algorithm: Name of a :py:mod:`hashlib` algorithm.
+    :type algorithm: str
+    :param chunk_size: Number of bytes that are read at once.
+    :type chunk_size: int
+    :rtype: str
+    :returns: The hexadecimal digest.
+    """
+    digest = hashlib.new(algorithm)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+class HashingFile(File):
+    """
+    File that hashes its content while it's read, e.g. by a storage that
+    uploads it, so the file is read only once.
+
+    Content that is read again after seeking back, e.g. by a storage that
+    computes a checksum of its own before uploading, is hashed only once.
+
+    :param file: A file object opened in binary mode.
+    :type file: file
+    :param algorithms: Names of :py:mod:`hashlib` algorithms.
+    :type algorithms: tuple
+    """
+    def __init__(self, file, name=None, algorithms=('md5', 'sha256')):
+        super(HashingFile, self).__init__(file, name)
+
+        self.hashes = OrderedDict((algorithm, hashlib.new(algorithm))
+                                  for algorithm in algorithms)
+        #: Number of bytes that were hashed.
+        self.hashed = 0
+
+    def read(self, *args, **kwargs):
+        position = self.file.tell()
+        data = self.file.read(*args, **kwargs)
+
+        end = position + len(data)
+        if position <= self.hashed < end:
+            new_data = data[self.hashed - position:]
+            for digest in self.hashes.values():
+                digest.update(new_data)
+            self.hashed = end
+
+        return data
+
+    def hexdigests(self, chunk_size=64 * 1024):
+        """
+        Hash the rest of the content that was not read yet, e.g. by a
+        storage that did not need to upload the file.
+
+        :param chunk_size: Number of bytes that are read at once.
+        :type chunk_size: int
+        :rtype: dict
+        :returns: The hexadecimal digests by algorithm.
+        """
+        self.file.seek(self.hashed)
+        while self.read(chunk_size):
+            pass
+
+        return dict((algorithm, digest.hexdigest())
+                    for algorithm, digest in self.hashes.items())
+
+
+def sharded_name(digest, levels=2, width=2):
+    """
+    Spread names over nested directories, so no directory in storage holds
+    too many files.
+
+    :param digest: A hexadecimal digest.
+    :type digest: str
+    :param levels: Number of directories.
+    :type levels: int
+    :param width: Number of characters of each directory name.
+    :type width: int
+    :rtype: str
+    :returns: The name below its directories, e.g. ``ab/cd/abcdef01``.
+    """
+    shards = [digest[index * width:(index + 1) * width]
+              for index in range(levels)]
+
+    return '/'.join(shards + [digest])
+
+
+def remove_path(path):
+    """
+    Remove the file or directory tree at ``path`` if it exists.
+
+    :param path: Location of the file or directory.
+    :type path: str
+    :rtype: bool
+    :returns: ``True`` if something was removed.
+    """
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+    else:
+        return False
+
+    return True
+
+
 def get_media_upload_to(instance, filename):
     """
     Get target path for user file uploads.
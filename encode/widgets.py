@@ -26,15 +26,18 @@ class MediaDisplayWidget(forms.SelectMultiple):
         script = ''
 
         if value is not None:
-            for option_value, option_label in chain(self.choices, choices):
-                if option_value in [int(x) for x in value]:
-                    try:
-                        from encode import models
-                        path = models.MediaFile.objects.get(
-                            title=option_label).file.url
-                        paths.append(path)
-                    except models.MediaFile.DoesNotExist:
-                        pass
+            from encode import models
+
+            # compute the selected set once instead of once per choice
+            selected = set(int(x) for x in value)
+            pks = [option_value for option_value, option_label in chain(
+                self.choices, choices) if option_value in selected]
+
+            # resolve the urls of all selected files in a single query and
+            # cache lookup
+            urls = models.MediaFile.objects.urls(
+                models.MediaFile.objects.filter(pk__in=pks).only('file'))
+            paths = [urls[pk] for pk in pks if pk in urls]
 
             script = '''<script type="text/javascript">
                 $(document).ready(function() {
@@ -0,0 +1,12 @@
+#!/usr/bin/env python
+# Copyright Collab 2016
+# See LICENSE for details.
+
+import os
+
+if __name__ == "__main__":
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "encode.tests.settings")
+
+    from encode.benchmarks.runner import main
+
+    main()